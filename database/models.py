@@ -1,5 +1,5 @@
 from typing import Optional, List
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from sqlmodel import Field, SQLModel, Relationship
 
 # --- Tenant Model (Multi-Tenancy) ---
@@ -26,6 +26,7 @@ class Settings(SQLModel, table=True):
     printer_name: Optional[str] = Field(default=None)
     label_width_mm: int = Field(default=60)
     label_height_mm: int = Field(default=40)
+    timezone: str = Field(default="America/Argentina/Buenos_Aires")  # Zona IANA: define el día de negocio
 
 # --- Tax Model ---
 class Tax(SQLModel, table=True):
@@ -108,6 +109,8 @@ class Sale(SQLModel, table=True):
     amount_transfer: float = Field(default=0.0)
     payment_status: str = Field(default="paid") # paid, partial, pending
     is_closed: bool = Field(default=False) # True if processed in Cierre de Caja
+    needs_picking: bool = Field(default=False) # Order to prepare in the warehouse (counter sales are handed over at once)
+    picked_at: Optional[datetime] = None # Set when the order leaves the warehouse (wave picking)
     
     # Foreign Keys
     user_id: Optional[int] = Field(default=None, foreign_key="user.id")
@@ -128,6 +131,7 @@ class SaleItem(SQLModel, table=True):
     quantity: int
     unit_price: float
     total: float
+    cost_price_at_sale: Optional[float] = None # Costo unitario al vender (None = desconocido)
     
     sale: Optional[Sale] = Relationship(back_populates="items")
 
@@ -235,7 +239,7 @@ class CashMovement(SQLModel, table=True):
 # ==========================================
 # WMS MODULE: DEPÓSITOS Y UBICACIONES
 # ==========================================
-from sqlalchemy import UniqueConstraint, CheckConstraint, Index
+from sqlalchemy import UniqueConstraint, CheckConstraint, Index, text
 
 # --- Depósito (almacén físico) ---
 class Location(SQLModel, table=True):
@@ -298,6 +302,24 @@ class BinStock(SQLModel, table=True):
     bin: Optional[Bin] = Relationship(back_populates="stock_entries")
 
 
+# --- Documento de stock (transferencia / ajuste de varias líneas) ---
+class StockDocument(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "request_id", name="uq_stock_document_tenant_request"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tenant_id: Optional[int] = Field(default=None, foreign_key="tenant.id", index=True)
+
+    doc_type: str                            # "transferencia", "ajuste"
+    request_id: Optional[str] = None         # Idempotencia del documento completo
+    line_count: int = Field(default=0)
+    notes: Optional[str] = None
+
+    user_id: Optional[int] = Field(default=None, foreign_key="user.id")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
 # --- Historial de movimientos de stock entre ubicaciones ---
 class StockMovement(SQLModel, table=True):
     __table_args__ = (
@@ -307,6 +329,12 @@ class StockMovement(SQLModel, table=True):
             name="ck_movement_any_side"
         ),
         Index("ix_movement_tenant_time", "tenant_id", "timestamp"),
+        Index(
+            "uq_movement_tenant_request", "tenant_id", "request_id",
+            unique=True,
+            postgresql_where=text("request_id IS NOT NULL"),
+            sqlite_where=text("request_id IS NOT NULL"),
+        ),
     )
 
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -319,8 +347,249 @@ class StockMovement(SQLModel, table=True):
     quantity: int                            # > 0 enforced por CHECK
     reason: Optional[str] = None             # "ingreso", "transferencia", "ajuste", "venta"
     notes: Optional[str] = None
-    request_id: Optional[str] = None         # Idempotencia de API (opcional)
+    request_id: Optional[str] = None         # Idempotencia de API (único por tenant si no es NULL)
+    document_id: Optional[int] = Field(default=None, foreign_key="stockdocument.id", index=True)
 
     user_id: Optional[int] = Field(default=None, foreign_key="user.id")
     timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+
+
+# --- Libro mayor de stock global (append-only) ---
+class StockLedgerEntry(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_ledger_tenant_time", "tenant_id", "created_at"),
+        Index("ix_ledger_tenant_product_time", "tenant_id", "product_id", "created_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tenant_id: Optional[int] = Field(default=None, foreign_key="tenant.id")
+    product_id: int                          # Sin FK: el historial sobrevive al borrado del producto
+
+    delta: int                               # Variación de product.stock_quantity (+/-)
+    reason: str                              # "venta", "compra", "ingreso", "ajuste", "importacion", "edicion"...
+    reference_type: Optional[str] = None     # "sale", "purchase", "stockdocument", "stockmovement"
+    reference_id: Optional[int] = None
+
+    user_id: Optional[int] = Field(default=None, foreign_key="user.id")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+# --- Checkpoint de stock: foto completa para reconstruir "stock al día X" ---
+class StockCheckpoint(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tenant_id: Optional[int] = Field(default=None, foreign_key="tenant.id", index=True)
+    taken_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    product_count: int = Field(default=0)
+
+
+class StockCheckpointLine(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("checkpoint_id", "product_id", name="uq_checkpoint_product"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    checkpoint_id: int = Field(foreign_key="stockcheckpoint.id", index=True)
+    product_id: int
+    quantity: int
+
+
+# --- Tarea de conteo cíclico (una posición/producto a contar en un día) ---
+class CycleCountTask(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "scheduled_for", "bin_id", "product_id", name="uq_cycle_count_day_slot"),
+        Index("ix_cycle_count_tenant_status_day", "tenant_id", "status", "scheduled_for"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tenant_id: Optional[int] = Field(default=None, foreign_key="tenant.id")
+    bin_id: int = Field(foreign_key="bin.id")
+    product_id: int = Field(foreign_key="product.id")
+
+    scheduled_for: date
+    status: str = Field(default="pending")   # "pending", "counted", "cancelled"
+    weight: float = Field(default=0.0)       # Peso de muestreo (valor x velocidad x antigüedad del último conteo)
+
+    system_quantity: Optional[int] = None    # Stock de la posición al momento de contar
+    counted_quantity: Optional[int] = None
+    variance: Optional[int] = None           # counted - system
+    document_id: Optional[int] = Field(default=None, foreign_key="stockdocument.id")
+
+    counted_by: Optional[int] = Field(default=None, foreign_key="user.id")
+    counted_at: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+# --- Sugerencia de reposición (última corrida del pronóstico de demanda por tenant) ---
+class ReorderSuggestion(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_reorder_suggestion_tenant_supplier", "tenant_id", "supplier_id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tenant_id: Optional[int] = Field(default=None, foreign_key="tenant.id")
+    product_id: int = Field(foreign_key="product.id")
+    supplier_id: Optional[int] = Field(default=None, foreign_key="supplier.id")  # Último proveedor que lo vendió
+
+    generated_for: date                     # Día local de la corrida
+    method: str                             # "sma" (media móvil), "ses" (suavizado exponencial)
+    forecast_daily: float                   # Demanda diaria pronosticada
+    demand_std: float                       # Desvío de la demanda diaria
+    lead_time_days: int
+    safety_stock: float
+    reorder_point: float
+    stock_quantity: int                     # Stock al momento de la corrida
+    suggested_quantity: int                 # A pedir (redondeado al bulto)
+    unit_cost: float = Field(default=0.0)   # Último costo de compra (o cost_price)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+# --- Historial de precios (una fila por producto y columna de precio modificada) ---
+class PriceHistory(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_price_history_tenant_product", "tenant_id", "product_id", "created_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tenant_id: Optional[int] = Field(default=None, foreign_key="tenant.id")
+    product_id: int = Field(index=True)     # Sin FK: el historial sobrevive al borrado del producto
+    price_field: str                        # "price", "price_bulk", "price_retail", "cost_price"
+    old_price: float
+    new_price: float
+    source: str = Field(default="bulk_update")  # "bulk_update", "price_list"
+    batch_id: Optional[str] = Field(default=None, index=True)  # Agrupa las filas de una misma operación
+    user_id: Optional[int] = Field(default=None, foreign_key="user.id")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+# --- Listas de precios programadas (se aplican sobre product al entrar en vigencia) ---
+class PriceList(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_price_list_status_effective", "status", "effective_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tenant_id: Optional[int] = Field(default=None, foreign_key="tenant.id", index=True)
+    name: str
+    effective_at: datetime                  # UTC naive; el scheduler la aplica al llegar esta hora
+    status: str = Field(default="scheduled")  # "scheduled", "applied", "cancelled", "failed"
+    item_count: int = Field(default=0)
+    applied_count: Optional[int] = None     # Productos efectivamente modificados
+    applied_at: Optional[datetime] = None
+    created_by: Optional[int] = Field(default=None, foreign_key="user.id")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class PriceListItem(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("price_list_id", "product_id", name="uq_price_list_item_product"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    price_list_id: int = Field(foreign_key="pricelist.id", index=True)
+    product_id: int                         # Sin FK: borrar un producto no bloquea listas pendientes
+    # None = la lista no cambia ese precio
+    price: Optional[float] = None
+    price_bulk: Optional[float] = None
+    price_retail: Optional[float] = None
+
+
+# --- Importación en segundo plano (archivo persistido, procesado por chunks) ---
+class ImportJob(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_import_job_tenant_created", "tenant_id", "created_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tenant_id: Optional[int] = Field(default=None, foreign_key="tenant.id")
+    user_id: Optional[int] = Field(default=None, foreign_key="user.id")
+
+    kind: str                               # "products", "products_simple", "clients", "client_ledger"
+    filename: str                           # Nombre original del archivo subido
+    file_path: str                          # Copia persistida en disco
+    status: str = Field(default="queued", index=True)  # queued, running, completed, failed, cancelled
+    cancel_requested: bool = Field(default=False)
+
+    chunk_size: int = Field(default=2000)
+    total_rows: Optional[int] = None
+    processed_rows: int = Field(default=0)
+    last_chunk: int = Field(default=-1)     # Último chunk confirmado (se reanuda desde el siguiente)
+    added: int = Field(default=0)
+    updated: int = Field(default=0)
+    error_count: int = Field(default=0)
+    errors_json: Optional[str] = None       # Primeros errores por fila (JSON)
+    message: Optional[str] = None           # Motivo de falla
+
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+# --- Rollups diarios de reportes (solo días cerrados, en UTC) ---
+# RollupDay marca que el día está agregado; una escritura que toca un día
+# cerrado borra la marca y el día se vuelve a agregar (job o primer reporte).
+class RollupDay(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "day", name="uq_rollup_day_tenant_day"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tenant_id: int = Field(foreign_key="tenant.id")
+    day: date
+    built_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class DailySalesRollup(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_daily_sales_tenant_day", "tenant_id", "day"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tenant_id: int = Field(foreign_key="tenant.id")
+    day: date
+    sale_count: int = Field(default=0)
+    total_amount: float = Field(default=0.0)
+
+
+class DailyProductRollup(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_daily_product_tenant_day", "tenant_id", "day"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tenant_id: int = Field(foreign_key="tenant.id")
+    day: date
+    product_name: str                       # Igual que el reporte: agrupa por nombre del ítem
+    units: int = Field(default=0)
+    amount: float = Field(default=0.0)
+
+
+class DailyMarginRollup(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_daily_margin_tenant_day", "tenant_id", "day"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tenant_id: int = Field(foreign_key="tenant.id")
+    day: date
+    product_id: Optional[int] = None
+    product_name: str
+    category: Optional[str] = None          # Categoría vigente al agregar el día
+    units: int = Field(default=0)
+    revenue: float = Field(default=0.0)
+    cost: float = Field(default=0.0)        # Sobre cost_price_at_sale
+    uncosted_units: int = Field(default=0)  # Unidades sin costo capturado
+
+
+class DailyCashRollup(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_daily_cash_tenant_day", "tenant_id", "day"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tenant_id: int = Field(foreign_key="tenant.id")
+    day: date
+    channel: str                            # reference_type del movimiento ("sale", "purchase", "manual"...)
+    ingresos: float = Field(default=0.0)
+    egresos: float = Field(default=0.0)     # Suma cruda de los "out" (el reporte aplica abs)
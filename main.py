@@ -4,6 +4,7 @@ from fastapi.staticfiles import StaticFiles
 # from fastapi.templating import Jinja2Templates
 from web.compat_templates import CompatTemplates
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from sqlmodel import Session, select, func, text, delete
 from pydantic import BaseModel
 from contextlib import asynccontextmanager
@@ -12,6 +13,7 @@ from datetime import datetime, date, timezone, timedelta
 from io import BytesIO
 import os
 import io
+import asyncio
 import shutil
 import uuid
 import json
@@ -21,10 +23,17 @@ import re
 import pandas as pd
 
 from database.session import create_db_and_tables, get_session, engine
-from database.models import Product, Sale, User, Settings, Client, Payment, SaleItem, Supplier, Purchase, PurchaseItem, CashMovement, Tenant
+from database.models import Product, Sale, User, Settings, Client, Payment, SaleItem, Supplier, Purchase, PurchaseItem, CashMovement, Tenant, PriceList, ImportJob
 from database.seed_data import seed_products
 from services.stock_service import StockService
 from services.auth_service import AuthService
+from services import stock_ledger
+from services.cycle_count_service import CycleCountService
+from services.forecast_service import ForecastService
+from services.pricing_service import PricingService
+from services.import_service import ClientImportService, ProductImportService
+from services import import_jobs, profitability, report_cache, sales_rollup, time_windows
+from services.errors import ServiceError
 from routers.admin import router as admin_router
 from routers.picking import router as picking_router
 from routers.wms import router as wms_router
@@ -55,6 +64,8 @@ def ensure_schema_compatibility(session: Session):
         "ALTER TABLE stockmovement ADD COLUMN IF NOT EXISTS tenant_id INTEGER",
         "ALTER TABLE stockmovement ADD COLUMN IF NOT EXISTS request_id VARCHAR",
         "ALTER TABLE stockmovement ADD COLUMN IF NOT EXISTS user_id INTEGER",
+        "ALTER TABLE stockmovement ADD COLUMN IF NOT EXISTS document_id INTEGER",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_movement_tenant_request ON stockmovement (tenant_id, request_id) WHERE request_id IS NOT NULL",
         # Cash & Reports
         "ALTER TABLE cashmovement ADD COLUMN IF NOT EXISTS reference_id INTEGER",
         "ALTER TABLE cashmovement ADD COLUMN IF NOT EXISTS reference_type VARCHAR",
@@ -63,6 +74,8 @@ def ensure_schema_compatibility(session: Session):
         "ALTER TABLE sale ADD COLUMN IF NOT EXISTS amount_cash FLOAT DEFAULT 0.0",
         "ALTER TABLE sale ADD COLUMN IF NOT EXISTS amount_transfer FLOAT DEFAULT 0.0",
         "ALTER TABLE sale ADD COLUMN IF NOT EXISTS payment_method VARCHAR DEFAULT 'cash'",
+        "ALTER TABLE sale ADD COLUMN IF NOT EXISTS picked_at TIMESTAMP",
+        "ALTER TABLE sale ADD COLUMN IF NOT EXISTS needs_picking BOOLEAN DEFAULT FALSE",
         # Products & Clients (Compatibility)
         "ALTER TABLE product ADD COLUMN IF NOT EXISTS price_bulk FLOAT",
         "ALTER TABLE product ADD COLUMN IF NOT EXISTS price_retail FLOAT",
@@ -74,6 +87,10 @@ def ensure_schema_compatibility(session: Session):
         "ALTER TABLE client ADD COLUMN IF NOT EXISTS iva_category VARCHAR",
         "ALTER TABLE client ADD COLUMN IF NOT EXISTS transport_name VARCHAR",
         "ALTER TABLE client ADD COLUMN IF NOT EXISTS transport_address VARCHAR",
+        # Día de negocio por tenant
+        "ALTER TABLE settings ADD COLUMN IF NOT EXISTS timezone VARCHAR DEFAULT 'America/Argentina/Buenos_Aires'",
+        # Costo al vender (rentabilidad)
+        "ALTER TABLE saleitem ADD COLUMN IF NOT EXISTS cost_price_at_sale FLOAT",
     ]
     for stmt in stmts:
         try:
@@ -82,6 +99,87 @@ def ensure_schema_compatibility(session: Session):
         except Exception:
             session.rollback()
 
+def _run_due_checkpoints():
+    with Session(engine) as session:
+        tenant_ids = session.exec(select(Tenant.id).where(Tenant.is_active == True)).all()
+        for tenant_id in tenant_ids:
+            try:
+                stock_ledger.checkpoint_if_due(session, tenant_id)
+            except Exception:
+                session.rollback()
+                logger.exception("Stock checkpoint failed for tenant %s", tenant_id)
+
+
+def _run_cycle_count_generation():
+    """Tareas de conteo cíclico del día (CYCLE_COUNT_DAILY_TASKS > 0 para habilitar)."""
+    daily_tasks = int(os.getenv("CYCLE_COUNT_DAILY_TASKS", "0") or 0)
+    if daily_tasks <= 0:
+        return
+    with Session(engine) as session:
+        tenant_ids = session.exec(select(Tenant.id).where(Tenant.is_active == True)).all()
+        for tenant_id in tenant_ids:
+            try:
+                CycleCountService.generate_daily_tasks(session, tenant_id, count=daily_tasks)
+            except Exception:
+                session.rollback()
+                logger.exception("Cycle count generation failed for tenant %s", tenant_id)
+
+
+def _run_sales_rollups():
+    """Rollups diarios de los días cerrados recientes (los reportes leen de ahí)."""
+    with Session(engine) as session:
+        tenant_ids = session.exec(select(Tenant.id).where(Tenant.is_active == True)).all()
+        for tenant_id in tenant_ids:
+            try:
+                sales_rollup.build_recent(session, tenant_id)
+            except Exception:
+                session.rollback()
+                logger.exception("Sales rollup failed for tenant %s", tenant_id)
+
+
+def _run_demand_forecast():
+    """Pronóstico de demanda y sugerencias de reposición, una vez por día (DEMAND_FORECAST_DAILY=1 para habilitar)."""
+    if os.getenv("DEMAND_FORECAST_DAILY", "0") != "1":
+        return
+    with Session(engine) as session:
+        tenant_ids = session.exec(select(Tenant.id).where(Tenant.is_active == True)).all()
+        for tenant_id in tenant_ids:
+            try:
+                ForecastService.run_if_due(session, tenant_id)
+            except Exception:
+                session.rollback()
+                logger.exception("Demand forecast failed for tenant %s", tenant_id)
+
+
+def _run_due_price_lists():
+    with Session(engine) as session:
+        try:
+            applied = PricingService.apply_due_price_lists(session)
+            if applied:
+                logger.info("Price lists applied: %s", applied)
+        except Exception:
+            session.rollback()
+            logger.exception("Price list activation failed")
+
+
+async def _price_list_loop():
+    """Activa listas de precios programadas (resolución de PRICE_LIST_POLL_SECONDS)."""
+    interval = float(os.getenv("PRICE_LIST_POLL_SECONDS", "30"))
+    while True:
+        await run_in_threadpool(_run_due_price_lists)
+        await asyncio.sleep(interval)
+
+
+async def _stock_checkpoint_loop():
+    """Checkpoint diario de stock por tenant (base del endpoint stock al día X), conteo cíclico, rollups de ventas y pronóstico de demanda."""
+    while True:
+        await run_in_threadpool(_run_due_checkpoints)
+        await run_in_threadpool(_run_cycle_count_generation)
+        await run_in_threadpool(_run_sales_rollups)
+        await run_in_threadpool(_run_demand_forecast)
+        await asyncio.sleep(3600)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_db_and_tables()
@@ -95,7 +193,13 @@ async def lifespan(app: FastAPI):
 
         if os.getenv("SEED_ON_START") == "1":
             seed_products(session)
+    checkpoint_task = asyncio.create_task(_stock_checkpoint_loop())
+    price_list_task = asyncio.create_task(_price_list_loop())
+    await run_in_threadpool(import_jobs.resume_pending)
     yield
+    checkpoint_task.cancel()
+    price_list_task.cancel()
+    import_jobs.shutdown()
 
 
 app = FastAPI(title="NexPos System", lifespan=lifespan)
@@ -186,13 +290,15 @@ def get_dashboard(request: Request, user: User = Depends(require_auth), settings
     low_stock = session.exec(select(func.count(Product.id)).where(Product.tenant_id == tenant_id, Product.stock_quantity < Product.min_stock_level)).one()
     recent_sales = session.exec(select(Sale).where(Sale.tenant_id == tenant_id, Sale.is_closed == False).order_by(Sale.timestamp.desc()).limit(5)).all()
     
-    # Calculate Today's Sales
+    # Calculate Today's Sales (día de negocio local del tenant)
+    zone = time_windows.tenant_zone(session, tenant_id)
+    today_start, today_end = time_windows.day_window(time_windows.local_today(zone), zone)
 
-    today_start = datetime.combine(date.today(), datetime.min.time())
-    
-    # Sum total_amount for sales >= today_start AND not closed
+    # Sum total_amount for today's sales AND not closed
     today_sales_total = session.exec(
-        select(func.sum(Sale.total_amount)).where(Sale.tenant_id == tenant_id, Sale.timestamp >= today_start, Sale.is_closed == False)
+        select(func.sum(Sale.total_amount)).where(
+            Sale.tenant_id == tenant_id, Sale.timestamp >= today_start, Sale.timestamp < today_end, Sale.is_closed == False
+        )
     ).one() or 0.0
     
     return templates.TemplateResponse("dashboard.html", {
@@ -395,12 +501,13 @@ def get_sales_page(request: Request, user: User = Depends(require_auth), setting
     sales = session.exec(select(Sale).where(Sale.tenant_id == tenant_id, Sale.is_closed == False).order_by(Sale.timestamp.desc())).all()
     low_stock_products = session.exec(select(Product).where(Product.tenant_id == tenant_id, Product.stock_quantity < Product.min_stock_level)).all()
     
-    # Group Sales by Date
+    # Group Sales by Date (día local del tenant)
     from collections import defaultdict
+    zone = time_windows.tenant_zone(session, tenant_id)
     daily_groups = defaultdict(list)
     
     for sale in sales:
-        date_str = sale.timestamp.strftime('%Y-%m-%d')
+        date_str = time_windows.local_day(sale.timestamp, zone).isoformat()
         daily_groups[date_str].append(sale)
         
     # Create structured reports
@@ -450,11 +557,10 @@ def trigger_backup(request: Request, user: User = Depends(require_auth), setting
         session.add(sale)
         
     # --- 2. Calcular Balance Actual para el Cierre ---
-    # Usamos la misma lógica que get_cash_book pero para 'ahora'
-    # Importante: Usamos UTC para la base de datos
-    today_utc = datetime.now(timezone.utc).date()
-    start_of_day = datetime.combine(today_utc, datetime.min.time()).replace(tzinfo=timezone.utc)
-    end_of_day = start_of_day + timedelta(days=1)
+    # Usamos la misma lógica que get_cash_book pero para 'ahora': día local del
+    # tenant traducido a un rango UTC (la base guarda UTC)
+    zone = time_windows.tenant_zone(session, tenant_id)
+    start_of_day, end_of_day = time_windows.day_window(time_windows.local_today(zone), zone)
     
     # Sumar Movimientos de Caja
     movements_today = session.exec(
@@ -539,7 +645,7 @@ def trigger_backup(request: Request, user: User = Depends(require_auth), setting
     from collections import defaultdict
     daily_groups = defaultdict(list)
     for sale in sales:
-        date_str = sale.timestamp.strftime('%Y-%m-%d')
+        date_str = time_windows.local_day(sale.timestamp, zone).isoformat()
         daily_groups[date_str].append(sale)
         
     daily_reports = []
@@ -678,49 +784,32 @@ def get_profitability_report(
     session: Session = Depends(get_session),
     settings: Settings = Depends(get_settings),
 ):
-    # Default range: current month
-    if not start_date:
-        start_date = date.today().replace(day=1).strftime("%Y-%m-%d")
-    if not end_date:
-        end_date = date.today().strftime("%Y-%m-%d")
-
-    s_dt = datetime.strptime(start_date, "%Y-%m-%d")
-    e_dt = datetime.combine(datetime.strptime(end_date, "%Y-%m-%d"), datetime.max.time())
-
-    # Calculate net profit using historical cost captured at time of sale
-    from sqlalchemy import select
-    from database.models import SaleItem, Sale
-    
-    stmt = (
-        select(SaleItem)
-        .join(Sale)
-        .where(
-            Sale.tenant_id == tenant_id,
-            Sale.timestamp >= s_dt,
-            Sale.timestamp <= e_dt
-        )
+    # Default range: current month (días locales del tenant)
+    zone = time_windows.tenant_zone(session, tenant_id)
+    today = time_windows.local_today(zone)
+    first = time_windows.parse_day(start_date, zone, today.replace(day=1))
+    last = time_windows.parse_day(end_date, zone, today)
+    start_date, end_date = str(first), str(last)
+    if last < first:
+        raise HTTPException(400, "La fecha final es anterior a la inicial")
+
+    # Agregado SQL sobre el costo capturado al vender (rollups para días cerrados), cacheado
+    result = report_cache.get(
+        session, tenant_id, "profitability", (start_date, end_date),
+        lambda s: profitability.report(s, tenant_id, first, last),
     )
-    items = session.exec(stmt).all()
-
-    total_revenue = 0.0
-    total_cost = 0.0
-    
-    for item in items:
-        qty = item.quantity or 0
-        price = item.unit_price or 0
-        cost = item.cost_price_at_sale or 0
-        total_revenue += (qty * price)
-        total_cost += (qty * cost)
-
-    profit = total_revenue - total_cost
-    margin = (profit / total_revenue * 100) if total_revenue > 0 else 0
+    totals = result["totals"]
 
     return templates.TemplateResponse("reports/profitability.html", {
         "request": request,
-        "total_revenue": total_revenue,
-        "total_cost": total_cost,
-        "profit": profit,
-        "margin": margin,
+        "total_revenue": totals["revenue"],
+        "total_cost": totals["cost"],
+        "profit": totals["profit"],
+        "margin": totals["margin"],
+        "uncosted_units": totals["uncosted_units"],
+        "by_day": result["by_day"],
+        "by_category": result["by_category"],
+        "by_product": result["by_product"],
         "start_date": start_date,
         "end_date": end_date,
         "user": user,
@@ -735,16 +824,10 @@ def get_cash_flow_report(
     tenant_id: int = Depends(get_tenant), 
     session: Session = Depends(get_session)
 ):
-    if not date_filter:
-        date_filter = date.today().strftime("%Y-%m-%d")
-    try:
-        target_day = datetime.strptime(date_filter, "%Y-%m-%d")
-    except ValueError:
-        target_day = datetime.combine(date.today(), datetime.min.time())
-        date_filter = target_day.strftime("%Y-%m-%d")
-
-    target_date_start = target_day.replace(hour=0, minute=0, second=0)
-    target_date_end = target_day.replace(hour=23, minute=59, second=59)
+    zone = time_windows.tenant_zone(session, tenant_id)
+    target_day = time_windows.parse_day(date_filter, zone)
+    date_filter = target_day.strftime("%Y-%m-%d")
+    target_date_start, target_date_end = time_windows.day_window(target_day, zone)
 
     from database.models import CashMovement
     stmt = (
@@ -752,7 +835,7 @@ def get_cash_flow_report(
         .where(
             CashMovement.tenant_id == tenant_id,
             CashMovement.timestamp >= target_date_start,
-            CashMovement.timestamp <= target_date_end
+            CashMovement.timestamp < target_date_end
         )
         .order_by(CashMovement.timestamp.desc())
     )
@@ -794,7 +877,7 @@ def get_cash_flow_report(
         select(Sale).where(
             Sale.tenant_id == tenant_id,
             Sale.timestamp >= target_date_start,
-            Sale.timestamp <= target_date_end,
+            Sale.timestamp < target_date_end,
             Sale.amount_paid > 0
         )
     ).all()
@@ -877,6 +960,7 @@ def get_client_statement_print(
 @app.post("/api/products/import")
 async def import_products_excel(
     file: UploadFile = File(...), 
+    background: bool = Query(False),
     session: Session = Depends(get_session), 
     tenant_id: int = Depends(get_tenant), 
     user: User = Depends(require_auth)
@@ -884,58 +968,43 @@ async def import_products_excel(
     if user.role != "admin": raise HTTPException(403)
     if not file or not file.filename:
         raise HTTPException(status_code=400, detail="Archivo inválido")
+    if background:
+        return await _start_import_job(session, tenant_id, user, "products_simple", file)
 
     ext = file.filename.split(".")[-1].lower()
+    if ext == "csv":
+        # CSV: se parsea y confirma por chunks directo desde el upload (memoria acotada)
+        try:
+            result = await run_in_threadpool(
+                ProductImportService.import_csv_stream, session, tenant_id, file.file, ("barcode", "name"), user.id
+            )
+        except (pd.errors.ParserError, UnicodeDecodeError) as e:
+            raise HTTPException(400, f"Error reading file: {str(e)}")
+        return {
+            "status": "partial" if result["partial"] else "success",
+            "message": result["message"],
+            "created": result["added"],
+            "updated": result["updated"],
+            "error_count": result["error_count"],
+            "errors": [f"Fila {e['row']}: {e['error']}" for e in result["errors"]],
+        }
+
     contents = await file.read()
-    
     try:
-        if ext == "csv":
-            df = pd.read_csv(io.BytesIO(contents))
-        else:
-            df = pd.read_excel(io.BytesIO(contents))
+        df = pd.read_excel(io.BytesIO(contents))
     except Exception as e:
         raise HTTPException(400, f"Error reading file: {str(e)}")
 
-    df.columns = [c.lower().strip() for c in df.columns]
-    
-    processed = 0
-    updated = 0
-    
-    for _, row in df.iterrows():
-        p_name = row.get("nombre") or row.get("name")
-        p_price = row.get("precio") or row.get("price") or 0
-        p_cost = row.get("costo") or row.get("cost") or 0
-        p_stock = row.get("stock") or 0
-        p_barcode = str(row.get("codigo") or row.get("barcode") or "").strip()
-        
-        if not p_name: continue
-        
-        existing = None
-        if p_barcode and p_barcode != "nan":
-            existing = session.exec(select(Product).where(Product.barcode == p_barcode, Product.tenant_id == tenant_id)).first()
-        else:
-            existing = session.exec(select(Product).where(Product.name == p_name, Product.tenant_id == tenant_id)).first()
-            
-        if existing:
-            existing.price = float(p_price)
-            existing.cost_price = float(p_cost)
-            existing.stock_quantity = int(p_stock)
-            session.add(existing)
-            updated += 1
-        else:
-            new_prod = Product(
-                tenant_id=tenant_id,
-                name=str(p_name),
-                price=float(p_price),
-                cost_price=float(p_cost),
-                stock_quantity=int(p_stock),
-                barcode=p_barcode if (p_barcode and p_barcode != "nan") else None
-            )
-            session.add(new_prod)
-            processed += 1
-            
-    session.commit()
-    return {"status": "success", "created": processed, "updated": updated}
+    # Sin código de barras el producto se busca por nombre
+    result = await run_in_threadpool(
+        ProductImportService.import_frame, session, tenant_id, df, None, ("barcode", "name"), user.id, 2
+    )
+    return {
+        "status": "success",
+        "created": result["added"],
+        "updated": result["updated"],
+        "errors": [f"Fila {e['row']}: {e['error']}" for e in result["errors"]],
+    }
 
 @app.delete("/api/products/{id}")
 def delete_product_api(id: int, session: Session = Depends(get_session), user: User = Depends(require_auth), tenant_id: int = Depends(get_tenant)):
@@ -1309,13 +1378,9 @@ def get_cash_book(
     tenant_id: int = Depends(get_tenant),
     session: Session = Depends(get_session),
 ):
-    try:
-        target_date = datetime.fromisoformat(date_filter).date() if date_filter else date.today()
-    except ValueError:
-        target_date = date.today()
-
-    day_start = datetime.combine(target_date, datetime.min.time()).replace(tzinfo=timezone.utc)
-    day_end = day_start + timedelta(days=1)
+    zone = time_windows.tenant_zone(session, tenant_id)
+    target_date = time_windows.parse_day(date_filter, zone)
+    day_start, day_end = time_windows.day_window(target_date, zone)
 
     movements = session.exec(
         select(CashMovement)
@@ -1447,7 +1512,8 @@ def create_sale_api(sale_data: dict, session: Session = Depends(get_session), us
             amount_paid=sale_data.get("amount_paid"),
             payment_method=sale_data.get("payment_method", "cash"),
             split_cash=sale_data.get("split_cash"),
-            split_transfer=sale_data.get("split_transfer")
+            split_transfer=sale_data.get("split_transfer"),
+            needs_picking=bool(sale_data.get("needs_picking", False))
         )
         return sale
     except ValueError as e:
@@ -1563,203 +1629,92 @@ def download_import_template(type: str, user: User = Depends(require_auth)):
     }
     return StreamingResponse(output, headers=headers, media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
 
+async def _start_import_job(session: Session, tenant_id: int, user: User, kind: str, file: UploadFile):
+    """Guarda el archivo y encola la importación; el cliente consulta /api/import/jobs/{id}."""
+    job = await run_in_threadpool(
+        import_jobs.create_job, session, tenant_id, user.id, kind, file.file, file.filename
+    )
+    import_jobs.submit(job.id)
+    return import_jobs.job_dict(job)
+
+@app.get("/api/import/jobs")
+def list_import_jobs(session: Session = Depends(get_session), user: User = Depends(require_auth), tenant_id: int = Depends(get_tenant)):
+    jobs = session.exec(
+        select(ImportJob).where(ImportJob.tenant_id == tenant_id).order_by(ImportJob.created_at.desc()).limit(50)
+    ).all()
+    return [import_jobs.job_dict(job) for job in jobs]
+
+@app.get("/api/import/jobs/{job_id}")
+def get_import_job(job_id: int, session: Session = Depends(get_session), user: User = Depends(require_auth), tenant_id: int = Depends(get_tenant)):
+    job = session.get(ImportJob, job_id)
+    if not job or job.tenant_id != tenant_id: raise HTTPException(404, "Importación no encontrada")
+    return import_jobs.job_dict(job)
+
+@app.post("/api/import/jobs/{job_id}/cancel")
+def cancel_import_job(job_id: int, session: Session = Depends(get_session), user: User = Depends(require_auth), tenant_id: int = Depends(get_tenant)):
+    if user.role != "admin": raise HTTPException(403)
+    try:
+        return import_jobs.job_dict(import_jobs.request_cancel(session, tenant_id, job_id))
+    except ServiceError as e:
+        raise HTTPException(e.status_code, e.message)
+
+@app.post("/api/import/jobs/{job_id}/resume")
+def resume_import_job(job_id: int, session: Session = Depends(get_session), user: User = Depends(require_auth), tenant_id: int = Depends(get_tenant)):
+    if user.role != "admin": raise HTTPException(403)
+    try:
+        return import_jobs.job_dict(import_jobs.resume(session, tenant_id, job_id))
+    except ServiceError as e:
+        raise HTTPException(e.status_code, e.message)
+
 @app.post("/api/import/products")
-async def import_products(file: UploadFile = File(...), session: Session = Depends(get_session), user: User = Depends(require_auth), tenant_id: int = Depends(get_tenant)):
+async def import_products(file: UploadFile = File(...), background: bool = Query(False), session: Session = Depends(get_session), user: User = Depends(require_auth), tenant_id: int = Depends(get_tenant)):
     if user.role != "admin": raise HTTPException(403)
-    
+    if background:
+        return await _start_import_job(session, tenant_id, user, "products", file)
 
-    import io
-    
     contents = await file.read()
-    df = pd.read_excel(io.BytesIO(contents))
-    
-    added = 0
-    updated = 0
-    errors = []
-    
-    for index, row in df.iterrows():
-        try:
-            # Safe Helpers
-            def get_int(val, default=0):
-                if pd.isna(val): return default
-                try: return int(float(val))
-                except: return default
-
-            def get_float(val, default=0.0):
-                if pd.isna(val): return default
-                try: return float(val)
-                except: return default
-
-            name = str(row.get('Name', '')).strip()
-            if not name or name.lower() == 'nan' or pd.isna(name): continue
-            
-            barcode = str(row.get('Barcode', '')).strip()
-            if pd.isna(barcode) or barcode.lower() == 'nan': barcode = None
-            
-            # Helper to get optional fields safely
-            def get_str(col):
-                val = row.get(col)
-                if pd.isna(val): return None
-                s = str(val).strip()
-                return s if s.lower() != 'nan' else None
-                
-            category = get_str('Category')
-            description = get_str('Description')
-            numeracion = get_str('Numeracion')
-            item_number = get_str('ItemNumber')
-            
-            cant_bulto_raw = row.get('CantBulto')
-            cant_bulto = get_int(cant_bulto_raw, None) if not pd.isna(cant_bulto_raw) else None
-            
-            stock = get_int(row.get('Stock'), 0)
-            price = get_float(row.get('Price'), 0.0)
-            
-            # New Price Fields
-            price_retail_raw = row.get('PriceRetail')
-            price_retail = get_float(price_retail_raw, None) if not pd.isna(price_retail_raw) else None
+    try:
+        df = pd.read_excel(io.BytesIO(contents))
+    except Exception as e:
+        raise HTTPException(400, f"Error reading file: {str(e)}")
 
-            price_bulk_raw = row.get('PriceBulk')
-            price_bulk = get_float(price_bulk_raw, None) if not pd.isna(price_bulk_raw) else None
-            
-            existing = None
-            if barcode:
-                existing = session.exec(select(Product).where(Product.barcode == barcode, Product.tenant_id == tenant_id)).first()
-            
-            # Fallback: Try match by item_number if barcode provided is None or not found
-            if not existing and item_number:
-                 existing = session.exec(select(Product).where(Product.item_number == item_number, Product.tenant_id == tenant_id)).first()
-
-            if existing:
-                # Update
-                existing.name = name 
-                existing.price = price
-                existing.stock_quantity = stock
-                if category: existing.category = category
-                if description: existing.description = description
-                if numeracion: existing.numeracion = numeracion
-                if cant_bulto is not None: existing.cant_bulto = cant_bulto
-                if item_number: existing.item_number = item_number
-                if price_retail is not None: existing.price_retail = price_retail
-                if price_bulk is not None: existing.price_bulk = price_bulk
-                
-                session.add(existing)
-                updated += 1
-            else:
-                # Create
-                should_generate = False
-                if not barcode:
-                    should_generate = True
-                    # Temp placeholder to satisfy NOT NULL constraint during flush
-            
-                    barcode = f"TMP-{uuid.uuid4().hex[:8]}"
-
-                prod = Product(
-                    tenant_id=tenant_id,
-                    name=name,
-                    price=price,
-                    stock_quantity=stock,
-                    barcode=barcode,
-                    category=category,
-                    description=description,
-                    numeracion=numeracion,
-                    cant_bulto=cant_bulto,
-                    item_number=item_number,
-                    price_retail=price_retail,
-                    price_bulk=price_bulk
-                )
-                session.add(prod)
-                
-                if should_generate:
-                    session.flush()
-                    prod.barcode = str(prod.id).zfill(8)
-                    session.add(prod)
-                    
-                added += 1
-                
-        except Exception as e:
-            errors.append(f"Row {index}: {str(e)}")
-            
-    session.commit()
-    return {"added": added, "updated": updated, "errors": errors}
+    # Fila 1 = encabezados: los errores se informan con el número de fila de la planilla
+    result = await run_in_threadpool(
+        ProductImportService.import_frame, session, tenant_id, df, None, ("barcode", "item_number"), user.id, 2
+    )
+    return {
+        "added": result["added"],
+        "created": result["added"],
+        "updated": result["updated"],
+        "errors": [f"Fila {e['row']}: {e['error']}" for e in result["errors"]],
+    }
 
 @app.post("/api/import/clients")
-async def import_clients(file: UploadFile = File(...), session: Session = Depends(get_session), user: User = Depends(require_auth), tenant_id: int = Depends(get_tenant)):
+async def import_clients(file: UploadFile = File(...), background: bool = Query(False), session: Session = Depends(get_session), user: User = Depends(require_auth), tenant_id: int = Depends(get_tenant)):
     if user.role != "admin": raise HTTPException(403)
-    
+    if background:
+        return await _start_import_job(session, tenant_id, user, "clients", file)
 
-    import io
-    
     contents = await file.read()
     df = pd.read_excel(io.BytesIO(contents))
-    
-    added = 0
-    errors = []
-    
-    for index, row in df.iterrows():
-        try:
-            name = str(row.get('Name', '')).strip()
-            if not name or pd.isna(name): continue
-            
-            # Check duplicate by name?
-            existing = session.exec(select(Client).where(Client.name == name, Client.tenant_id == tenant_id)).first()
-            
-            # Helper
-            def get_val(col, default=None):
-                val = row.get(col)
-                return str(val).strip() if not pd.isna(val) else default
-                
-            phone = get_val('Phone')
-            email = get_val('Email')
-            address = get_val('Address')
-            razon_social = get_val('RazonSocial')
-            cuit = get_val('CUIT')
-            iva_category = get_val('IVACategory')
-            transport_name = get_val('TransportName')
-            transport_address = get_val('TransportAddress')
-            
-            credit_limit = row.get('CreditLimit')
-            if pd.isna(credit_limit): credit_limit = None
-            else: credit_limit = float(credit_limit)
-            
-            if existing:
-                # Update existing client
-                if phone: existing.phone = phone
-                if email: existing.email = email
-                if address: existing.address = address
-                if razon_social: existing.razon_social = razon_social
-                if cuit: existing.cuit = cuit
-                if iva_category: existing.iva_category = iva_category
-                if credit_limit is not None: existing.credit_limit = credit_limit
-                if transport_name: existing.transport_name = transport_name
-                if transport_address: existing.transport_address = transport_address
-                session.add(existing)
-                # skipping "added" increment, maybe tack "updated" count later? For now just don't create dupes.
-            else:
-                client = Client(
-                    tenant_id=tenant_id,
-                    name=name,
-                    phone=phone,
-                    email=email,
-                    address=address,
-                    razon_social=razon_social,
-                    cuit=cuit,
-                    iva_category=iva_category,
-                    credit_limit=credit_limit,
-                    transport_name=transport_name,
-                    transport_address=transport_address
-                )
-                session.add(client)
-                added += 1
-        except Exception as e:
-            errors.append(f"Row {index}: {str(e)}")
-            
-    session.commit()
-    return {"added": added, "errors": errors}
+    # Fila 1 = encabezados: el reporte usa el número de fila de la planilla
+    result = await run_in_threadpool(ClientImportService.import_frame, session, tenant_id, df, 2)
+    return {
+        "added": result["added"],
+        "updated": result["updated"],
+        "errors": [f"Fila {e['row']}: {e['error']}" for e in result["errors"]],
+        "report": result["report"],
+    }
 
 class BulkPriceUpdate(BaseModel):
     update_type: str  # "all" or "list"
     percentage: float # 10.0 for 10%, -5.0 for discount
     product_ids: Optional[List[int]] = None
+    fields: List[str] = ["price"]      # price, price_bulk, price_retail, cost_price
+    category: Optional[str] = None
+    supplier_id: Optional[int] = None
+    round_to: float = 0.01             # 0.01, 1, 10, 50, 100...
+    rounding: str = "nearest"          # nearest, up, down
 
 @app.post("/api/products/bulk-update-price")
 def bulk_update_price(
@@ -1769,29 +1724,85 @@ def bulk_update_price(
     tenant_id: int = Depends(get_tenant)
 ):
     if user.role != "admin": raise HTTPException(403, "Solo administradores")
-    
-    products = []
+
     if data.update_type == "all":
-        products = session.exec(select(Product).where(Product.tenant_id == tenant_id)).all()
+        product_ids = None
     elif data.update_type == "list":
         if not data.product_ids or len(data.product_ids) == 0:
             raise HTTPException(400, "No se seleccionaron productos")
-        products = session.exec(select(Product).where(Product.id.in_(data.product_ids), Product.tenant_id == tenant_id)).all()
+        product_ids = data.product_ids
     else:
         raise HTTPException(400, "Tipo de actualización inválido")
-        
-    multiplier = 1 + (data.percentage / 100.0)
-    count = 0
-    
-    for p in products:
-        # Check if price is None (shouldn't be, but safety)
-        if p.price is not None:
-            p.price = round(p.price * multiplier, 2)
-            session.add(p)
-            count += 1
-            
-    session.commit()
-    return {"status": "success", "updated_count": count}
+
+    try:
+        return PricingService.bulk_update_price(
+            session, tenant_id, data.percentage, tuple(data.fields),
+            product_ids=product_ids, category=data.category, supplier_id=data.supplier_id,
+            round_to=data.round_to, rounding=data.rounding, user_id=user.id,
+        )
+    except ServiceError as e:
+        raise HTTPException(e.status_code, e.message)
+
+
+class PriceListItemIn(BaseModel):
+    product_id: int
+    price: Optional[float] = None
+    price_bulk: Optional[float] = None
+    price_retail: Optional[float] = None
+
+class PriceListCreate(BaseModel):
+    name: str
+    effective_at: datetime  # ISO-8601; sin zona se toma como UTC
+    items: List[PriceListItemIn]
+
+def _price_list_dict(pl):
+    return {
+        "id": pl.id, "name": pl.name, "effective_at": pl.effective_at, "status": pl.status,
+        "item_count": pl.item_count, "applied_count": pl.applied_count, "applied_at": pl.applied_at,
+    }
+
+@app.post("/api/price-lists")
+def create_price_list(
+    data: PriceListCreate,
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant)
+):
+    """Programa una lista de precios; el scheduler la aplica al llegar effective_at."""
+    if user.role != "admin": raise HTTPException(403, "Solo administradores")
+    try:
+        price_list = PricingService.create_price_list(
+            session, tenant_id, data.name, data.effective_at,
+            [item.model_dump() for item in data.items], user.id,
+        )
+    except ServiceError as e:
+        raise HTTPException(e.status_code, e.message)
+    return _price_list_dict(price_list)
+
+@app.get("/api/price-lists")
+def list_price_lists(
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant)
+):
+    lists = session.exec(
+        select(PriceList).where(PriceList.tenant_id == tenant_id).order_by(PriceList.effective_at.desc()).limit(200)
+    ).all()
+    return [_price_list_dict(pl) for pl in lists]
+
+@app.post("/api/price-lists/{price_list_id}/cancel")
+def cancel_price_list(
+    price_list_id: int,
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant)
+):
+    if user.role != "admin": raise HTTPException(403, "Solo administradores")
+    try:
+        PricingService.cancel_price_list(session, tenant_id, price_list_id)
+    except ServiceError as e:
+        raise HTTPException(e.status_code, e.message)
+    return {"ok": True}
 
 
 # SEED TEST DATA
@@ -3,8 +3,10 @@ from __future__ import annotations
 import gzip
 import json
 import os
+import shutil
+import tempfile
 import uuid
-from io import BytesIO
+import zipfile
 from typing import Optional
 from datetime import datetime, date, timedelta
 from sqlalchemy import case
@@ -13,6 +15,7 @@ import pandas as pd
 from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
 from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, Response, StreamingResponse
 from sqlmodel import Session, delete, select
+from starlette.background import BackgroundTask
 
 from database.models import Client, Product, Sale, Settings, User, Tenant, SaleItem, CashMovement, Supplier, Payment, Purchase, AICredential
 from database.session import get_session
@@ -22,6 +25,9 @@ from services.migration_service import run_schema_migrations
 from services.settings_service import SettingsService
 from services.tenant_backup_service import export_tenant_snapshot, restore_tenant_snapshot
 from services.purchase_service import PurchaseService
+from services import export_service, import_jobs, parquet_export, report_cache, sales_rollup, stock_ledger, time_windows
+from services.errors import ServiceError
+from services.client_ledger_import import import_ledger
 from web.dependencies import get_settings, get_tenant, require_auth, require_superadmin
 from sqlmodel import func, col
 import requests
@@ -74,6 +80,7 @@ async def update_settings(
     printer_name: Optional[str] = Form(None),
     label_width_mm: Optional[int] = Form(None),
     label_height_mm: Optional[int] = Form(None),
+    timezone: Optional[str] = Form(None),
     logo_file: Optional[UploadFile] = File(None),
     session: Session = Depends(get_session),
     user: User = Depends(require_auth),
@@ -90,6 +97,7 @@ async def update_settings(
         printer_name=printer_name,
         label_width_mm=label_width_mm,
         label_height_mm=label_height_mm,
+        timezone=timezone,
         logo_file=logo_file,
     )
     return {"status": "success"}
@@ -276,71 +284,13 @@ def reports_page(
     )
 
 
-@router.get("/api/reports/summary")
-def reports_summary(
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-    export: Optional[str] = None,
-    session: Session = Depends(get_session),
-    user: User = Depends(require_auth),
-    tenant_id: int = Depends(get_tenant),
-):
-    SettingsService.ensure_admin(user)
-
-    end_dt = _parse_date(end_date) or date.today()
-    start_dt = _parse_date(start_date) or (end_dt - timedelta(days=29))
-    start_ts = datetime.combine(start_dt, datetime.min.time())
-    end_ts = datetime.combine(end_dt + timedelta(days=1), datetime.min.time())
-
-    sales_rows = session.exec(
-        select(
-            func.date(Sale.timestamp).label("day"),
-            func.sum(Sale.total_amount).label("total"),
-        )
-        .where(Sale.tenant_id == tenant_id, Sale.timestamp >= start_ts, Sale.timestamp < end_ts)
-        .group_by(func.date(Sale.timestamp))
-        .order_by(func.date(Sale.timestamp))
-    ).all()
-    sales_by_day = [{"day": str(r.day), "total": float(r.total or 0)} for r in sales_rows]
-
-    top_rows = session.exec(
-        select(
-            SaleItem.product_name.label("product_name"),
-            func.sum(SaleItem.quantity).label("units"),
-            func.sum(SaleItem.total).label("amount"),
-        )
-        .join(Sale, Sale.id == SaleItem.sale_id)
-        .where(Sale.tenant_id == tenant_id, Sale.timestamp >= start_ts, Sale.timestamp < end_ts)
-        .group_by(SaleItem.product_name)
-        .order_by(func.sum(SaleItem.total).desc())
-        .limit(10)
-    ).all()
-    top_products = [
-        {
-            "product_name": r.product_name,
-            "units": int(r.units or 0),
-            "amount": float(r.amount or 0),
-        }
-        for r in top_rows
-    ]
-
-    cash_rows = session.exec(
-        select(
-            func.date(CashMovement.timestamp).label("day"),
-            func.sum(case((CashMovement.movement_type == "in", CashMovement.amount), else_=0)).label("ingresos"),
-            func.sum(case((CashMovement.movement_type == "out", CashMovement.amount), else_=0)).label("egresos"),
-        )
-        .where(CashMovement.tenant_id == tenant_id, CashMovement.timestamp >= start_ts, CashMovement.timestamp < end_ts)
-        .group_by(func.date(CashMovement.timestamp))
-        .order_by(func.date(CashMovement.timestamp))
-    ).all()
-    cash_by_day = []
-    for r in cash_rows:
-        ingresos = float(r.ingresos or 0)
-        egresos = float(abs(r.egresos or 0))
-        cash_by_day.append(
-            {"day": str(r.day), "ingresos": ingresos, "egresos": egresos, "balance": ingresos - egresos}
-        )
+def _summary_data(session: Session, tenant_id: int, start_dt: date, end_dt: date) -> dict:
+    """Series y saldos de /api/reports/summary (el cálculo que cachea report_cache)."""
+    # Días cerrados desde los rollups diarios; solo hoy se agrega desde las filas crudas
+    rollup = sales_rollup.summary(session, tenant_id, start_dt, end_dt)
+    sales_by_day = rollup["sales_by_day"]
+    top_products = rollup["top_products"]
+    cash_by_day = rollup["cash_by_day"]
 
     # Client balances
     client_sales = session.exec(
@@ -373,22 +323,6 @@ def reports_summary(
             balance = 0.0
         supplier_balances.append({"name": s.name, "balance": balance})
 
-    if export and export.lower() == "xlsx":
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            pd.DataFrame(sales_by_day).to_excel(writer, index=False, sheet_name="ventas_diarias")
-            pd.DataFrame(top_products).to_excel(writer, index=False, sheet_name="top_productos")
-            pd.DataFrame(cash_by_day).to_excel(writer, index=False, sheet_name="caja")
-            pd.DataFrame(client_balances).to_excel(writer, index=False, sheet_name="clientes")
-            pd.DataFrame(supplier_balances).to_excel(writer, index=False, sheet_name="proveedores")
-        output.seek(0)
-        filename = f"reporte_{start_dt.isoformat()}_{end_dt.isoformat()}.xlsx"
-        return StreamingResponse(
-            output,
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-
     return {
         "range": {"start": start_dt.isoformat(), "end": end_dt.isoformat()},
         "sales_by_day": sales_by_day,
@@ -399,6 +333,50 @@ def reports_summary(
     }
 
 
+@router.get("/api/reports/summary")
+def reports_summary(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    export: Optional[str] = None,
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant),
+):
+    SettingsService.ensure_admin(user)
+
+    zone = time_windows.tenant_zone(session, tenant_id)
+    end_dt = _parse_date(end_date) or time_windows.local_today(zone)
+    start_dt = _parse_date(start_date) or (end_dt - timedelta(days=29))
+
+    # Mismo rango todo el día: caché con stale-while-revalidate (ver services/report_cache.py)
+    data = report_cache.get(
+        session, tenant_id, "summary", (start_dt.isoformat(), end_dt.isoformat()),
+        lambda s: _summary_data(s, tenant_id, start_dt, end_dt),
+    )
+
+    if export and export.lower() == "xlsx":
+        sheets = [
+            ("ventas_diarias", *export_service.dict_rows(data["sales_by_day"], ["day", "total"])),
+            ("top_productos", *export_service.dict_rows(data["top_products"], ["product_name", "units", "amount"])),
+            ("caja", *export_service.dict_rows(data["cash_by_day"], ["day", "ingresos", "egresos", "balance"])),
+            ("clientes", *export_service.dict_rows(data["client_balances"], ["name", "balance"])),
+            ("proveedores", *export_service.dict_rows(data["supplier_balances"], ["name", "balance"])),
+        ]
+        filename = f"reporte_{start_dt.isoformat()}_{end_dt.isoformat()}"
+        return _export_response(
+            (export_service.xlsx_stream(sheets), export_service.XLSX_MEDIA_TYPE, "xlsx"), filename
+        )
+
+    return data
+
+
+@router.get("/api/admin/report-cache")
+def report_cache_stats(user: User = Depends(require_auth)):
+    """Métricas de la caché de reportes del proceso (hits, stale, misses, refrescos)."""
+    SettingsService.ensure_admin(user)
+    return report_cache.stats()
+
+
 @router.post("/api/ai/chat")
 def ai_chat(
     payload: dict,
@@ -415,7 +393,7 @@ def ai_chat(
         raise HTTPException(400, "Configura tu API key de Gemini en Configuración > IA")
 
     # Contexto breve: ventas últimas 7 días, top 3 productos, caja hoy
-    today = date.today()
+    today = time_windows.local_today(time_windows.tenant_zone(session, tenant_id))
     start_dt = today - timedelta(days=6)
     summary = reports_summary(
         start_date=start_dt.isoformat(),
@@ -591,6 +569,47 @@ async def restore_system_backup(
         return {"error": f"Restore failed: {exc}"}
 
 
+@router.get("/api/admin/export/parquet")
+def export_parquet(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    tables: Optional[str] = None,
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant),
+):
+    """Zip con el layout particionado de services/parquet_export.py (tables: lista separada por comas)."""
+    SettingsService.ensure_admin(user)
+    zone = time_windows.tenant_zone(session, tenant_id)
+    end_dt = _parse_date(end_date) or time_windows.local_today(zone)
+    start_dt = _parse_date(start_date) or (end_dt - timedelta(days=29))
+    workdir = tempfile.mkdtemp(prefix="parquet_")
+    try:
+        data_dir = os.path.join(workdir, "data")
+        exported = parquet_export.export_tenant(
+            session, tenant_id, start_dt, end_dt, data_dir,
+            [t.strip() for t in tables.split(",")] if tables else None,
+        )
+        # Parquet ya viene comprimido: el zip solo agrupa (ZIP_STORED)
+        archive = os.path.join(workdir, "export.zip")
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zf:
+            for result in exported.values():
+                for path in result["files"]:
+                    zf.write(path, os.path.relpath(path, data_dir))
+    except ServiceError as e:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise HTTPException(e.status_code, e.message)
+    except Exception:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+    return FileResponse(
+        archive,
+        media_type="application/zip",
+        filename=f"parquet_{start_dt.isoformat()}_{end_dt.isoformat()}.zip",
+        background=BackgroundTask(shutil.rmtree, workdir, ignore_errors=True),
+    )
+
+
 @router.get("/api/admin/reset-inventory-from-excel")
 def reset_inventory_from_excel(
     session: Session = Depends(get_session),
@@ -603,8 +622,10 @@ def reset_inventory_from_excel(
         return {"error": "File 'productos.xlsx' not found on server root"}
 
     try:
+        stock_ledger.record_tenant_removal(session, tenant_id, user_id=user.id)
         session.exec(delete(Product).where(Product.tenant_id == tenant_id))
         df = pd.read_excel(file_path)
+        stock_ledger.tag(session, "importacion", user_id=user.id)
         added = 0
         errors = []
 
@@ -676,6 +697,7 @@ def reset_inventory_from_excel(
 
 @router.get("/api/admin/reset-clients-from-excel")
 def reset_clients_from_excel(
+    background: bool = False,
     session: Session = Depends(get_session),
     user: User = Depends(require_auth),
     tenant_id: int = Depends(get_tenant),
@@ -685,121 +707,43 @@ def reset_clients_from_excel(
     if not os.path.exists(file_path):
         return {"error": "File 'clientes.xlsx' not found on server root"}
 
-    try:
-        xls = pd.ExcelFile(file_path)
-        added = 0
-        updated = 0
-        errors = []
-
-        for sheet_name in xls.sheet_names:
-            try:
-                client_name = sheet_name.strip()
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
-                initial_debt = 0.0
-                for debt_col in ("Restan", "Saldo"):
-                    if debt_col in df.columns:
-                        last_val = df[debt_col].iloc[-1]
-                        initial_debt = float(last_val) if not pd.isna(last_val) else 0.0
-                        break
-
-                existing = session.exec(
-                    select(Client).where(Client.name == client_name, Client.tenant_id == tenant_id)
-                ).first()
-                if existing:
-                    updated += 1
-                    client_id = existing.id
-                else:
-                    new_client = Client(name=client_name, tenant_id=tenant_id)
-                    session.add(new_client)
-                    session.commit()
-                    session.refresh(new_client)
-                    added += 1
-                    client_id = new_client.id
-
-                if initial_debt > 0:
-                    has_sales = session.exec(
-                        select(Sale).where(Sale.client_id == client_id, Sale.tenant_id == tenant_id)
-                    ).first()
-                    if not has_sales:
-                        session.add(
-                            Sale(
-                                tenant_id=tenant_id,
-                                client_id=client_id,
-                                user_id=user.id,
-                                total_amount=initial_debt,
-                                amount_paid=0,
-                                payment_status="pending",
-                                payment_method="account",
-                            )
-                        )
-                        session.commit()
-            except Exception as exc:
-                errors.append(f"Sheet {sheet_name}: {exc}")
+    if background:
+        # Progreso (hojas leídas / total) en /api/import/jobs/{id}
+        with open(file_path, "rb") as fh:
+            job = import_jobs.create_job(session, tenant_id, user.id, "client_ledger", fh, file_path)
+        import_jobs.submit(job.id)
+        return import_jobs.job_dict(job)
 
-        return {"status": "success", "added": added, "updated": updated, "sheets_processed": len(xls.sheet_names), "errors": errors}
+    try:
+        result = import_ledger(session, tenant_id, file_path, user.id)
+        return {"status": "success", **result}
     except Exception as exc:
         session.rollback()
         return {"error": str(exc)}
 
 
+def _export_response(export: tuple, basename: str) -> StreamingResponse:
+    body, media_type, ext = export
+    return StreamingResponse(
+        body,
+        headers={"Content-Disposition": f'attachment; filename="{basename}.{ext}"'},
+        media_type=media_type,
+    )
+
+
 @router.get("/api/products/export")
 def export_products_api(
-    session: Session = Depends(get_session),
+    format: str = "xlsx",
     user: User = Depends(require_auth),
     tenant_id: int = Depends(get_tenant),
 ):
-    products = session.exec(select(Product).where(Product.tenant_id == tenant_id)).all()
-    data = [{
-        "ID": p.id,
-        "Name": p.name,
-        "Category": p.category,
-        "ItemNumber": p.item_number,
-        "Barcode": p.barcode,
-        "Price": p.price,
-        "Stock": p.stock_quantity,
-        "Description": p.description,
-        "Numeracion": p.numeracion,
-        "CantBulto": p.cant_bulto,
-        "PriceBulk": p.price_bulk,
-        "PriceRetail": p.price_retail,
-    } for p in products]
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        pd.DataFrame(data).to_excel(writer, index=False)
-    output.seek(0)
-    return StreamingResponse(
-        output,
-        headers={"Content-Disposition": 'attachment; filename="productos_export.xlsx"'},
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
+    return _export_response(export_service.products_export(tenant_id, format.lower()), "productos_export")
 
 
 @router.get("/api/clients/export")
 def export_clients_api(
-    session: Session = Depends(get_session),
+    format: str = "xlsx",
     user: User = Depends(require_auth),
     tenant_id: int = Depends(get_tenant),
 ):
-    clients = session.exec(select(Client).where(Client.tenant_id == tenant_id)).all()
-    data = [{
-        "ID": c.id,
-        "Name": c.name,
-        "RazonSocial": c.razon_social,
-        "CUIT": c.cuit,
-        "Phone": c.phone,
-        "Email": c.email,
-        "Address": c.address,
-        "IVACategory": c.iva_category,
-        "CreditLimit": c.credit_limit,
-        "TransportName": c.transport_name,
-        "TransportAddress": c.transport_address,
-    } for c in clients]
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        pd.DataFrame(data).to_excel(writer, index=False)
-    output.seek(0)
-    return StreamingResponse(
-        output,
-        headers={"Content-Disposition": 'attachment; filename="clientes_export.xlsx"'},
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
+    return _export_response(export_service.clients_export(tenant_id, format.lower()), "clientes_export")
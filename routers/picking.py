@@ -1,17 +1,27 @@
 from __future__ import annotations
 
-from typing import List
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Form, HTTPException, Request
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel
 from sqlmodel import Session, select
 
-from database.models import Product, Sale, SaleItem, Settings, User
-from database.session import get_session
-from web.dependencies import get_settings, get_tenant, require_auth
+from database.models import Product, Settings, User
+from database.session import engine, get_session
+from services.bin_stock_service import StockServiceError
+from services import product_index
+from services.picking_service import PickingService
+from services.scan_session import ScanCart
+from web.dependencies import _resolve_tenant_from_host, get_settings, get_tenant, require_auth
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 def _templates():
@@ -19,7 +29,7 @@ def _templates():
     return CompatTemplates(directory="templates")
 
 
-def _find_product(session: Session, tenant_id: int, search_term: str):
+def _find_product_db(session: Session, tenant_id: int, search_term: str):
     product = session.exec(select(Product).where(Product.barcode == search_term, Product.tenant_id == tenant_id)).first()
     if not product:
         product = session.exec(select(Product).where(Product.item_number == search_term, Product.tenant_id == tenant_id)).first()
@@ -33,6 +43,37 @@ def _find_product(session: Session, tenant_id: int, search_term: str):
     return product
 
 
+def _find_product(session: Session, tenant_id: int, search_term: str):
+    """
+    Resuelve el escaneo con el índice en memoria; session.get no consulta la base
+    si el producto ya está en la sesión (ver _prefetch_products). Si el índice
+    no lo conoce o quedó viejo, cae a la búsqueda en base.
+    """
+    hit = product_index.lookup(session, tenant_id, search_term)
+    if hit:
+        product_id, rule = hit
+        product = session.get(Product, product_id)
+        if product and product.tenant_id == tenant_id and product_index.matches(product, search_term, rule):
+            return product
+        product_index.invalidate(tenant_id)
+
+    product = _find_product_db(session, tenant_id, search_term)
+    if product:
+        product_index.remember(tenant_id, product.id, product.barcode, product.item_number)
+    return product
+
+
+def _prefetch_products(session: Session, tenant_id: int, search_terms) -> list:
+    """
+    Carga en la sesión, con una sola consulta, los productos de todos los escaneos.
+    El identity map guarda referencias débiles: el llamador debe conservar la lista.
+    """
+    ids = {hit[0] for hit in (product_index.lookup(session, tenant_id, t) for t in search_terms) if hit}
+    if not ids:
+        return []
+    return session.exec(select(Product).where(Product.id.in_(ids), Product.tenant_id == tenant_id)).all()
+
+
 @router.get("/picking", response_class=HTMLResponse)
 def picking_page(request: Request, user: User = Depends(require_auth), settings: Settings = Depends(get_settings)):
     return _templates().TemplateResponse("picking.html", {"request": request, "user": user, "settings": settings, "active_page": "picking"})
@@ -55,12 +96,13 @@ def picking_entry(
     product = _find_product(session, tenant_id, normalized_barcode)
     if not product:
         raise HTTPException(404, f"Producto no encontrado: {normalized_barcode}")
-    current_stock = product.stock_quantity or 0
-    product.stock_quantity = current_stock + qty
-    session.add(product)
-    session.commit()
-    session.refresh(product)
-    return {"status": "ok", "product": {"name": product.name, "new_stock": product.stock_quantity}}
+    name = product.name
+    try:
+        # Incremento atómico en SQL: no pisa ventas ni ajustes concurrentes
+        new_stock = PickingService.register_entries(session, tenant_id, {product.id: qty}, user_id=user.id)
+    except StockServiceError as e:
+        raise HTTPException(e.status_code, e.message)
+    return {"status": "ok", "product": {"name": name, "new_stock": new_stock[product.id]}}
 
 
 class PickingItem(BaseModel):
@@ -82,8 +124,8 @@ def picking_exit(
     if not data.items:
         raise HTTPException(400, "Debes enviar al menos un item")
 
-    products_map = {}
-    total_amount = 0.0
+    prefetched = _prefetch_products(session, tenant_id, {item.barcode.strip() for item in data.items})
+    lines = []
     for item in data.items:
         normalized_barcode = item.barcode.strip()
         if not normalized_barcode:
@@ -94,33 +136,227 @@ def picking_exit(
         prod = _find_product(session, tenant_id, normalized_barcode)
         if not prod:
             raise HTTPException(404, f"Producto no encontrado: {item.barcode}")
-        current_stock = prod.stock_quantity or 0
-        if current_stock < item.qty:
-            raise HTTPException(409, f"Stock insuficiente para {prod.name}: disponible {current_stock}, solicitado {item.qty}")
-        products_map[normalized_barcode] = prod
-        total_amount += prod.price * item.qty
+        lines.append((prod, item.qty))
 
-    new_sale = Sale(tenant_id=tenant_id, client_id=None, user_id=user.id, total_amount=total_amount)
-    session.add(new_sale)
-    session.commit()
-    session.refresh(new_sale)
+    try:
+        result = PickingService.register_exit(session, tenant_id, user.id, lines)
+    except StockServiceError as e:
+        raise HTTPException(e.status_code, e.message)
+    sale_id = result["sale_id"]
+    return {"status": "ok", "sale_id": sale_id, "print_url": f"/sales/{sale_id}/remito"}
 
-    for item in data.items:
-        normalized_barcode = item.barcode.strip()
-        prod = products_map[normalized_barcode]
-        session.add(
-            SaleItem(
-                sale_id=new_sale.id,
-                product_id=prod.id,
-                product_name=prod.name,
-                quantity=item.qty,
-                unit_price=prod.price,
-                total=prod.price * item.qty,
-            )
+
+class PickListItem(BaseModel):
+    product_id: int
+    qty: int
+
+
+class PickListRequest(BaseModel):
+    items: List[PickListItem] = []
+    sale_ids: List[int] = []
+    location_id: Optional[int] = None
+
+
+@router.post("/api/picking/pick-list")
+def picking_pick_list(
+    data: PickListRequest,
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant),
+):
+    """Lista de picking por posición, ordenada por recorrido de pasillos."""
+    try:
+        items = [{"product_id": i.product_id, "quantity": i.qty} for i in data.items]
+        if data.sale_ids:
+            items += PickingService.items_from_sales(session, tenant_id, data.sale_ids)
+        return PickingService.build_pick_list(session, tenant_id, items, data.location_id)
+    except StockServiceError as e:
+        raise HTTPException(e.status_code, e.message)
+
+
+@router.get("/api/picking/waves")
+def picking_waves(
+    max_orders: int = Query(20, ge=1, le=200),
+    max_units: Optional[int] = Query(None, ge=1),
+    days: int = Query(7, ge=1, le=90),
+    location_id: Optional[int] = None,
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant),
+):
+    """Olas de picking sobre las ventas pendientes de los últimos `days` días."""
+    since = datetime.utcnow() - timedelta(days=days)
+    try:
+        waves = PickingService.plan_waves(
+            session, tenant_id, max_orders=max_orders, max_units=max_units,
+            since=since, location_id=location_id,
         )
-        current_stock = prod.stock_quantity or 0
-        prod.stock_quantity = current_stock - item.qty
-        session.add(prod)
+    except StockServiceError as e:
+        raise HTTPException(e.status_code, e.message)
+    return {"waves": waves, "total_waves": len(waves)}
+
+
+class WaveConfirmRequest(BaseModel):
+    sale_ids: List[int]
+
+
+@router.post("/api/picking/waves/confirm")
+def picking_waves_confirm(
+    data: WaveConfirmRequest,
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant),
+):
+    try:
+        return PickingService.confirm_wave(session, tenant_id, data.sale_ids)
+    except StockServiceError as e:
+        raise HTTPException(e.status_code, e.message)
+
+
+# ============================================================
+# WebSocket: sesión de escaneo con carrito del lado del servidor
+# ============================================================
+
+def _ws_tenant(user_id: Optional[int], host: Optional[str]) -> Optional[int]:
+    """Misma regla que get_tenant, resuelta una sola vez al abrir la sesión."""
+    if not user_id:
+        return None
+    with Session(engine) as session:
+        user = session.get(User, user_id)
+        if not user:
+            return None
+        host_tenant_id = _resolve_tenant_from_host(host, session)
+        if host_tenant_id and user.tenant_id and user.tenant_id != host_tenant_id:
+            return None
+        return host_tenant_id or user.tenant_id
+
+
+def _ws_resolve(tenant_id: int, barcode: str):
+    with Session(engine) as session:
+        product = _find_product(session, tenant_id, barcode)
+        return (product.id, product.name) if product else None
+
+
+def _ws_commit(tenant_id: int, batch: dict) -> tuple[dict, dict]:
+    with Session(engine) as session:
+        return PickingService.register_scanned_entries(session, tenant_id, batch)
+
+
+@router.websocket("/ws/picking/scan")
+async def picking_scan_ws(
+    websocket: WebSocket,
+    batch_size: int = Query(50, ge=1, le=1000),
+    max_delay_ms: int = Query(500, ge=50, le=10_000),
+):
+    """
+    Ingreso por escaneo continuo. Mensajes del cliente:
+      {"barcode": "...", "qty": 1}  -> {"type": "scan", ...} o {"type": "error", ...}
+      {"action": "flush"}           -> confirma lo pendiente ya
+      {"action": "cart"}            -> {"type": "cart", ...} totales de la sesión
+    Los ingresos se confirman por lote (batch_size escaneos o max_delay_ms)
+    y cada lote responde {"type": "committed", "stock": {product_id: nuevo_stock}}.
+    """
+    tenant_id = await run_in_threadpool(
+        _ws_tenant, websocket.session.get("user_id"), websocket.headers.get("host")
+    )
+    if not tenant_id:
+        await websocket.close(code=4401)
+        return
+    await websocket.accept()
+
+    cart = ScanCart(batch_size=batch_size, max_delay=max_delay_ms / 1000)
+    known = {}  # barcode -> (product_id, name): un escaneo repetido no toca la base
+
+    async def flush():
+        batch = cart.take_pending()
+        if not batch:
+            return
+        try:
+            stock, rejected = await run_in_threadpool(_ws_commit, tenant_id, batch)
+        except Exception:
+            # Incluye un producto borrado entre la validación y el UPDATE: el
+            # próximo intento lo descarta y confirma el resto
+            cart.restore(batch)
+            await websocket.send_json({"type": "error", "detail": "No se pudo guardar el lote, se reintenta"})
+            return
+        if rejected:
+            for code in [code for code, hit in known.items() if hit[0] in rejected]:
+                del known[code]
+            await websocket.send_json({
+                "type": "error",
+                "detail": "Productos inexistentes: se descartaron sus escaneos",
+                "discarded": rejected,
+            })
+        committed = {pid: qty for pid, qty in batch.items() if pid not in rejected}
+        if committed:
+            cart.confirm(committed)
+            await websocket.send_json({"type": "committed", "batch": cart.batches, "stock": stock})
+
+    try:
+        while True:
+            try:
+                raw = await asyncio.wait_for(websocket.receive_text(), cart.seconds_until_due())
+            except asyncio.TimeoutError:
+                await flush()
+                continue
+
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                await websocket.send_json({"type": "error", "detail": "Mensaje inválido"})
+                continue
+
+            action = message.get("action")
+            if action == "flush":
+                await flush()
+                continue
+            if action == "cart":
+                await websocket.send_json({
+                    "type": "cart",
+                    "committed": cart.totals,
+                    "pending": cart.pending,
+                    "batches": cart.batches,
+                })
+                continue
+
+            barcode = str(message.get("barcode") or "").strip()
+            try:
+                qty = int(message.get("qty", 1))
+            except (TypeError, ValueError):
+                qty = 0
+            if not barcode or qty <= 0:
+                await websocket.send_json({"type": "error", "barcode": barcode, "detail": "Código o cantidad inválidos"})
+                continue
+
+            hit = known.get(barcode)
+            if hit is None:
+                hit = await run_in_threadpool(_ws_resolve, tenant_id, barcode)
+                if hit is None:
+                    await websocket.send_json({"type": "error", "barcode": barcode, "detail": f"Producto no encontrado: {barcode}"})
+                    continue
+                known[barcode] = hit
 
-    session.commit()
-    return {"status": "ok", "sale_id": new_sale.id, "print_url": f"/sales/{new_sale.id}/remito"}
+            product_id, name = hit
+            due = cart.add(product_id, qty)
+            await websocket.send_json({
+                "type": "scan",
+                "barcode": barcode,
+                "product_id": product_id,
+                "name": name,
+                "qty": qty,
+                "pending": cart.pending_qty(product_id),
+                "session_total": cart.totals.get(product_id, 0) + cart.pending_qty(product_id),
+            })
+            if due:
+                await flush()
+    except WebSocketDisconnect:
+        # El operario cerró la pantalla: lo escaneado igual se guarda
+        batch = cart.take_pending()
+        if batch:
+            try:
+                _, rejected = await run_in_threadpool(_ws_commit, tenant_id, batch)
+            except Exception:
+                logger.exception("Picking scan session for tenant %s lost its final batch: %s", tenant_id, batch)
+            else:
+                if rejected:
+                    logger.warning("Picking scan session for tenant %s discarded unknown products: %s", tenant_id, rejected)
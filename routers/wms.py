@@ -3,7 +3,7 @@ from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from sqlmodel import Session, select, func, text
 from typing import Optional, List
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 from pydantic import BaseModel
 
 from database.session import get_session
@@ -12,6 +12,11 @@ from database.models import (
 )
 from web.dependencies import require_auth, get_settings, get_tenant
 from services.bin_stock_service import BinStockService, StockServiceError
+from services.errors import ServiceError
+from services.slotting_service import SlottingService
+from services.cycle_count_service import CycleCountService
+from services.forecast_service import ForecastService
+from services import stock_ledger
 
 router = APIRouter(prefix="/wms", tags=["WMS"])
 templates = Jinja2Templates(directory="templates")
@@ -40,6 +45,8 @@ def _ensure_wms_schema_compat(session: Session):
         "ALTER TABLE stockmovement ADD COLUMN IF NOT EXISTS tenant_id INTEGER",
         "ALTER TABLE stockmovement ADD COLUMN IF NOT EXISTS request_id VARCHAR",
         "ALTER TABLE stockmovement ADD COLUMN IF NOT EXISTS user_id INTEGER",
+        "ALTER TABLE stockmovement ADD COLUMN IF NOT EXISTS document_id INTEGER",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_movement_tenant_request ON stockmovement (tenant_id, request_id) WHERE request_id IS NOT NULL",
         "ALTER TABLE cashmovement ADD COLUMN IF NOT EXISTS reference_id INTEGER",
         "ALTER TABLE cashmovement ADD COLUMN IF NOT EXISTS reference_type VARCHAR",
         "ALTER TABLE cashmovement ADD COLUMN IF NOT EXISTS user_id INTEGER",
@@ -56,7 +63,7 @@ def _ensure_wms_schema_compat(session: Session):
 
 
 
-def _svc_error(e: StockServiceError):
+def _svc_error(e: ServiceError):
     raise HTTPException(status_code=e.status_code, detail=e.message)
 
 
@@ -288,6 +295,7 @@ class StockAdjustRequest(BaseModel):
     quantity: int
     reason: Optional[str] = "ajuste"
     notes: Optional[str] = None
+    request_id: Optional[str] = None
 
 
 @router.post("/api/bins/{bin_id}/stock/adjust")
@@ -302,7 +310,8 @@ def adjust_bin_stock(
     try:
         return BinStockService.adjust_stock(
             session, tenant_id, bin_id, body.product_id,
-            body.quantity, body.reason, body.notes, user.id
+            body.quantity, body.reason, body.notes, user.id,
+            request_id=body.request_id,
         )
     except StockServiceError as e:
         _svc_error(e)
@@ -336,10 +345,271 @@ def transfer_stock(
 
 
 
+# ============================================================
+# API: DOCUMENTOS MULTI-LÍNEA (transferencias / ajustes)
+# ============================================================
+
+class TransferLine(BaseModel):
+    product_id: int
+    from_bin_id: int
+    to_bin_id: int
+    quantity: int
+
+
+class TransferDocumentRequest(BaseModel):
+    lines: List[TransferLine]
+    notes: Optional[str] = None
+    request_id: Optional[str] = None
+
+
+@router.post("/api/documents/transfer")
+def apply_transfer_document(
+    body: TransferDocumentRequest,
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant)
+):
+    """Reposición / putaway: muchas líneas en una sola transacción."""
+    _ensure_wms_schema_compat(session)
+    try:
+        return BinStockService.apply_transfer_document(
+            session, tenant_id,
+            [line.model_dump() for line in body.lines],
+            body.notes, body.request_id, user.id
+        )
+    except StockServiceError as e:
+        _svc_error(e)
+
+
+class AdjustmentLine(BaseModel):
+    bin_id: int
+    product_id: int
+    quantity: int
+
+
+class AdjustmentDocumentRequest(BaseModel):
+    lines: List[AdjustmentLine]
+    reason: Optional[str] = "ajuste"
+    notes: Optional[str] = None
+    request_id: Optional[str] = None
+
+
+@router.post("/api/documents/adjust")
+def apply_adjustment_document(
+    body: AdjustmentDocumentRequest,
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant)
+):
+    _ensure_wms_schema_compat(session)
+    try:
+        return BinStockService.apply_adjustment_document(
+            session, tenant_id,
+            [line.model_dump() for line in body.lines],
+            body.reason or "ajuste", body.notes, body.request_id, user.id
+        )
+    except StockServiceError as e:
+        _svc_error(e)
+
+
+# ============================================================
+# API: CONTEO CÍCLICO
+# ============================================================
+
+class CycleCountGenerateRequest(BaseModel):
+    day: Optional[date] = None
+    count: int = 50
+    location_id: Optional[int] = None
+
+
+class CycleCountLine(BaseModel):
+    task_id: int
+    counted_quantity: int
+
+
+class CycleCountSubmitRequest(BaseModel):
+    counts: List[CycleCountLine]
+    request_id: Optional[str] = None
+
+
+@router.post("/api/cycle-counts/generate")
+def generate_cycle_counts(
+    body: CycleCountGenerateRequest,
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant)
+):
+    """Sortea las tareas de conteo del día (idempotente: completa hasta `count`)."""
+    if user.role not in ["admin", "superadmin"]:
+        raise HTTPException(403, "Se requiere rol admin")
+    _ensure_wms_schema_compat(session)
+    try:
+        return CycleCountService.generate_daily_tasks(
+            session, tenant_id, body.day, body.count, body.location_id
+        )
+    except StockServiceError as e:
+        _svc_error(e)
+
+
+@router.get("/api/cycle-counts")
+def list_cycle_counts(
+    day: Optional[date] = Query(None),
+    status: Optional[str] = Query("pending"),
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant)
+):
+    """Tareas de conteo en orden de recorrido del depósito."""
+    _ensure_wms_schema_compat(session)
+    return CycleCountService.list_tasks(session, tenant_id, day, status)
+
+
+@router.post("/api/cycle-counts/submit")
+def submit_cycle_counts(
+    body: CycleCountSubmitRequest,
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant)
+):
+    """Carga masiva de conteos; las diferencias se ajustan en un solo documento."""
+    _ensure_wms_schema_compat(session)
+    try:
+        return CycleCountService.submit_counts(
+            session, tenant_id, [c.model_dump() for c in body.counts], user.id, body.request_id
+        )
+    except StockServiceError as e:
+        _svc_error(e)
+
+
+@router.get("/api/cycle-counts/summary")
+def cycle_count_summary(
+    days: int = Query(30, ge=1, le=365),
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant)
+):
+    """Exactitud de inventario de los conteos de los últimos `days` días."""
+    since = (datetime.utcnow() - timedelta(days=days)).date()
+    return CycleCountService.summary(session, tenant_id, since)
+
+
+
+# ============================================================
+# API: PRONÓSTICO Y SUGERENCIAS DE REPOSICIÓN
+# ============================================================
+
+class ReorderRunRequest(BaseModel):
+    method: str = "ses"
+    history_days: int = 365
+    window: int = 28
+    alpha: float = 0.2
+    lead_time_days: int = 7
+    review_days: int = 7
+    service_level: float = 0.95
+    update_min_stock: bool = False
+
+
+@router.post("/api/reorder/run")
+def run_reorder_forecast(
+    body: ReorderRunRequest,
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant)
+):
+    """Pronóstico de demanda por SKU; reemplaza las sugerencias (y, si se pide, los stocks mínimos)."""
+    if user.role not in ["admin", "superadmin"]:
+        raise HTTPException(403, "Se requiere rol admin")
+    try:
+        return ForecastService.run(session, tenant_id, **body.model_dump())
+    except ServiceError as e:
+        _svc_error(e)
+
+
+@router.get("/api/reorder/suggestions")
+def list_reorder_suggestions(
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant)
+):
+    """Cantidades a pedir de la última corrida, agrupadas por proveedor."""
+    return ForecastService.suggestions_by_supplier(session, tenant_id)
+
+
 # ============================================================
 # API: REPORTES
 # ============================================================
 
+@router.get("/api/locations/{location_id}/slotting")
+def slotting_recommendations(
+    location_id: int,
+    days: int = Query(365, ge=7, le=1095),
+    max_moves: int = Query(50, ge=1, le=500),
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant)
+):
+    """
+    Clasificación ABC por velocidad de picking y movimientos sugeridos.
+    Cada documento devuelto se ejecuta tal cual con POST /wms/api/documents/transfer.
+    """
+    _ensure_wms_schema_compat(session)
+    try:
+        return SlottingService.recommend(session, tenant_id, location_id, days=days, max_moves=max_moves)
+    except StockServiceError as e:
+        _svc_error(e)
+
+
+@router.get("/api/stock/as-of")
+def stock_as_of(
+    at: datetime = Query(..., description="Instante ISO-8601 (UTC si no trae zona)"),
+    product_id: Optional[List[int]] = Query(None),
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant)
+):
+    """
+    Stock de cada producto a una fecha, reconstruido desde el checkpoint más cercano
+    y el ledger. El valor usa el costo actual del producto.
+    """
+    result = stock_ledger.stock_as_of(session, tenant_id, at, product_id)
+    stock = result.pop("stock")
+    products = {
+        p.id: p for p in session.exec(
+            select(Product).where(Product.id.in_(stock.keys()), Product.tenant_id == tenant_id)
+        ).all()
+    } if stock else {}
+
+    items = []
+    for pid in sorted(stock):
+        p = products.get(pid)
+        cost = (p.cost_price or 0) if p else 0
+        items.append({
+            "product_id": pid,
+            "name": p.name if p else None,
+            "item_number": p.item_number if p else None,
+            "quantity": stock[pid],
+            "value": round(stock[pid] * cost, 2),
+        })
+    result["items"] = items
+    result["total_units"] = sum(i["quantity"] for i in items)
+    result["total_value"] = round(sum(i["value"] for i in items), 2)
+    return result
+
+
+@router.post("/api/stock/checkpoints")
+def create_stock_checkpoint(
+    session: Session = Depends(get_session),
+    user: User = Depends(require_auth),
+    tenant_id: int = Depends(get_tenant)
+):
+    """Fuerza un checkpoint de stock (además del diario automático)."""
+    if user.role not in ["admin", "superadmin"]:
+        raise HTTPException(403, "Se requiere rol admin")
+    checkpoint = stock_ledger.create_checkpoint(session, tenant_id)
+    return {"ok": True, "checkpoint_id": checkpoint.id, "taken_at": checkpoint.taken_at,
+            "products": checkpoint.product_count}
+
+
 @router.get("/api/products/{product_id}/locations")
 def get_product_locations(
     product_id: int,
@@ -613,6 +883,7 @@ def wms_transfers_ui(
 
 @router.post("/api/admin/backfill")
 def trigger_backfill(
+    chunk_size: Optional[int] = Query(None, ge=1, le=100_000),
     session: Session = Depends(get_session),
     user: User = Depends(require_auth),
     tenant_id: int = Depends(get_tenant)
@@ -622,7 +893,7 @@ def trigger_backfill(
     if user.role not in ["admin", "superadmin"]:
         raise HTTPException(403, "Se requiere rol admin")
     try:
-        return BinStockService.backfill_default_location(session, tenant_id)
+        return BinStockService.backfill_default_location(session, tenant_id, chunk_size=chunk_size)
     except StockServiceError as e:
         _svc_error(e)
 
@@ -0,0 +1,33 @@
+"""
+Completa el costo al vender (SaleItem.cost_price_at_sale) de las ventas
+históricas: último costo de compra a la fecha de la venta o, si no hay, el
+costo actual del producto (ver services/profitability.py).
+
+    python -m scripts.backfill_sale_costs            # todos los tenants
+    python -m scripts.backfill_sale_costs --tenant 1
+"""
+
+import argparse
+
+from sqlmodel import Session, select
+
+from database.models import Tenant
+from database.session import engine
+from services.profitability import BACKFILL_BATCH, backfill_costs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill de costos de ventas históricas")
+    parser.add_argument("--tenant", type=int, help="Por defecto, todos")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH)
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        tenant_ids = [args.tenant] if args.tenant else session.exec(select(Tenant.id)).all()
+        for tenant_id in tenant_ids:
+            updated = backfill_costs(session, tenant_id, args.batch_size)
+            print(f"tenant {tenant_id}: {updated} ítems con costo")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Exporta ventas, ítems, pagos, caja, compras y movimientos de stock de un
+tenant a Parquet particionado por mes (ver services/parquet_export.py).
+
+    python -m scripts.export_parquet --tenant 1 --start 2025-01-01 --end 2025-12-31 --out exports/parquet
+"""
+
+import argparse
+from datetime import date
+
+from sqlmodel import Session
+
+from database.session import engine
+from services.parquet_export import TABLES, export_tenant
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportación Parquet para análisis")
+    parser.add_argument("--tenant", type=int, required=True)
+    parser.add_argument("--start", type=date.fromisoformat, required=True, help="YYYY-MM-DD (inclusive)")
+    parser.add_argument("--end", type=date.fromisoformat, required=True, help="YYYY-MM-DD (inclusive)")
+    parser.add_argument("--out", default="exports/parquet")
+    parser.add_argument("--tables", nargs="*", choices=list(TABLES), help="Por defecto, todas")
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        results = export_tenant(session, args.tenant, args.start, args.end, args.out, args.tables)
+    for name, result in results.items():
+        print(f"{name}: {result['rows']} filas en {len(result['files'])} archivos")
+
+
+if __name__ == "__main__":
+    main()
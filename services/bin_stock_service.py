@@ -3,24 +3,31 @@ services/bin_stock_service.py
 ==============================
 Servicio transaccional para operaciones de stock por posición.
 Toda lógica de negocio de WMS vive aquí — el router solo delega.
+
+Orden de locks (todas las operaciones que tocan ambas tablas): primero las
+filas de BinStock ordenadas por (bin_id, product_id) y después los Product
+ordenados por id. Así dos transacciones concurrentes nunca se esperan en
+orden cruzado.
 """
 
+from collections import defaultdict
 from datetime import datetime, timezone
 from typing import Optional
 from sqlmodel import Session, select
-from sqlalchemy import func
+from sqlalchemy import bindparam, case, exists, func, insert, literal, tuple_, update
+from sqlalchemy.exc import IntegrityError
 
 from database.models import (
-    Bin, BinStock, StockMovement, Product, Location
+    Bin, BinStock, StockDocument, StockMovement, Product, Location
 )
+from services import stock_ledger
+from services.errors import ServiceError
+
+MAX_DOCUMENT_LINES = 1000
 
 
-class StockServiceError(Exception):
+class StockServiceError(ServiceError):
     """Error de dominio del servicio de stock."""
-    def __init__(self, message: str, status_code: int = 400):
-        self.message = message
-        self.status_code = status_code
-        super().__init__(message)
 
 
 class BinStockService:
@@ -40,6 +47,80 @@ class BinStockService:
             raise StockServiceError(f"Producto {product_id} no encontrado", 404)
         return product
 
+    @staticmethod
+    def _insert_or_get_by_request_id(session: Session, row, tenant_id: int, request_id: str):
+        """
+        Idempotencia insert-first: inserta la fila en un SAVEPOINT y deja que el
+        índice único (tenant_id, request_id) detecte el duplicado.
+        Retorna (fila, True) si se insertó o (fila_existente, False) si ya existía.
+        """
+        model = type(row)
+        try:
+            with session.begin_nested():
+                session.add(row)
+        except IntegrityError:
+            existing = session.exec(
+                select(model).where(
+                    model.tenant_id == tenant_id,
+                    model.request_id == request_id,
+                )
+            ).first()
+            if not existing:
+                raise
+            return existing, False
+        return row, True
+
+    @staticmethod
+    def _shift_product_stock(
+        session: Session,
+        tenant_id: int,
+        deltas: dict,
+        reason: str,
+        reference_type: Optional[str] = None,
+        reference_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+    ) -> None:
+        """
+        Suma {product_id: delta} a product.stock_quantity con un UPDATE
+        `stock_quantity = stock_quantity + delta` recortado en 0, en orden de id.
+        Los Product se bloquean después de los BinStock del llamador (orden global)
+        y se lee el stock previo para que el ledger registre el delta real.
+        """
+        product_updates = [
+            {"p_id": pid, "p_delta": delta}
+            for pid, delta in sorted(deltas.items())
+            if delta != 0
+        ]
+        if not product_updates:
+            return
+        current = dict(session.exec(
+            select(Product.id, Product.stock_quantity)
+            .where(Product.id.in_([u["p_id"] for u in product_updates]), Product.tenant_id == tenant_id)
+            .order_by(Product.id)
+            .with_for_update()
+        ).all())
+        stock_ledger.record(session, [
+            {
+                "tenant_id": tenant_id,
+                "product_id": u["p_id"],
+                "delta": max(0, (current[u["p_id"]] or 0) + u["p_delta"]) - (current[u["p_id"]] or 0),
+                "reason": reason,
+                "reference_type": reference_type,
+                "reference_id": reference_id,
+                "user_id": user_id,
+            }
+            for u in product_updates
+            if u["p_id"] in current
+        ])
+        table = Product.__table__
+        new_stock = func.coalesce(table.c.stock_quantity, 0) + bindparam("p_delta")
+        session.connection().execute(
+            update(table)
+            .where(table.c.id == bindparam("p_id"), table.c.tenant_id == tenant_id)
+            .values(stock_quantity=case((new_stock < 0, 0), else_=new_stock)),
+            product_updates,
+        )
+
     @staticmethod
     def adjust_stock(
         session: Session,
@@ -50,46 +131,36 @@ class BinStockService:
         reason: str = "ajuste",
         notes: Optional[str] = None,
         user_id: Optional[int] = None,
+        request_id: Optional[str] = None,
     ) -> dict:
         """
         Ajusta stock en una posición a una cantidad final.
         Sincroniza product.stock_quantity en la misma transacción.
+        Idempotente si se provee request_id.
         """
         if new_quantity < 0:
             raise StockServiceError("La cantidad no puede ser negativa")
 
         bin_ = BinStockService._get_bin_or_raise(session, bin_id, tenant_id)
-        product = BinStockService._get_product_or_raise(session, product_id, tenant_id)
+        BinStockService._get_product_or_raise(session, product_id, tenant_id)
 
         if bin_.max_capacity is not None and new_quantity > bin_.max_capacity:
             raise StockServiceError(
                 f"Excede la capacidad máxima de esta ubicación ({bin_.max_capacity})"
             )
 
-        # Buscar o crear BinStock
+        # Buscar o crear BinStock (con lock para que el delta sea consistente)
         bin_stock = session.exec(
             select(BinStock).where(
                 BinStock.bin_id == bin_id,
                 BinStock.product_id == product_id
-            )
+            ).with_for_update()
         ).first()
 
         old_qty = bin_stock.quantity if bin_stock else 0
         delta = new_quantity - old_qty
 
-        if bin_stock:
-            bin_stock.quantity = new_quantity
-            bin_stock.updated_at = datetime.now(timezone.utc)
-        else:
-            bin_stock = BinStock(
-                tenant_id=tenant_id,
-                bin_id=bin_id,
-                product_id=product_id,
-                quantity=new_quantity,
-            )
-        session.add(bin_stock)
-
-        # Auditoría y sincronización solo si hubo cambio
+        # Auditoría primero: si el request_id ya fue aplicado, el índice único lo rechaza
         if delta != 0:
             movement = StockMovement(
                 tenant_id=tenant_id,
@@ -99,13 +170,38 @@ class BinStockService:
                 quantity=abs(delta),
                 reason=reason,
                 notes=notes,
+                request_id=request_id,
                 user_id=user_id,
             )
-            session.add(movement)
+            if request_id:
+                movement, created = BinStockService._insert_or_get_by_request_id(
+                    session, movement, tenant_id, request_id
+                )
+                if not created:
+                    movement_id = movement.id
+                    session.rollback()
+                    return {"ok": True, "idempotent": True, "movement_id": movement_id}
+            else:
+                session.add(movement)
+                session.flush()
+
+            # Sincronizar stock global con un delta atómico en SQL (no pisa ventas concurrentes)
+            BinStockService._shift_product_stock(
+                session, tenant_id, {product_id: delta},
+                reason=reason, reference_type="stockmovement", reference_id=movement.id, user_id=user_id,
+            )
 
-            # Sincronizar stock global
-            product.stock_quantity = max(0, product.stock_quantity + delta)
-            session.add(product)
+        if bin_stock:
+            bin_stock.quantity = new_quantity
+            bin_stock.updated_at = datetime.now(timezone.utc)
+        else:
+            bin_stock = BinStock(
+                tenant_id=tenant_id,
+                bin_id=bin_id,
+                product_id=product_id,
+                quantity=new_quantity,
+            )
+        session.add(bin_stock)
 
         session.commit()
         return {
@@ -138,44 +234,61 @@ class BinStockService:
         if from_bin_id == to_bin_id:
             raise StockServiceError("Origen y destino no pueden ser iguales")
 
-        # Idempotencia
-        if request_id:
-            existing = session.exec(
-                select(StockMovement).where(StockMovement.request_id == request_id)
-            ).first()
-            if existing:
-                return {"ok": True, "idempotent": True, "movement_id": existing.id}
-
         from_bin = BinStockService._get_bin_or_raise(session, from_bin_id, tenant_id)
         to_bin = BinStockService._get_bin_or_raise(session, to_bin_id, tenant_id)
 
-        # Lock pesimista sobre BinStock origen
-        from_stock = session.exec(
-            select(BinStock).where(
-                BinStock.bin_id == from_bin_id,
-                BinStock.product_id == product_id,
-            ).with_for_update()
-        ).first()
-
-        if not from_stock or from_stock.quantity < quantity:
-            available = from_stock.quantity if from_stock else 0
-            raise StockServiceError(
-                f"Stock insuficiente en origen. Disponible: {available}", 409
+        # Idempotencia insert-first: el movimiento se registra antes de mover stock.
+        # Si la validación posterior falla, el rollback descarta también el movimiento.
+        movement = StockMovement(
+            tenant_id=tenant_id,
+            product_id=product_id,
+            from_bin_id=from_bin_id,
+            to_bin_id=to_bin_id,
+            quantity=quantity,
+            reason="transferencia",
+            notes=notes,
+            request_id=request_id,
+            user_id=user_id,
+        )
+        if request_id:
+            movement, created = BinStockService._insert_or_get_by_request_id(
+                session, movement, tenant_id, request_id
             )
+            if not created:
+                movement_id = movement.id
+                session.rollback()
+                return {"ok": True, "idempotent": True, "movement_id": movement_id}
+        else:
+            session.add(movement)
 
-        # Lock pesimista sobre destino
-        to_stock = session.exec(
-            select(BinStock).where(
-                BinStock.bin_id == to_bin_id,
-                BinStock.product_id == product_id,
-            ).with_for_update()
-        ).first()
+        try:
+            # Lock pesimista sobre origen y destino, en orden de bin_id: dos
+            # transferencias opuestas no pueden bloquearse mutuamente
+            locked = {
+                bs.bin_id: bs for bs in session.exec(
+                    select(BinStock).where(
+                        BinStock.bin_id.in_([from_bin_id, to_bin_id]),
+                        BinStock.product_id == product_id,
+                    ).order_by(BinStock.bin_id).with_for_update()
+                ).all()
+            }
+            from_stock = locked.get(from_bin_id)
+            to_stock = locked.get(to_bin_id)
+
+            if not from_stock or from_stock.quantity < quantity:
+                available = from_stock.quantity if from_stock else 0
+                raise StockServiceError(
+                    f"Stock insuficiente en origen. Disponible: {available}", 409
+                )
 
-        to_current = to_stock.quantity if to_stock else 0
-        if to_bin.max_capacity is not None and (to_current + quantity) > to_bin.max_capacity:
-            raise StockServiceError(
-                f"Excede la capacidad máxima del destino ({to_bin.max_capacity})", 409
-            )
+            to_current = to_stock.quantity if to_stock else 0
+            if to_bin.max_capacity is not None and (to_current + quantity) > to_bin.max_capacity:
+                raise StockServiceError(
+                    f"Excede la capacidad máxima del destino ({to_bin.max_capacity})", 409
+                )
+        except StockServiceError:
+            session.rollback()
+            raise
 
         # Ejecutar transferencia atómica
         now = datetime.now(timezone.utc)
@@ -195,18 +308,6 @@ class BinStockService:
                 quantity=quantity,
             ))
 
-        movement = StockMovement(
-            tenant_id=tenant_id,
-            product_id=product_id,
-            from_bin_id=from_bin_id,
-            to_bin_id=to_bin_id,
-            quantity=quantity,
-            reason="transferencia",
-            notes=notes,
-            request_id=request_id,
-            user_id=user_id,
-        )
-        session.add(movement)
         # Stock global no cambia en transferencias (misma cantidad distribuida)
         session.commit()
 
@@ -218,6 +319,365 @@ class BinStockService:
             "quantity": quantity,
         }
 
+    # ------------------------------------------------------------
+    # Documentos multi-línea (una transacción por documento)
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _claim_document(
+        session: Session,
+        tenant_id: int,
+        doc_type: str,
+        request_id: Optional[str],
+        line_count: int,
+        notes: Optional[str],
+        user_id: Optional[int],
+    ) -> tuple[StockDocument, bool]:
+        """
+        Inserta la cabecera del documento antes de tocar stock (insert-first).
+        Si el request_id ya existe (constraint único) retorna (existente, False).
+        """
+        document = StockDocument(
+            tenant_id=tenant_id,
+            doc_type=doc_type,
+            request_id=request_id,
+            line_count=line_count,
+            notes=notes,
+            user_id=user_id,
+        )
+        if not request_id:
+            session.add(document)
+            session.flush()
+            return document, True
+        return BinStockService._insert_or_get_by_request_id(session, document, tenant_id, request_id)
+
+    @staticmethod
+    def _load_bins_or_raise(session: Session, tenant_id: int, bin_ids: set) -> dict:
+        bins = session.exec(
+            select(Bin).where(Bin.id.in_(bin_ids), Bin.tenant_id == tenant_id)
+        ).all()
+        bins_by_id = {b.id: b for b in bins}
+        missing = sorted(bin_ids - bins_by_id.keys())
+        if missing:
+            raise StockServiceError(f"Ubicación {missing[0]} no encontrada", 404)
+        return bins_by_id
+
+    @staticmethod
+    def _check_products_or_raise(session: Session, tenant_id: int, product_ids: set) -> None:
+        found = set(session.exec(
+            select(Product.id).where(Product.id.in_(product_ids), Product.tenant_id == tenant_id)
+        ).all())
+        missing = sorted(product_ids - found)
+        if missing:
+            raise StockServiceError(f"Producto {missing[0]} no encontrado", 404)
+
+    @staticmethod
+    def _lock_bin_stock_rows(session: Session, tenant_id: int, keys: set) -> dict:
+        """
+        SELECT ... FOR UPDATE de todas las filas (bin_id, product_id) del documento,
+        ordenadas por (bin_id, product_id) para que dos documentos concurrentes
+        tomen los locks en el mismo orden y no haya deadlocks.
+        """
+        rows = session.exec(
+            select(BinStock.id, BinStock.bin_id, BinStock.product_id, BinStock.quantity)
+            .where(
+                BinStock.tenant_id == tenant_id,
+                tuple_(BinStock.bin_id, BinStock.product_id).in_(sorted(keys)),
+            )
+            .order_by(BinStock.bin_id, BinStock.product_id)
+            .with_for_update()
+        ).all()
+        return {(r.bin_id, r.product_id): r for r in rows}
+
+    @staticmethod
+    def _write_bin_quantities(
+        session: Session,
+        tenant_id: int,
+        locked: dict,
+        final_quantities: dict,
+    ) -> None:
+        """Aplica las cantidades finales en bulk: un UPDATE executemany + un INSERT multi-fila."""
+        now = datetime.now(timezone.utc)
+        updates = []
+        inserts = []
+        for key in sorted(final_quantities):
+            bin_id, product_id = key
+            qty = final_quantities[key]
+            row = locked.get(key)
+            if row is not None:
+                if row.quantity != qty:
+                    updates.append({"b_id": row.id, "b_quantity": qty, "b_updated_at": now})
+            elif qty > 0:
+                inserts.append({
+                    "tenant_id": tenant_id,
+                    "bin_id": bin_id,
+                    "product_id": product_id,
+                    "quantity": qty,
+                    "updated_at": now,
+                })
+
+        table = BinStock.__table__
+        if updates:
+            session.connection().execute(
+                update(table)
+                .where(table.c.id == bindparam("b_id"))
+                .values(quantity=bindparam("b_quantity"), updated_at=bindparam("b_updated_at")),
+                updates,
+            )
+        if inserts:
+            session.connection().execute(insert(table), inserts)
+
+    @staticmethod
+    def _insert_movements(session: Session, movements: list) -> None:
+        if movements:
+            session.connection().execute(insert(StockMovement.__table__), movements)
+
+    @staticmethod
+    def apply_transfer_document(
+        session: Session,
+        tenant_id: int,
+        lines: list,
+        notes: Optional[str] = None,
+        request_id: Optional[str] = None,
+        user_id: Optional[int] = None,
+    ) -> dict:
+        """
+        Transfiere muchas líneas (product_id, from_bin_id, to_bin_id, quantity)
+        en una sola transacción. Todo o nada. Idempotente por request_id del documento.
+        """
+        if not lines:
+            raise StockServiceError("El documento debe tener al menos una línea")
+        if len(lines) > MAX_DOCUMENT_LINES:
+            raise StockServiceError(f"El documento excede el máximo de {MAX_DOCUMENT_LINES} líneas")
+        for line in lines:
+            if line["quantity"] <= 0:
+                raise StockServiceError("La cantidad a transferir debe ser mayor a 0")
+            if line["from_bin_id"] == line["to_bin_id"]:
+                raise StockServiceError("Origen y destino no pueden ser iguales")
+
+        bin_ids = {l["from_bin_id"] for l in lines} | {l["to_bin_id"] for l in lines}
+        bins_by_id = BinStockService._load_bins_or_raise(session, tenant_id, bin_ids)
+        BinStockService._check_products_or_raise(session, tenant_id, {l["product_id"] for l in lines})
+
+        document, created = BinStockService._claim_document(
+            session, tenant_id, "transferencia", request_id, len(lines), notes, user_id
+        )
+        if not created:
+            document_id = document.id
+            session.rollback()
+            return {"ok": True, "idempotent": True, "document_id": document_id}
+
+        deltas = defaultdict(int)
+        for line in lines:
+            deltas[(line["from_bin_id"], line["product_id"])] -= line["quantity"]
+            deltas[(line["to_bin_id"], line["product_id"])] += line["quantity"]
+
+        locked = BinStockService._lock_bin_stock_rows(session, tenant_id, set(deltas))
+
+        final_quantities = {}
+        for key, delta in deltas.items():
+            bin_id, product_id = key
+            current = locked[key].quantity if key in locked else 0
+            final_qty = current + delta
+            if final_qty < 0:
+                session.rollback()
+                raise StockServiceError(
+                    f"Stock insuficiente en ubicación {bin_id} para producto {product_id}. "
+                    f"Disponible: {current}", 409
+                )
+            max_capacity = bins_by_id[bin_id].max_capacity
+            if delta > 0 and max_capacity is not None and final_qty > max_capacity:
+                session.rollback()
+                raise StockServiceError(
+                    f"Excede la capacidad máxima del destino {bins_by_id[bin_id].name} ({max_capacity})", 409
+                )
+            final_quantities[key] = final_qty
+
+        BinStockService._write_bin_quantities(session, tenant_id, locked, final_quantities)
+
+        now = datetime.now(timezone.utc)
+        BinStockService._insert_movements(session, [
+            {
+                "tenant_id": tenant_id,
+                "product_id": line["product_id"],
+                "from_bin_id": line["from_bin_id"],
+                "to_bin_id": line["to_bin_id"],
+                "quantity": line["quantity"],
+                "reason": "transferencia",
+                "notes": notes,
+                "document_id": document.id,
+                "user_id": user_id,
+                "timestamp": now,
+            }
+            for line in lines
+        ])
+        # Stock global no cambia en transferencias
+        document_id = document.id
+        session.commit()
+
+        return {
+            "ok": True,
+            "document_id": document_id,
+            "request_id": request_id,
+            "lines": len(lines),
+            "movements": len(lines),
+        }
+
+    @staticmethod
+    def consume_for_sale(
+        session: Session,
+        tenant_id: int,
+        demand: dict,
+        sale_id: int,
+        user_id: Optional[int] = None,
+    ) -> int:
+        """
+        Descuenta de las posiciones la demanda de una venta ({product_id: qty}).
+        Toma primero las posiciones con más stock (menos filas tocadas) y registra
+        un StockMovement "venta" por posición. Lo que no esté ubicado en ningún
+        bin solo se descuenta del stock global (depósitos sin WMS configurado).
+        No hace commit: corre dentro de la transacción de la venta, antes de
+        bloquear los Product (ver orden de locks en el encabezado).
+        Retorna la cantidad de movimientos registrados.
+        """
+        rows = session.exec(
+            select(BinStock.id, BinStock.bin_id, BinStock.product_id, BinStock.quantity)
+            .where(
+                BinStock.tenant_id == tenant_id,
+                BinStock.product_id.in_(demand.keys()),
+                BinStock.quantity > 0,
+            )
+            .order_by(BinStock.bin_id, BinStock.product_id)
+            .with_for_update()
+        ).all()
+        by_product = defaultdict(list)
+        for row in rows:
+            by_product[row.product_id].append(row)
+
+        locked, final_quantities, movements = {}, {}, []
+        now = datetime.now(timezone.utc)
+        for product_id, needed in demand.items():
+            for row in sorted(by_product[product_id], key=lambda r: (-r.quantity, r.bin_id)):
+                if needed == 0:
+                    break
+                take = min(row.quantity, needed)
+                needed -= take
+                key = (row.bin_id, product_id)
+                locked[key] = row
+                final_quantities[key] = row.quantity - take
+                movements.append({
+                    "tenant_id": tenant_id,
+                    "product_id": product_id,
+                    "from_bin_id": row.bin_id,
+                    "to_bin_id": None,
+                    "quantity": take,
+                    "reason": "venta",
+                    "notes": f"Venta #{sale_id}",
+                    "user_id": user_id,
+                    "timestamp": now,
+                })
+
+        BinStockService._write_bin_quantities(session, tenant_id, locked, final_quantities)
+        BinStockService._insert_movements(session, movements)
+        return len(movements)
+
+    @staticmethod
+    def apply_adjustment_document(
+        session: Session,
+        tenant_id: int,
+        lines: list,
+        reason: str = "ajuste",
+        notes: Optional[str] = None,
+        request_id: Optional[str] = None,
+        user_id: Optional[int] = None,
+        commit: bool = True,
+    ) -> dict:
+        """
+        Versión multi-línea de adjust_stock: cada línea (bin_id, product_id, quantity)
+        fija la cantidad final de la posición. Sincroniza product.stock_quantity
+        con la suma de deltas por producto, todo en una transacción.
+        Con commit=False el llamador confirma junto con sus propios cambios.
+        """
+        if not lines:
+            raise StockServiceError("El documento debe tener al menos una línea")
+        if len(lines) > MAX_DOCUMENT_LINES:
+            raise StockServiceError(f"El documento excede el máximo de {MAX_DOCUMENT_LINES} líneas")
+
+        targets = {}
+        for line in lines:
+            if line["quantity"] < 0:
+                raise StockServiceError("La cantidad no puede ser negativa")
+            key = (line["bin_id"], line["product_id"])
+            if key in targets:
+                raise StockServiceError(
+                    f"Línea duplicada para ubicación {key[0]} y producto {key[1]}"
+                )
+            targets[key] = line["quantity"]
+
+        bins_by_id = BinStockService._load_bins_or_raise(session, tenant_id, {k[0] for k in targets})
+        BinStockService._check_products_or_raise(session, tenant_id, {k[1] for k in targets})
+
+        for (bin_id, _), qty in targets.items():
+            max_capacity = bins_by_id[bin_id].max_capacity
+            if max_capacity is not None and qty > max_capacity:
+                raise StockServiceError(
+                    f"Excede la capacidad máxima de la ubicación {bins_by_id[bin_id].name} ({max_capacity})"
+                )
+
+        document, created = BinStockService._claim_document(
+            session, tenant_id, "ajuste", request_id, len(lines), notes, user_id
+        )
+        if not created:
+            document_id = document.id
+            session.rollback()
+            return {"ok": True, "idempotent": True, "document_id": document_id}
+
+        locked = BinStockService._lock_bin_stock_rows(session, tenant_id, set(targets))
+
+        now = datetime.now(timezone.utc)
+        movements = []
+        product_deltas = defaultdict(int)
+        for key in sorted(targets):
+            bin_id, product_id = key
+            old_qty = locked[key].quantity if key in locked else 0
+            delta = targets[key] - old_qty
+            if delta == 0:
+                continue
+            product_deltas[product_id] += delta
+            movements.append({
+                "tenant_id": tenant_id,
+                "product_id": product_id,
+                "from_bin_id": None if delta > 0 else bin_id,
+                "to_bin_id": bin_id if delta > 0 else None,
+                "quantity": abs(delta),
+                "reason": reason,
+                "notes": notes,
+                "document_id": document.id,
+                "user_id": user_id,
+                "timestamp": now,
+            })
+
+        BinStockService._write_bin_quantities(session, tenant_id, locked, targets)
+        BinStockService._insert_movements(session, movements)
+
+        # Sincronizar stock global: un UPDATE executemany, en orden de product_id
+        BinStockService._shift_product_stock(
+            session, tenant_id, product_deltas,
+            reason=reason, reference_type="stockdocument", reference_id=document.id, user_id=user_id,
+        )
+
+        document_id = document.id
+        if commit:
+            session.commit()
+
+        return {
+            "ok": True,
+            "document_id": document_id,
+            "request_id": request_id,
+            "lines": len(lines),
+            "movements": len(movements),
+        }
+
     @staticmethod
     def reconcile_product(session: Session, tenant_id: int, product_id: int) -> dict:
         """
@@ -253,6 +713,8 @@ class BinStockService:
         ).all()
 
         results = []
+        if fix:
+            stock_ledger.tag(session, "reconciliacion")
         for p in products:
             r = BinStockService.reconcile_product(session, tenant_id, p.id)
             if not r["ok"]:
@@ -267,12 +729,60 @@ class BinStockService:
         return results
 
     @staticmethod
-    def backfill_default_location(session: Session, tenant_id: int) -> dict:
+    def _insert_missing_bin_stock(
+        session: Session,
+        tenant_id: int,
+        bin_id: int,
+        after_product_id: Optional[int] = None,
+        up_to_product_id: Optional[int] = None,
+    ) -> int:
+        """
+        INSERT INTO binstock SELECT ... FROM product WHERE NOT EXISTS (...).
+        Un solo statement por rango de productos; retorna filas insertadas.
+        """
+        conditions = [
+            Product.tenant_id == tenant_id,
+            Product.stock_quantity > 0,
+            ~exists().where(
+                BinStock.bin_id == bin_id,
+                BinStock.product_id == Product.id,
+            ),
+        ]
+        if after_product_id is not None:
+            conditions.append(Product.id > after_product_id)
+        if up_to_product_id is not None:
+            conditions.append(Product.id <= up_to_product_id)
+
+        stmt = insert(BinStock).from_select(
+            ["tenant_id", "bin_id", "product_id", "quantity", "updated_at"],
+            select(
+                literal(tenant_id),
+                literal(bin_id),
+                Product.id,
+                Product.stock_quantity,
+                literal(datetime.now(timezone.utc)),
+            ).where(*conditions),
+        )
+        result = session.exec(stmt)
+        return max(result.rowcount or 0, 0)
+
+    @staticmethod
+    def backfill_default_location(
+        session: Session,
+        tenant_id: int,
+        chunk_size: Optional[int] = None,
+    ) -> dict:
         """
         Crea el depósito 'Depósito Central' y bin 'SIN-UBICACION' por defecto.
         Inserta bin_stock inicial con el stock global de cada producto.
         Idempotente — no hace nada si ya existe.
+
+        Con chunk_size, recorre los productos por rangos de id y hace commit
+        por rango (para tenants con catálogos muy grandes).
         """
+        if chunk_size is not None and chunk_size <= 0:
+            raise StockServiceError("chunk_size debe ser mayor a 0")
+
         # Crear depósito default si no existe
         location = session.exec(
             select(Location).where(
@@ -310,32 +820,41 @@ class BinStockService:
             session.add(default_bin)
             session.flush()
 
-        # Backfill: cada producto va a SIN-UBICACION con su stock global actual
-        products = session.exec(
-            select(Product).where(Product.tenant_id == tenant_id)
-        ).all()
+        location_id = location.id
+        default_bin_id = default_bin.id
 
+        # Backfill: cada producto va a SIN-UBICACION con su stock global actual
         created = 0
-        for p in products:
-            existing = session.exec(
-                select(BinStock).where(
-                    BinStock.bin_id == default_bin.id,
-                    BinStock.product_id == p.id
+        chunks = 0
+        if chunk_size:
+            # Paginación por keyset sobre product.id: cada rango es un INSERT ... SELECT
+            session.commit()
+            last_id = 0
+            while True:
+                upper_id = session.exec(
+                    select(Product.id)
+                    .where(Product.tenant_id == tenant_id, Product.id > last_id)
+                    .order_by(Product.id)
+                    .offset(chunk_size - 1)
+                    .limit(1)
+                ).first()
+                created += BinStockService._insert_missing_bin_stock(
+                    session, tenant_id, default_bin_id, last_id, upper_id
                 )
-            ).first()
-            if not existing and p.stock_quantity > 0:
-                session.add(BinStock(
-                    tenant_id=tenant_id,
-                    bin_id=default_bin.id,
-                    product_id=p.id,
-                    quantity=p.stock_quantity,
-                ))
-                created += 1
+                session.commit()
+                chunks += 1
+                if upper_id is None:
+                    break
+                last_id = upper_id
+        else:
+            created = BinStockService._insert_missing_bin_stock(session, tenant_id, default_bin_id)
+            session.commit()
+            chunks = 1
 
-        session.commit()
         return {
             "ok": True,
-            "location_id": location.id,
-            "default_bin_id": default_bin.id,
+            "location_id": location_id,
+            "default_bin_id": default_bin_id,
             "products_backfilled": created,
+            "chunks": chunks,
         }
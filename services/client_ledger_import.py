@@ -0,0 +1,207 @@
+"""
+services/client_ledger_import.py
+================================
+Importación del libro de cuentas corrientes (clientes.xlsx): una hoja por
+cliente, con el saldo en la última fila de la columna "Restan" o "Saldo".
+
+El libro se abre una sola vez por proceso con openpyxl en modo read_only
+(streaming, sin cargar las celdas de todas las hojas). Con muchas hojas se
+reparten por lotes en un pool de procesos; cada worker abre el libro en su
+initializer y solo devuelve el saldo crudo de cada hoja. El proceso principal
+junta los resultados, los parsea vectorizado y escribe todo junto:
+
+  - clientes nuevos: un INSERT ... RETURNING por lote,
+  - saldos iniciales: un INSERT executemany de ventas en cuenta corriente
+    (solo para clientes sin ventas previas).
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import pandas as pd
+from openpyxl import load_workbook
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from database.models import Client, Sale
+from services import report_cache
+from services.import_service import ClientImportService, normalize_header, normalize_name, parse_numbers
+
+BALANCE_COLUMNS = ("restan", "saldo")
+SHEETS_PER_TASK = 25
+MIN_SHEETS_FOR_POOL = 100
+_ID_CHUNK = 5000
+
+# Libro abierto por cada worker del pool (lo carga el initializer)
+_workbook = None
+
+
+def _open_workbook(path: str):
+    return load_workbook(path, read_only=True, data_only=True)
+
+
+def _init_worker(path: str) -> None:
+    global _workbook
+    _workbook = _open_workbook(path)
+
+
+def _sheet_balance(worksheet):
+    """Valor crudo de la columna de saldo en la última fila con datos (None si no hay)."""
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if not header:
+        return None
+    names = [normalize_header(h) if h is not None else "" for h in header]
+    column = next((names.index(c) for c in BALANCE_COLUMNS if c in names), None)
+    if column is None:
+        return None
+    last = None
+    for row in rows:
+        if any(v is not None and v != "" for v in row):
+            last = row
+    if last is None or column >= len(last):
+        return None
+    return last[column]
+
+
+def read_sheets(workbook, sheet_names: list) -> list:
+    """[{"sheet", "value"} | {"sheet", "error"}] de las hojas pedidas."""
+    results = []
+    for name in sheet_names:
+        try:
+            results.append({"sheet": name, "value": _sheet_balance(workbook[name])})
+        except Exception as exc:
+            results.append({"sheet": name, "error": str(exc)})
+    return results
+
+
+def _read_batch(sheet_names: list) -> list:
+    return read_sheets(_workbook, sheet_names)
+
+
+def scan_workbook(
+    path: str,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> list:
+    """
+    Lee el saldo de todas las hojas, en el orden del libro. `progress(hechas, total)`
+    se llama al terminar cada lote.
+    """
+    if workers is None:
+        workers = int(os.getenv("LEDGER_IMPORT_WORKERS", str(os.cpu_count() or 1)))
+    workbook = _open_workbook(path)
+    sheet_names = list(workbook.sheetnames)
+    batches = [sheet_names[i:i + SHEETS_PER_TASK] for i in range(0, len(sheet_names), SHEETS_PER_TASK)]
+    results = []
+
+    if workers <= 1 or len(sheet_names) < MIN_SHEETS_FOR_POOL:
+        try:
+            for batch in batches:
+                results.extend(read_sheets(workbook, batch))
+                if progress:
+                    progress(len(results), len(sheet_names))
+        finally:
+            workbook.close()
+        return results
+
+    workbook.close()
+    # spawn: el pool puede arrancar desde un thread del servidor (fork con threads no es seguro)
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(batches)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(path,),
+    ) as pool:
+        for future in as_completed([pool.submit(_read_batch, batch) for batch in batches]):
+            results.extend(future.result())
+            if progress:
+                progress(len(results), len(sheet_names))
+
+    order = {name: i for i, name in enumerate(sheet_names)}
+    results.sort(key=lambda r: order[r["sheet"]])
+    return results
+
+
+def import_ledger(
+    session: Session,
+    tenant_id: int,
+    path: str,
+    user_id: Optional[int] = None,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    commit: bool = True,
+) -> dict:
+    """
+    Da de alta los clientes que no existen (cruce por nombre normalizado) y crea
+    la venta pendiente con el saldo inicial de los que no tienen ventas.
+    Hojas repetidas del mismo cliente: vale el primer saldo positivo.
+    """
+    results = scan_workbook(path, workers, progress)
+    errors = [f"Sheet {r['sheet']}: {r['error']}" for r in results if "error" in r]
+
+    sheets = pd.DataFrame([r for r in results if "error" not in r], columns=["sheet", "value"])
+    sheets["name"] = sheets["sheet"].astype("string").str.strip()
+    sheets["_name_key"] = normalize_name(sheets["name"])
+    balances, bad = parse_numbers(sheets["value"].astype(object))
+    for sheet in sheets.loc[bad, "sheet"]:
+        errors.append(f"Sheet {sheet}: saldo inválido")
+    sheets["balance"] = balances.fillna(0.0)
+    sheets = sheets[~bad & sheets["_name_key"].notna()]
+
+    keys = ClientImportService.load_keys(session, tenant_id)
+    sheets["client_id"] = sheets["_name_key"].map(keys["name"]).astype("Float64").astype("Int64")
+    clients = sheets.drop_duplicates("_name_key")
+    existing = clients[clients["client_id"].notna()]
+    new = clients[clients["client_id"].isna()]
+
+    if not new.empty:
+        table = Client.__table__
+        returned = session.connection().execute(
+            insert(table).returning(table.c.id, table.c.name),
+            [{"tenant_id": tenant_id, "name": name} for name in new["name"]],
+        ).all()
+        new_ids = {name: client_id for client_id, name in returned}
+        sheets["client_id"] = sheets["client_id"].fillna(sheets["name"].map(new_ids).astype("Float64").astype("Int64"))
+        # Hojas repetidas con otra grafía apuntan al cliente recién creado
+        by_key = sheets.dropna(subset=["client_id"]).drop_duplicates("_name_key").set_index("_name_key")["client_id"]
+        sheets["client_id"] = sheets["client_id"].fillna(sheets["_name_key"].map(by_key))
+
+    debts = sheets[sheets["balance"] > 0].drop_duplicates("client_id")
+    opening = 0
+    if not debts.empty:
+        client_ids = debts["client_id"].astype(int).tolist()
+        with_sales = set()
+        for i in range(0, len(client_ids), _ID_CHUNK):
+            with_sales.update(session.exec(
+                select(Sale.client_id).where(
+                    Sale.tenant_id == tenant_id, Sale.client_id.in_(client_ids[i:i + _ID_CHUNK])
+                ).distinct()
+            ).all())
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        rows = [
+            {
+                "tenant_id": tenant_id, "client_id": client_id, "user_id": user_id, "timestamp": now,
+                "total_amount": float(balance), "amount_paid": 0.0, "amount_cash": 0.0, "amount_transfer": 0.0,
+                "payment_status": "pending", "payment_method": "account", "is_closed": False,
+            }
+            for client_id, balance in zip(client_ids, debts["balance"])
+            if client_id not in with_sales
+        ]
+        if rows:
+            session.connection().execute(insert(Sale.__table__), rows)
+        opening = len(rows)
+    report_cache.touch(session, tenant_id)
+
+    if commit:
+        session.commit()
+    return {
+        "added": len(new),
+        "updated": len(existing),
+        "opening_balances": opening,
+        "sheets_processed": len(results),
+        "errors": errors,
+    }
@@ -0,0 +1,378 @@
+"""
+services/cycle_count_service.py
+===============================
+Conteo cíclico: tareas diarias de conteo muestreadas y carga masiva de resultados.
+
+Cada día se sortean posiciones (bin + producto con stock) sin reemplazo, con
+probabilidad proporcional a un peso que combina valor inmovilizado (cantidad x
+costo), velocidad de venta y días desde el último conteo. Así los productos
+caros o de alta rotación se cuentan seguido y ninguna posición queda sin contar
+indefinidamente. El sorteo es vectorizado (Efraimidis-Spirakis): una clave por
+candidato y un argpartition, sin bucles por fila.
+
+Los conteos se cargan en bulk y las diferencias se aplican como un documento
+de ajuste (BinStockService.apply_adjustment_document): una transacción.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, case, insert, update
+from sqlmodel import Session, func, select
+
+from database.models import Bin, BinStock, CycleCountTask, Product, Sale, SaleItem, StockDocument
+from services.bin_stock_service import MAX_DOCUMENT_LINES, BinStockService, StockServiceError
+
+ADJUSTMENT_REASON = "conteo_ciclico"
+
+
+class CycleCountService:
+    """Generación de tareas de conteo y aplicación de diferencias."""
+
+    @staticmethod
+    def _candidates(session: Session, tenant_id: int, location_id: Optional[int]) -> pd.DataFrame:
+        """Posiciones con stock en bins activos, con el costo del producto (una consulta)."""
+        stmt = (
+            select(BinStock.bin_id, BinStock.product_id, BinStock.quantity, Product.cost_price)
+            .join(Bin, BinStock.bin_id == Bin.id)
+            .join(Product, BinStock.product_id == Product.id)
+            .where(BinStock.tenant_id == tenant_id, BinStock.quantity > 0, Bin.is_active == True)  # noqa: E712
+        )
+        if location_id is not None:
+            stmt = stmt.where(Bin.location_id == location_id)
+        return pd.DataFrame(
+            session.exec(stmt).all(), columns=["bin_id", "product_id", "quantity", "cost_price"]
+        )
+
+    @staticmethod
+    def _velocity(session: Session, tenant_id: int, since: datetime) -> pd.DataFrame:
+        rows = session.exec(
+            select(SaleItem.product_id, func.coalesce(func.sum(SaleItem.quantity), 0))
+            .join(Sale, SaleItem.sale_id == Sale.id)
+            .where(Sale.tenant_id == tenant_id, Sale.timestamp >= since, SaleItem.product_id.is_not(None))
+            .group_by(SaleItem.product_id)
+        ).all()
+        return pd.DataFrame(rows, columns=["product_id", "units_sold"])
+
+    @staticmethod
+    def _last_counted(session: Session, tenant_id: int) -> pd.DataFrame:
+        rows = session.exec(
+            select(CycleCountTask.bin_id, CycleCountTask.product_id, func.max(CycleCountTask.counted_at))
+            .where(CycleCountTask.tenant_id == tenant_id, CycleCountTask.status == "counted")
+            .group_by(CycleCountTask.bin_id, CycleCountTask.product_id)
+        ).all()
+        return pd.DataFrame(rows, columns=["bin_id", "product_id", "last_counted_at"])
+
+    @staticmethod
+    def sampling_weights(
+        candidates: pd.DataFrame,
+        today: date,
+        value_weight: float = 0.5,
+        velocity_weight: float = 0.5,
+        max_age_days: int = 90,
+    ) -> pd.Series:
+        """
+        Peso de cada candidato. Valor y velocidad se normalizan como participación
+        sobre el total (suman 1 cada uno); el factor de antigüedad crece linealmente
+        con los días sin contar hasta duplicar el peso en `max_age_days`.
+        Las columnas esperadas: quantity, cost_price, units_sold, last_counted_at.
+        """
+        value = candidates["quantity"].to_numpy(dtype=float) * candidates["cost_price"].fillna(0).to_numpy(dtype=float)
+        velocity = candidates["units_sold"].fillna(0).to_numpy(dtype=float)
+        value_share = value / value.sum() if value.sum() > 0 else np.zeros(len(value))
+        velocity_share = velocity / velocity.sum() if velocity.sum() > 0 else np.zeros(len(velocity))
+
+        # Piso uniforme: una posición sin valor ni ventas también puede salir sorteada
+        floor = 1.0 / max(len(candidates), 1)
+        base = value_weight * value_share + velocity_weight * velocity_share + 0.1 * floor
+
+        last = pd.to_datetime(candidates["last_counted_at"])
+        age_days = (pd.Timestamp(today) - last).dt.days.fillna(max_age_days).clip(lower=0, upper=max_age_days)
+        age_factor = 1.0 + age_days.to_numpy(dtype=float) / max_age_days
+        return pd.Series(base * age_factor, index=candidates.index)
+
+    @staticmethod
+    def weighted_sample(weights: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Muestreo ponderado sin reemplazo (Efraimidis-Spirakis): clave u^(1/w),
+        se toman las k mayores. O(n), apto para decenas de miles de posiciones.
+        """
+        n = len(weights)
+        if k >= n:
+            return np.arange(n)
+        keys = np.log(rng.random(n)) / np.maximum(weights, 1e-12)
+        return np.argpartition(-keys, k - 1)[:k]
+
+    @staticmethod
+    def generate_daily_tasks(
+        session: Session,
+        tenant_id: int,
+        day: Optional[date] = None,
+        count: int = 50,
+        location_id: Optional[int] = None,
+        velocity_days: int = 90,
+        seed: Optional[int] = None,
+    ) -> dict:
+        """
+        Sortea hasta `count` tareas para `day`. Idempotente por día: si ya hay
+        tareas generadas solo completa las que falten. Excluye posiciones con
+        una tarea pendiente de días anteriores.
+        """
+        if count <= 0:
+            raise StockServiceError("La cantidad de tareas debe ser mayor a 0")
+        day = day or datetime.now(timezone.utc).date()
+
+        already = session.exec(
+            select(func.count(CycleCountTask.id)).where(
+                CycleCountTask.tenant_id == tenant_id,
+                CycleCountTask.scheduled_for == day,
+                CycleCountTask.status != "cancelled",
+            )
+        ).one()
+        missing = count - already
+        if missing <= 0:
+            return {"day": day, "created": 0, "total": already}
+
+        candidates = CycleCountService._candidates(session, tenant_id, location_id)
+        if candidates.empty:
+            return {"day": day, "created": 0, "total": already}
+
+        open_tasks = session.exec(
+            select(CycleCountTask.bin_id, CycleCountTask.product_id).where(
+                CycleCountTask.tenant_id == tenant_id,
+                (CycleCountTask.status == "pending") | (CycleCountTask.scheduled_for == day),
+            )
+        ).all()
+        if open_tasks:
+            excluded = pd.MultiIndex.from_tuples(open_tasks, names=["bin_id", "product_id"])
+            keys = pd.MultiIndex.from_frame(candidates[["bin_id", "product_id"]])
+            candidates = candidates[~keys.isin(excluded)].reset_index(drop=True)
+            if candidates.empty:
+                return {"day": day, "created": 0, "total": already}
+
+        since = datetime.utcnow() - timedelta(days=velocity_days)
+        candidates = candidates.merge(
+            CycleCountService._velocity(session, tenant_id, since), on="product_id", how="left"
+        ).merge(
+            CycleCountService._last_counted(session, tenant_id), on=["bin_id", "product_id"], how="left"
+        )
+
+        weights = CycleCountService.sampling_weights(candidates, day).to_numpy()
+        rng = np.random.default_rng(seed)
+        picked = candidates.iloc[CycleCountService.weighted_sample(weights, missing, rng)]
+        picked_weights = weights[picked.index.to_numpy()]
+
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "tenant_id": tenant_id,
+                "bin_id": int(bin_id),
+                "product_id": int(product_id),
+                "scheduled_for": day,
+                "status": "pending",
+                "weight": float(weight),
+                "created_at": now,
+            }
+            for bin_id, product_id, weight in zip(picked["bin_id"], picked["product_id"], picked_weights)
+        ]
+        session.connection().execute(insert(CycleCountTask.__table__), rows)
+        session.commit()
+        return {"day": day, "created": len(rows), "total": already + len(rows)}
+
+    @staticmethod
+    def list_tasks(
+        session: Session,
+        tenant_id: int,
+        day: Optional[date] = None,
+        status: Optional[str] = "pending",
+    ) -> list:
+        """Tareas del día con datos de posición y producto, en orden de recorrido."""
+        from services.picking_service import PickingService
+
+        stmt = (
+            select(CycleCountTask, Bin, Product)
+            .join(Bin, CycleCountTask.bin_id == Bin.id)
+            .join(Product, CycleCountTask.product_id == Product.id)
+            .where(CycleCountTask.tenant_id == tenant_id)
+        )
+        if day is not None:
+            stmt = stmt.where(CycleCountTask.scheduled_for == day)
+        if status:
+            stmt = stmt.where(CycleCountTask.status == status)
+        rows = session.exec(stmt).all()
+
+        bins = {b.id: b for _, b, _ in rows}
+        order = {b.id: i for i, b in enumerate(PickingService.route_order(list(bins.values())))}
+        rows = sorted(rows, key=lambda r: (order[r[1].id], r[2].name or ""))
+        return [
+            {
+                "task_id": task.id,
+                "scheduled_for": task.scheduled_for,
+                "status": task.status,
+                "bin_id": bin_.id,
+                "bin_name": bin_.name,
+                "location_id": bin_.location_id,
+                "product_id": product.id,
+                "product_name": product.name,
+                "barcode": product.barcode,
+                "item_number": product.item_number,
+                "counted_quantity": task.counted_quantity,
+                "variance": task.variance,
+            }
+            for task, bin_, product in rows
+        ]
+
+    @staticmethod
+    def submit_counts(
+        session: Session,
+        tenant_id: int,
+        counts: list,
+        user_id: Optional[int] = None,
+        request_id: Optional[str] = None,
+    ) -> dict:
+        """
+        Registra muchos conteos (task_id, counted_quantity) y aplica las diferencias
+        como un único documento de ajuste. Las tareas y el stock se confirman en la
+        misma transacción: si el ajuste falla, las tareas siguen pendientes.
+        """
+        if not counts:
+            raise StockServiceError("Debe enviar al menos un conteo")
+        if len(counts) > MAX_DOCUMENT_LINES:
+            raise StockServiceError(f"El lote excede el máximo de {MAX_DOCUMENT_LINES} conteos")
+
+        counted = {}
+        for c in counts:
+            if c["counted_quantity"] < 0:
+                raise StockServiceError("La cantidad contada no puede ser negativa")
+            if c["task_id"] in counted:
+                raise StockServiceError(f"Conteo duplicado para la tarea {c['task_id']}")
+            counted[c["task_id"]] = c["counted_quantity"]
+
+        tasks = session.exec(
+            select(CycleCountTask).where(
+                CycleCountTask.tenant_id == tenant_id, CycleCountTask.id.in_(counted)
+            )
+        ).all()
+        tasks_by_id = {t.id: t for t in tasks}
+        missing = sorted(set(counted) - set(tasks_by_id))
+        if missing:
+            raise StockServiceError(f"Tareas no encontradas: {missing}", 404)
+        closed = [t for t in tasks if t.status != "pending"]
+        if closed:
+            # Reintento de un lote ya registrado (mismas cantidades): no se toca stock
+            if all(t.status == "counted" and t.counted_quantity == counted[t.id] for t in tasks):
+                return {"ok": True, "idempotent": True, "counted": len(tasks)}
+            raise StockServiceError(f"Tareas ya cerradas: {sorted(t.id for t in closed)}", 409)
+        if request_id and session.exec(
+            select(StockDocument.id).where(StockDocument.tenant_id == tenant_id, StockDocument.request_id == request_id)
+        ).first():
+            # El ajuste de este request_id ya existe: no se marcan tareas que no ajustaría
+            return CycleCountService._replayed(session, tenant_id, counted)
+
+        # Stock del sistema al momento del conteo: una consulta para todas las posiciones
+        slots = {(t.bin_id, t.product_id) for t in tasks}
+        system = {
+            (bin_id, product_id): qty
+            for bin_id, product_id, qty in session.exec(
+                select(BinStock.bin_id, BinStock.product_id, BinStock.quantity).where(
+                    BinStock.tenant_id == tenant_id, BinStock.bin_id.in_({s[0] for s in slots})
+                )
+            ).all()
+            if (bin_id, product_id) in slots
+        }
+
+        now = datetime.now(timezone.utc)
+        updates = []
+        lines = []
+        for task in tasks:
+            system_qty = system.get((task.bin_id, task.product_id), 0)
+            variance = counted[task.id] - system_qty
+            updates.append({
+                "t_id": task.id,
+                "t_system": system_qty,
+                "t_counted": counted[task.id],
+                "t_variance": variance,
+            })
+            if variance != 0:
+                lines.append({"bin_id": task.bin_id, "product_id": task.product_id, "quantity": counted[task.id]})
+
+        table = CycleCountTask.__table__
+        session.connection().execute(
+            update(table)
+            .where(table.c.id == bindparam("t_id"), table.c.status == "pending")
+            .values(
+                status="counted",
+                system_quantity=bindparam("t_system"),
+                counted_quantity=bindparam("t_counted"),
+                variance=bindparam("t_variance"),
+                counted_by=user_id,
+                counted_at=now,
+            ),
+            updates,
+        )
+
+        result = {"ok": True, "counted": len(updates), "adjusted": len(lines), "document_id": None}
+        try:
+            if lines:
+                document = BinStockService.apply_adjustment_document(
+                    session, tenant_id, lines,
+                    reason=ADJUSTMENT_REASON, notes="Conteo cíclico",
+                    request_id=request_id, user_id=user_id, commit=False,
+                )
+                if document.get("idempotent"):
+                    # Otro envío con el mismo request_id ganó la carrera; el rollback
+                    # del ajuste también deshizo el UPDATE de tareas de este envío
+                    return CycleCountService._replayed(session, tenant_id, counted)
+                result["document_id"] = document["document_id"]
+                session.connection().execute(
+                    update(table)
+                    .where(table.c.id.in_([u["t_id"] for u in updates if u["t_variance"] != 0]))
+                    .values(document_id=document["document_id"])
+                )
+        except StockServiceError:
+            session.rollback()
+            raise
+        session.commit()
+        return result
+
+    @staticmethod
+    def _replayed(session: Session, tenant_id: int, counted: dict) -> dict:
+        """
+        Reintento con un request_id ya aplicado: idempotente si las tareas quedaron
+        contadas con las mismas cantidades; si no, el request_id pertenece a otro documento.
+        """
+        tasks = session.exec(
+            select(CycleCountTask)
+            .where(CycleCountTask.tenant_id == tenant_id, CycleCountTask.id.in_(counted))
+            .execution_options(populate_existing=True)
+        ).all()
+        if all(t.status == "counted" and t.counted_quantity == counted[t.id] for t in tasks):
+            return {"ok": True, "idempotent": True, "counted": len(tasks)}
+        session.rollback()
+        raise StockServiceError("El request_id ya fue usado por otro documento", 409)
+
+    @staticmethod
+    def summary(session: Session, tenant_id: int, since: date) -> dict:
+        """Exactitud de inventario desde `since`: posiciones contadas, con diferencia y unidades netas."""
+        counted, with_variance, net, absolute = session.exec(
+            select(
+                func.count(CycleCountTask.id),
+                func.coalesce(func.sum(case((CycleCountTask.variance != 0, 1), else_=0)), 0),
+                func.coalesce(func.sum(CycleCountTask.variance), 0),
+                func.coalesce(func.sum(func.abs(CycleCountTask.variance)), 0),
+            ).where(
+                CycleCountTask.tenant_id == tenant_id,
+                CycleCountTask.status == "counted",
+                CycleCountTask.scheduled_for >= since,
+            )
+        ).one()
+        return {
+            "since": since,
+            "counted": counted,
+            "with_variance": int(with_variance),
+            "accuracy": round(1 - with_variance / counted, 4) if counted else None,
+            "net_variance": int(net),
+            "absolute_variance": int(absolute),
+        }
@@ -0,0 +1,14 @@
+"""
+services/errors.py
+==================
+Error de dominio común a los servicios. Lleva el mensaje para el usuario y
+el status HTTP que el router devuelve tal cual.
+"""
+
+
+class ServiceError(Exception):
+    """Error de dominio de un servicio (mensaje + status HTTP)."""
+    def __init__(self, message: str, status_code: int = 400):
+        self.message = message
+        self.status_code = status_code
+        super().__init__(message)
@@ -0,0 +1,135 @@
+"""
+services/export_service.py
+==========================
+Exportaciones en streaming (CSV y XLSX) para productos, clientes y reportes.
+
+Las filas se leen con `yield_per` (cursor del lado del servidor en Postgres)
+en una Session propia: el generador corre mientras se envía la respuesta,
+cuando la session del request ya se cerró. Nunca se arma la lista completa:
+
+  - CSV: cada bloque de filas se envía apenas se escribe (primer byte
+    inmediato, memoria constante).
+  - XLSX: openpyxl en modo write-only vuelca las filas a disco; el archivo
+    se envía por bloques al cerrar el zip. La memoria es constante, pero el
+    primer byte llega recién con el libro completo (formato zip).
+"""
+
+import csv
+import io
+import tempfile
+from typing import Iterable, Iterator
+
+from openpyxl import Workbook
+from sqlalchemy import select
+from sqlmodel import Session
+
+from database.models import Client, Product
+
+YIELD_PER = 1000
+CHUNK_SIZE = 64 * 1024
+_SPOOL_MAX = 8 * 1024 * 1024
+
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Encabezado -> columna. Mismos encabezados que acepta la importación.
+PRODUCT_COLUMNS = {
+    "ID": Product.id,
+    "Name": Product.name,
+    "Category": Product.category,
+    "ItemNumber": Product.item_number,
+    "Barcode": Product.barcode,
+    "Price": Product.price,
+    "Stock": Product.stock_quantity,
+    "Description": Product.description,
+    "Numeracion": Product.numeracion,
+    "CantBulto": Product.cant_bulto,
+    "PriceBulk": Product.price_bulk,
+    "PriceRetail": Product.price_retail,
+}
+
+CLIENT_COLUMNS = {
+    "ID": Client.id,
+    "Name": Client.name,
+    "RazonSocial": Client.razon_social,
+    "CUIT": Client.cuit,
+    "Phone": Client.phone,
+    "Email": Client.email,
+    "Address": Client.address,
+    "IVACategory": Client.iva_category,
+    "CreditLimit": Client.credit_limit,
+    "TransportName": Client.transport_name,
+    "TransportAddress": Client.transport_address,
+}
+
+
+def iter_query(stmt, engine=None) -> Iterator[tuple]:
+    """Filas de `stmt` de a YIELD_PER, en una Session que vive lo que dura el generador."""
+    if engine is None:
+        from database.session import engine
+
+    with Session(engine) as session:
+        result = session.execute(stmt.execution_options(yield_per=YIELD_PER))
+        for row in result:
+            yield tuple(row)
+
+
+def table_rows(model, columns: dict, tenant_id: int, engine=None) -> Iterator[tuple]:
+    stmt = select(*columns.values()).where(model.tenant_id == tenant_id).order_by(model.id)
+    return iter_query(stmt, engine)
+
+
+def csv_stream(headers: list, rows: Iterable) -> Iterator[bytes]:
+    """CSV en UTF-8 con BOM (Excel lo abre con acentos) en bloques de ~CHUNK_SIZE."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(headers)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def xlsx_stream(sheets: list) -> Iterator[bytes]:
+    """
+    sheets: [(título, encabezados, filas)]. Las filas pueden ser generadores;
+    se consumen de a una.
+    """
+    workbook = Workbook(write_only=True)
+    for title, headers, rows in sheets:
+        worksheet = workbook.create_sheet(title)
+        worksheet.append(headers)
+        for row in rows:
+            worksheet.append(row)
+    with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX) as output:
+        workbook.save(output)
+        output.seek(0)
+        while chunk := output.read(CHUNK_SIZE):
+            yield chunk
+
+
+def stream(fmt: str, headers: list, rows: Iterable, sheet_title: str = "Sheet1") -> tuple[Iterator[bytes], str, str]:
+    """(generador de bytes, media type, extensión) para una sola tabla."""
+    if fmt == "csv":
+        return csv_stream(headers, rows), CSV_MEDIA_TYPE, "csv"
+    return xlsx_stream([(sheet_title, headers, rows)]), XLSX_MEDIA_TYPE, "xlsx"
+
+
+def products_export(tenant_id: int, fmt: str = "xlsx", engine=None):
+    rows = table_rows(Product, PRODUCT_COLUMNS, tenant_id, engine)
+    return stream(fmt, list(PRODUCT_COLUMNS), rows, "productos")
+
+
+def clients_export(tenant_id: int, fmt: str = "xlsx", engine=None):
+    rows = table_rows(Client, CLIENT_COLUMNS, tenant_id, engine)
+    return stream(fmt, list(CLIENT_COLUMNS), rows, "clientes")
+
+
+def dict_rows(records: Iterable[dict], headers: list) -> tuple[list, Iterator[tuple]]:
+    """Encabezados + filas a partir de dicts (reportes ya agregados)."""
+    return headers, (tuple(record.get(h) for h in headers) for record in records)
@@ -0,0 +1,310 @@
+"""
+services/forecast_service.py
+============================
+Pronóstico de demanda y punto de pedido por SKU.
+
+Se arma una matriz de demanda diaria (SKU x día local) de los últimos
+`history_days` días cerrados, desde los rollups diarios de ítems vendidos
+(DailyMarginRollup, agregados de SaleItem por producto; ver
+services/sales_rollup.py). Sobre la matriz, todo vectorizado con NumPy:
+
+- pronóstico de demanda diaria: media móvil de `window` días ("sma") o
+  suavizado exponencial simple con `alpha` ("ses");
+- desvío de la demanda diaria desde la primera venta del SKU (los días
+  previos a su alta no cuentan como demanda cero);
+- stock de seguridad z·σ·√L, punto de pedido d·L + SS y nivel objetivo
+  d·(L + R) + SS, con L = lead time y R = período de revisión;
+- sugerido = nivel objetivo - stock, redondeado al bulto, si el stock está
+  en o bajo el punto de pedido.
+
+Cada corrida reemplaza las ReorderSuggestion del tenant (una por SKU con
+historial; el proveedor es el de la última compra del producto), donde queda
+el punto de pedido calculado. Product.min_stock_level (que puede estar
+ajustado a mano) solo se pisa con `update_min_stock=True` explícito: así las
+alertas de stock bajo existentes pasan a usar el pronóstico.
+"""
+
+import math
+import time
+from datetime import date, datetime, timedelta, timezone
+from statistics import NormalDist
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, delete, func, insert, update
+from sqlmodel import Session, select
+
+from database.models import DailyMarginRollup, Product, Purchase, PurchaseItem, ReorderSuggestion, Supplier
+from services import sales_rollup, time_windows
+from services.errors import ServiceError
+
+METHODS = ("sma", "ses")
+# Los días cerrados sin rollup se agregan dentro de la corrida: acota ese trabajo
+MAX_HISTORY_DAYS = 730
+
+
+class ForecastService:
+    """Matriz de demanda, pronóstico, puntos de pedido y sugerencias de compra."""
+
+    # ------------------------------------------------------------
+    # Matriz de demanda
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def demand_matrix(session: Session, tenant_id: int, first: date, last: date) -> tuple:
+        """
+        (product_ids, matriz float32 [SKU x día]) de los días locales first..last.
+        Solo SKUs con alguna venta en el rango. Agrega antes los días que falten.
+        """
+        sales_rollup.ensure_closed_days(session, tenant_id, first, last)
+        rows = session.exec(
+            select(DailyMarginRollup.product_id, DailyMarginRollup.day, func.sum(DailyMarginRollup.units))
+            .where(
+                DailyMarginRollup.tenant_id == tenant_id,
+                DailyMarginRollup.day >= first,
+                DailyMarginRollup.day <= last,
+                DailyMarginRollup.product_id.is_not(None),
+            )
+            .group_by(DailyMarginRollup.product_id, DailyMarginRollup.day)
+        ).all()
+        days = (last - first).days + 1
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.zeros((0, days), dtype=np.float32)
+
+        frame = pd.DataFrame(rows, columns=["product_id", "day", "units"])
+        codes, product_ids = pd.factorize(frame["product_id"], sort=True)
+        offsets = (pd.to_datetime(frame["day"]) - pd.Timestamp(first)).dt.days.to_numpy()
+        matrix = np.zeros((len(product_ids), days), dtype=np.float32)
+        np.add.at(matrix, (codes, offsets), frame["units"].to_numpy(dtype=np.float32))
+        return np.asarray(product_ids, dtype=np.int64), matrix
+
+    # ------------------------------------------------------------
+    # Pronóstico
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def forecast(matrix: np.ndarray, method: str = "ses", window: int = 28, alpha: float = 0.2) -> tuple:
+        """
+        (pronóstico diario, desvío diario) por fila. Cada SKU se mide desde su
+        primera venta dentro de la matriz.
+        """
+        if method not in METHODS:
+            raise ServiceError(f"Método inválido: {method}")
+        if not 0 < alpha <= 1:
+            raise ServiceError("alpha debe estar entre 0 y 1")
+        n, days = matrix.shape
+        if n == 0:
+            return np.zeros(0), np.zeros(0)
+
+        first_sale = np.argmax(matrix > 0, axis=1)
+        active = np.arange(days)[None, :] >= first_sale[:, None]
+        active_days = active.sum(axis=1)
+
+        mean = np.where(active, matrix, 0).sum(axis=1, dtype=np.float64) / active_days
+        deviation = np.where(active, matrix - mean[:, None].astype(np.float32), 0)
+        std = np.sqrt(np.square(deviation).sum(axis=1, dtype=np.float64) / np.maximum(active_days - 1, 1))
+
+        if method == "sma":
+            window = max(1, min(window, days))
+            recent = active[:, -window:]
+            forecast = np.where(recent, matrix[:, -window:], 0).sum(axis=1, dtype=np.float64) / np.maximum(recent.sum(axis=1), 1)
+        else:
+            # Recurrencia por día sobre todos los SKUs a la vez; arranca en la primera venta
+            level = np.zeros(n, dtype=np.float64)
+            for t in range(days):
+                x = matrix[:, t]
+                level = np.where(first_sale == t, x, np.where(active[:, t], level + alpha * (x - level), level))
+            forecast = level
+        return forecast, std
+
+    @staticmethod
+    def reorder_points(
+        forecast: np.ndarray,
+        std: np.ndarray,
+        stock: np.ndarray,
+        pack: np.ndarray,
+        lead_time_days: int = 7,
+        review_days: int = 7,
+        service_level: float = 0.95,
+    ) -> dict:
+        """Stock de seguridad, punto de pedido y cantidad sugerida (múltiplo del bulto) por SKU."""
+        if not 0.5 <= service_level < 1:
+            raise ServiceError("El nivel de servicio debe estar entre 0.5 y 1")
+        if lead_time_days < 0 or review_days < 0:
+            raise ServiceError("Lead time y período de revisión no pueden ser negativos")
+        z = NormalDist().inv_cdf(service_level)
+        safety = z * std * math.sqrt(lead_time_days)
+        reorder_point = forecast * lead_time_days + safety
+        target = forecast * (lead_time_days + review_days) + safety
+        need = np.where(stock <= reorder_point, np.ceil(np.maximum(target - stock, 0)), 0)
+        pack = np.where(pack > 1, pack, 1)
+        suggested = (np.ceil(need / pack) * pack).astype(np.int64)
+        return {"safety_stock": safety, "reorder_point": reorder_point, "suggested": suggested}
+
+    # ------------------------------------------------------------
+    # Corrida
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _products(session: Session, tenant_id: int) -> pd.DataFrame:
+        rows = session.exec(
+            select(Product.id, Product.stock_quantity, Product.cant_bulto, Product.cost_price, Product.min_stock_level)
+            .where(Product.tenant_id == tenant_id)
+        ).all()
+        return pd.DataFrame(
+            rows, columns=["product_id", "stock_quantity", "cant_bulto", "cost_price", "min_stock_level"]
+        ).set_index("product_id")
+
+    @staticmethod
+    def _last_purchases(session: Session, tenant_id: int) -> pd.DataFrame:
+        """Proveedor y costo de la última compra de cada producto."""
+        rows = session.exec(
+            select(PurchaseItem.product_id, Purchase.supplier_id, PurchaseItem.unit_cost)
+            .join(Purchase, Purchase.id == PurchaseItem.purchase_id)
+            .where(Purchase.tenant_id == tenant_id, PurchaseItem.product_id.is_not(None))
+            .order_by(Purchase.timestamp, PurchaseItem.id)
+        ).all()
+        frame = pd.DataFrame(rows, columns=["product_id", "supplier_id", "unit_cost"])
+        return frame.drop_duplicates("product_id", keep="last").set_index("product_id")
+
+    @staticmethod
+    def run(
+        session: Session,
+        tenant_id: int,
+        method: str = "ses",
+        history_days: int = 365,
+        window: int = 28,
+        alpha: float = 0.2,
+        lead_time_days: int = 7,
+        review_days: int = 7,
+        service_level: float = 0.95,
+        update_min_stock: bool = False,
+    ) -> dict:
+        """
+        Pronostica y reemplaza las sugerencias del tenant. Con update_min_stock
+        también lleva min_stock_level al punto de pedido. Una transacción.
+        """
+        if history_days < 7:
+            raise ServiceError("Se necesitan al menos 7 días de historial")
+        if history_days > MAX_HISTORY_DAYS:
+            raise ServiceError(f"El historial no puede superar {MAX_HISTORY_DAYS} días")
+        started = time.monotonic()
+        today = time_windows.local_today(time_windows.tenant_zone(session, tenant_id))
+        last = today - timedelta(days=1)
+        first = last - timedelta(days=history_days - 1)
+
+        product_ids, matrix = ForecastService.demand_matrix(session, tenant_id, first, last)
+        products = ForecastService._products(session, tenant_id)
+        # Productos borrados después de vender: fuera
+        keep = np.isin(product_ids, products.index.to_numpy())
+        product_ids, matrix = product_ids[keep], matrix[keep]
+
+        forecast, std = ForecastService.forecast(matrix, method, window, alpha)
+        catalog = products.reindex(product_ids)
+        stock = catalog["stock_quantity"].fillna(0).to_numpy(dtype=np.float64)
+        pack = catalog["cant_bulto"].fillna(1).to_numpy(dtype=np.float64)
+        points = ForecastService.reorder_points(
+            forecast, std, stock, pack, lead_time_days, review_days, service_level
+        )
+
+        purchases = ForecastService._last_purchases(session, tenant_id).reindex(product_ids)
+        unit_cost = purchases["unit_cost"].fillna(catalog["cost_price"]).fillna(0.0).to_numpy(dtype=np.float64)
+        supplier_ids = purchases["supplier_id"]
+
+        now = datetime.now(timezone.utc)
+        conn = session.connection()
+        conn.execute(delete(ReorderSuggestion.__table__).where(ReorderSuggestion.tenant_id == tenant_id))
+        rows = [
+            {
+                "tenant_id": tenant_id, "product_id": int(pid),
+                "supplier_id": None if pd.isna(sid) else int(sid),
+                "generated_for": today, "method": method,
+                "forecast_daily": float(f), "demand_std": float(s), "lead_time_days": lead_time_days,
+                "safety_stock": float(ss), "reorder_point": float(rop),
+                "stock_quantity": int(q), "suggested_quantity": int(sq), "unit_cost": float(c),
+                "created_at": now,
+            }
+            for pid, sid, f, s, ss, rop, q, sq, c in zip(
+                product_ids, supplier_ids, forecast, std, points["safety_stock"], points["reorder_point"],
+                stock, points["suggested"], unit_cost,
+            )
+        ]
+        if rows:
+            conn.execute(insert(ReorderSuggestion.__table__), rows)
+
+        min_stock_updated = 0
+        if update_min_stock and len(product_ids):
+            new_min = np.ceil(points["reorder_point"]).astype(np.int64)
+            changed = new_min != catalog["min_stock_level"].fillna(-1).to_numpy(dtype=np.int64)
+            if changed.any():
+                table = Product.__table__
+                conn.execute(
+                    update(table)
+                    .where(table.c.id == bindparam("p_id"), table.c.tenant_id == tenant_id)
+                    .values(min_stock_level=bindparam("p_min")),
+                    [{"p_id": int(pid), "p_min": int(level)} for pid, level in zip(product_ids[changed], new_min[changed])],
+                )
+                min_stock_updated = int(changed.sum())
+        session.commit()
+
+        return {
+            "day": today,
+            "method": method,
+            "products": len(product_ids),
+            "to_reorder": int((points["suggested"] > 0).sum()),
+            "min_stock_updated": min_stock_updated,
+            "seconds": round(time.monotonic() - started, 3),
+        }
+
+    @staticmethod
+    def run_if_due(session: Session, tenant_id: int, **options) -> Optional[dict]:
+        """Job diario: corre si el tenant todavía no tiene sugerencias de hoy."""
+        today = time_windows.local_today(time_windows.tenant_zone(session, tenant_id))
+        done = session.exec(
+            select(ReorderSuggestion.id)
+            .where(ReorderSuggestion.tenant_id == tenant_id, ReorderSuggestion.generated_for == today)
+            .limit(1)
+        ).first()
+        if done is not None:
+            return None
+        return ForecastService.run(session, tenant_id, **options)
+
+    # ------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def suggestions_by_supplier(session: Session, tenant_id: int) -> list:
+        """Sugerencias de la última corrida con cantidad a pedir, agrupadas por proveedor."""
+        rows = session.exec(
+            select(ReorderSuggestion, Product.name, Product.item_number, Supplier.name)
+            .join(Product, Product.id == ReorderSuggestion.product_id)
+            .outerjoin(Supplier, Supplier.id == ReorderSuggestion.supplier_id)
+            .where(ReorderSuggestion.tenant_id == tenant_id, ReorderSuggestion.suggested_quantity > 0)
+            .order_by(Supplier.name, Product.name)
+        ).all()
+        groups = {}
+        for suggestion, product_name, item_number, supplier_name in rows:
+            group = groups.setdefault(suggestion.supplier_id, {
+                "supplier_id": suggestion.supplier_id,
+                "supplier_name": supplier_name or "Sin proveedor",
+                "items": [],
+                "estimated_cost": 0.0,
+            })
+            cost = suggestion.suggested_quantity * suggestion.unit_cost
+            group["items"].append({
+                "product_id": suggestion.product_id,
+                "product_name": product_name,
+                "item_number": item_number,
+                "stock_quantity": suggestion.stock_quantity,
+                "forecast_daily": round(suggestion.forecast_daily, 3),
+                "reorder_point": round(suggestion.reorder_point, 2),
+                "safety_stock": round(suggestion.safety_stock, 2),
+                "suggested_quantity": suggestion.suggested_quantity,
+                "unit_cost": suggestion.unit_cost,
+                "estimated_cost": round(cost, 2),
+                "generated_for": suggestion.generated_for.isoformat(),
+            })
+            group["estimated_cost"] = round(group["estimated_cost"] + cost, 2)
+        return list(groups.values())
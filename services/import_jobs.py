@@ -0,0 +1,447 @@
+"""
+services/import_jobs.py
+=======================
+Importaciones en segundo plano: el archivo se guarda en disco, un worker lo
+procesa por chunks y cada chunk se confirma junto con el progreso del job.
+
+Así un archivo grande no depende del timeout del request, el progreso es
+consultable, se puede cancelar entre chunks y, si el proceso se cae o el job
+falla, se reanuda desde el chunk siguiente al último confirmado.
+
+El libro de cuentas corrientes (kind "client_ledger") no va por chunks: se lee
+hoja por hoja informando progreso y se escribe en una sola transacción.
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+from openpyxl import load_workbook
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from database.models import ImportJob
+from services.client_ledger_import import import_ledger
+from services.errors import ServiceError
+from services.import_service import ClientImportService, ProductImportService, read_csv_chunks
+
+logger = logging.getLogger(__name__)
+
+IMPORT_DIR = Path(os.getenv("IMPORT_UPLOAD_DIR", "imports"))
+DEFAULT_CHUNK_SIZE = 2000
+MAX_STORED_ERRORS = 500
+HEARTBEAT_STALE = timedelta(minutes=2)
+HEARTBEAT_INTERVAL = HEARTBEAT_STALE.total_seconds() / 4
+_COPY_BUFFER = 1024 * 1024
+
+JOB_KINDS = ("products", "products_simple", "clients", "client_ledger")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _utcnow_naive() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def save_upload(fileobj, filename: str) -> str:
+    """Copia el upload a disco en bloques (no se carga entero en memoria)."""
+    IMPORT_DIR.mkdir(parents=True, exist_ok=True)
+    ext = Path(filename or "").suffix.lower() or ".xlsx"
+    path = IMPORT_DIR / f"{uuid.uuid4().hex}{ext}"
+    with path.open("wb") as out:
+        shutil.copyfileobj(fileobj, out, _COPY_BUFFER)
+    return str(path)
+
+
+def create_job(
+    session: Session,
+    tenant_id: int,
+    user_id: Optional[int],
+    kind: str,
+    fileobj,
+    filename: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> ImportJob:
+    if kind not in JOB_KINDS:
+        raise ServiceError(f"Tipo de importación inválido: {kind}")
+    job = ImportJob(
+        tenant_id=tenant_id,
+        user_id=user_id,
+        kind=kind,
+        filename=filename or "archivo",
+        file_path=save_upload(fileobj, filename),
+        chunk_size=chunk_size,
+    )
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def job_dict(job: ImportJob) -> dict:
+    progress = None
+    if job.total_rows:
+        progress = round(min(job.processed_rows / job.total_rows, 1.0), 4)
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "filename": job.filename,
+        "status": job.status,
+        "cancel_requested": job.cancel_requested,
+        "total_rows": job.total_rows,
+        "processed_rows": job.processed_rows,
+        "progress": progress,
+        "last_chunk": job.last_chunk,
+        "added": job.added,
+        "updated": job.updated,
+        "error_count": job.error_count,
+        "errors": json.loads(job.errors_json) if job.errors_json else [],
+        "message": job.message,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+# ------------------------------------------------------------
+# Lectura por chunks
+# ------------------------------------------------------------
+
+def _is_csv(path: str) -> bool:
+    return Path(path).suffix.lower() == ".csv"
+
+
+def _excel_rows(path: str) -> int:
+    """
+    Filas de datos de la primera hoja según su dimensión (openpyxl read_only, sin
+    leer celdas): la planilla se parsea una sola vez, en iter_chunks. Puede contar
+    filas vacías al final; el progreso se recorta en 100%.
+    """
+    if Path(path).suffix.lower() == ".xls":
+        return len(pd.read_excel(path))  # formato viejo: sin dimensión barata
+    workbook = load_workbook(path, read_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.max_row
+        if rows is None:
+            # Sin <dimension> en el archivo: se recorren las filas sin armar el DataFrame
+            rows = sum(1 for _ in sheet.iter_rows(values_only=True))
+        return max(rows - 1, 0)
+    finally:
+        workbook.close()
+
+
+def count_rows(path: str) -> int:
+    """Filas de datos del archivo. En CSV cuenta saltos de línea por bloques (sin parsear)."""
+    if not _is_csv(path):
+        return _excel_rows(path)
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as fh:
+        while block := fh.read(_COPY_BUFFER):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def _excel_headers(header: tuple) -> list:
+    """Nombres de columna como los arma pd.read_excel (vacías -> "Unnamed: i", repetidas -> ".1")."""
+    names = []
+    seen = {}
+    for i, value in enumerate(header):
+        name = f"Unnamed: {i}" if value is None or value == "" else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _excel_chunks(path: str, chunk_size: int):
+    """
+    DataFrames de `chunk_size` filas leídos en streaming (openpyxl read_only +
+    iter_rows): la memoria queda acotada al chunk. Las filas vacías intermedias
+    se conservan (la numeración sigue a la planilla); las del final se descartan.
+    """
+    if Path(path).suffix.lower() == ".xls":
+        df = pd.read_excel(path)  # formato viejo: openpyxl no lo lee
+        yield from (df.iloc[i:i + chunk_size] for i in range(0, len(df), chunk_size))
+        return
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            return
+        columns = _excel_headers(header)
+        width = len(columns)
+        batch = []
+        blanks = []
+        for row in rows:
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+            if all(v is None or v == "" for v in row):
+                blanks.append(row)
+                continue
+            batch.extend(blanks)
+            blanks = []
+            batch.append(row)
+            while len(batch) >= chunk_size:
+                yield pd.DataFrame(batch[:chunk_size], columns=columns)
+                batch = batch[chunk_size:]
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+def iter_chunks(path: str, chunk_size: int):
+    """Genera (índice, DataFrame, fila inicial en la planilla). Fila 1 = encabezados."""
+    frames = read_csv_chunks(path, chunk_size) if _is_csv(path) else _excel_chunks(path, chunk_size)
+    for index, frame in enumerate(frames):
+        yield index, frame, index * chunk_size + 2
+
+
+# ------------------------------------------------------------
+# Ejecución
+# ------------------------------------------------------------
+
+def _processor(session: Session, job: ImportJob):
+    """Función que importa un chunk sin confirmar (el commit lo hace run_job)."""
+    if job.kind == "clients":
+        client_keys = ClientImportService.load_keys(session, job.tenant_id)
+        return lambda df, offset: ClientImportService.import_frame(
+            session, job.tenant_id, df.reset_index(drop=True), offset, commit=False, keys=client_keys
+        )
+    match_on = ("barcode", "name") if job.kind == "products_simple" else ("barcode", "item_number")
+    keys = ProductImportService.load_keys(session, job.tenant_id)
+    return lambda df, offset: ProductImportService.import_frame(
+        session, job.tenant_id, df, keys, match_on, job.user_id, offset, commit=False
+    )
+
+
+def _run_chunks(session: Session, job: ImportJob) -> None:
+    """Importa el archivo chunk por chunk; cada chunk se confirma junto con el progreso."""
+    if job.total_rows is None:
+        job.total_rows = count_rows(job.file_path)
+        session.add(job)
+        session.commit()
+    process = _processor(session, job)
+    errors = json.loads(job.errors_json) if job.errors_json else []
+
+    for index, df, offset in iter_chunks(job.file_path, job.chunk_size):
+        if index <= job.last_chunk:
+            continue
+        session.refresh(job, ["cancel_requested"])
+        if job.cancel_requested:
+            job.status = "cancelled"
+            job.finished_at = _utcnow_naive()
+            session.add(job)
+            session.commit()
+            return
+
+        result = process(df, offset)
+        job.processed_rows += len(df)
+        job.last_chunk = index
+        job.added += result["added"]
+        job.updated += result["updated"]
+        job.error_count += len(result["errors"])
+        if len(errors) < MAX_STORED_ERRORS:
+            errors.extend(result["errors"][:MAX_STORED_ERRORS - len(errors)])
+            job.errors_json = json.dumps(errors, ensure_ascii=False)
+        job.heartbeat_at = _utcnow_naive()
+        session.add(job)
+        session.commit()   # datos del chunk + progreso, juntos
+
+
+def _run_client_ledger(session: Session, job: ImportJob) -> None:
+    """
+    Libro de cuentas corrientes: el progreso (hojas leídas / total) se confirma
+    durante la lectura; los datos se escriben al final, sin commit (lo hace run_job
+    junto con el estado final).
+    """
+    def progress(done: int, total: int) -> None:
+        job.total_rows, job.processed_rows = total, done
+        job.heartbeat_at = _utcnow_naive()
+        session.add(job)
+        session.commit()
+
+    result = import_ledger(session, job.tenant_id, job.file_path, job.user_id, progress=progress, commit=False)
+    job.added, job.updated = result["added"], result["updated"]
+    job.error_count = len(result["errors"])
+    job.errors_json = json.dumps(result["errors"][:MAX_STORED_ERRORS], ensure_ascii=False)
+
+
+class _Heartbeat:
+    """
+    Mantiene heartbeat_at al día desde un hilo propio mientras el job corre: un
+    chunk más lento que HEARTBEAT_STALE no hace que resume_pending (en otro
+    worker) re-encole un job vivo. Transacciones cortas en su propia conexión.
+    """
+
+    def __init__(self, engine, job_id: int, interval: Optional[float] = None):
+        self.engine = engine
+        self.job_id = job_id
+        self.interval = HEARTBEAT_INTERVAL if interval is None else interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, name=f"import-heartbeat-{job_id}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _beat(self) -> None:
+        table = ImportJob.__table__
+        while not self._stop.wait(self.interval):
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(
+                        update(table)
+                        .where(table.c.id == self.job_id, table.c.status == "running")
+                        .values(heartbeat_at=_utcnow_naive())
+                    )
+            except Exception:
+                logger.warning("Heartbeat failed for import job %s", self.job_id, exc_info=True)
+
+
+def run_job(job_id: int, engine=None) -> Optional[str]:
+    """
+    Procesa el job si está en cola (claim condicional: un solo worker lo toma).
+    Retorna el estado final, o None si otro worker ya lo tenía.
+    """
+    if engine is None:
+        from database.session import engine
+
+    with Session(engine) as session:
+        table = ImportJob.__table__
+        now = _utcnow_naive()
+        claimed = session.connection().execute(
+            update(table)
+            .where(table.c.id == job_id, table.c.status == "queued")
+            .values(status="running", heartbeat_at=now, started_at=now, finished_at=None)
+        )
+        session.commit()
+        if claimed.rowcount != 1:
+            return None
+
+        job = session.get(ImportJob, job_id)
+        try:
+            with _Heartbeat(engine, job_id):
+                if job.kind == "client_ledger":
+                    _run_client_ledger(session, job)
+                else:
+                    _run_chunks(session, job)
+            if job.status == "cancelled":
+                return job.status
+
+            job.status = "completed"
+            job.finished_at = _utcnow_naive()
+            session.add(job)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.exception("Import job %s failed", job_id)
+            job = session.get(ImportJob, job_id)
+            job.status = "failed"
+            job.message = str(e)[:500]
+            job.finished_at = _utcnow_naive()
+            session.add(job)
+            session.commit()
+            return job.status
+
+        try:
+            os.remove(job.file_path)
+        except OSError:
+            pass
+        return job.status
+
+
+def submit(job_id: int) -> None:
+    """Encola el job en el worker del proceso."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("IMPORT_WORKERS", "1")), thread_name_prefix="import-job"
+        )
+    _executor.submit(run_job, job_id)
+
+
+def shutdown() -> None:
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+
+
+def request_cancel(session: Session, tenant_id: int, job_id: int) -> ImportJob:
+    """En cola: se cancela ya. Corriendo: se marca y el worker corta antes del próximo chunk."""
+    job = session.get(ImportJob, job_id)
+    if not job or job.tenant_id != tenant_id:
+        raise ServiceError("Importación no encontrada", 404)
+    table = ImportJob.__table__
+    session.connection().execute(
+        update(table).where(table.c.id == job_id, table.c.status == "queued")
+        .values(status="cancelled", finished_at=_utcnow_naive())
+    )
+    session.connection().execute(
+        update(table).where(table.c.id == job_id, table.c.status == "running").values(cancel_requested=True)
+    )
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def resume(session: Session, tenant_id: int, job_id: int) -> ImportJob:
+    """Vuelve a encolar un job fallido o cancelado; sigue desde el último chunk confirmado."""
+    job = session.get(ImportJob, job_id)
+    if not job or job.tenant_id != tenant_id:
+        raise ServiceError("Importación no encontrada", 404)
+    if not os.path.exists(job.file_path):
+        raise ServiceError("El archivo de la importación ya no está disponible", 409)
+    table = ImportJob.__table__
+    result = session.connection().execute(
+        update(table)
+        .where(table.c.id == job_id, table.c.status.in_(["failed", "cancelled"]))
+        .values(status="queued", cancel_requested=False, message=None)
+    )
+    session.commit()
+    if result.rowcount != 1:
+        raise ServiceError("Solo se puede reanudar una importación fallida o cancelada", 409)
+    session.refresh(job)
+    submit(job.id)
+    return job
+
+
+def resume_pending(engine=None) -> list:
+    """
+    Al iniciar: re-encola los jobs que quedaron corriendo sin heartbeat reciente
+    (proceso reiniciado) y despacha todos los que están en cola.
+    """
+    if engine is None:
+        from database.session import engine
+
+    with Session(engine) as session:
+        table = ImportJob.__table__
+        session.connection().execute(
+            update(table)
+            .where(table.c.status == "running", table.c.heartbeat_at < _utcnow_naive() - HEARTBEAT_STALE)
+            .values(status="queued")
+        )
+        session.commit()
+        job_ids = session.exec(select(ImportJob.id).where(ImportJob.status == "queued").order_by(ImportJob.id)).all()
+    for job_id in job_ids:
+        submit(job_id)
+    return job_ids
@@ -0,0 +1,638 @@
+"""
+services/import_service.py
+==========================
+Importación masiva de productos y clientes desde Excel/CSV.
+
+Todo el trabajo por fila es vectorizado con pandas: normalización de
+columnas (con alias en castellano), limpieza de texto y números, y el cruce
+contra los productos existentes, que se cargan con una sola consulta. Las
+filas se separan en altas y modificaciones y se aplican en bulk:
+
+  - modificaciones: UPDATE executemany por id (celdas vacías no pisan valores),
+  - altas: INSERT ... ON CONFLICT (barcode) DO UPDATE, acotado al tenant.
+
+Los errores se informan por fila sin abortar el resto del archivo. El stock
+importado se registra en el ledger con motivo "importacion".
+"""
+
+import codecs
+import csv
+import io
+import unicodedata
+import uuid
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, func, insert, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from database.models import Client, Product
+from services import product_index, report_cache, stock_ledger
+
+# Encabezado normalizado (minúsculas, sin acentos ni separadores) -> columna de Product
+PRODUCT_COLUMN_ALIASES = {
+    "name": "name", "nombre": "name", "producto": "name", "descripcioncorta": "name",
+    "barcode": "barcode", "codigo": "barcode", "codigodebarras": "barcode", "ean": "barcode",
+    "itemnumber": "item_number", "articulo": "item_number", "codigodearticulo": "item_number", "sku": "item_number",
+    "price": "price", "precio": "price", "preciounitario": "price", "preciolista": "price",
+    "pricebulk": "price_bulk", "preciobulto": "price_bulk", "precioporbulto": "price_bulk",
+    "priceretail": "price_retail", "preciomayorista": "price_retail",
+    "cost": "cost_price", "costprice": "cost_price", "costo": "cost_price",
+    "stock": "stock_quantity", "stockquantity": "stock_quantity", "cantidad": "stock_quantity",
+    "category": "category", "categoria": "category", "rubro": "category",
+    "description": "description", "descripcion": "description",
+    "numeracion": "numeracion", "talles": "numeracion",
+    "cantbulto": "cant_bulto", "unidadesporbulto": "cant_bulto",
+}
+TEXT_COLUMNS = ("name", "barcode", "item_number", "category", "description", "numeracion")
+INT_COLUMNS = ("stock_quantity", "cant_bulto")
+
+_TEMP_BARCODE = "TMP-"
+_ID_CHUNK = 5000
+CSV_CHUNK_ROWS = 5000
+MAX_REPORTED_ERRORS = 500
+_SNIFF_BYTES = 64 * 1024
+
+
+def normalize_header(value) -> str:
+    text = unicodedata.normalize("NFKD", str(value)).encode("ascii", "ignore").decode()
+    return "".join(ch for ch in text.lower() if ch.isalnum())
+
+
+def clean_text(series: pd.Series) -> pd.Series:
+    """Texto sin espacios sobrantes; vacío / 'nan' / 'None' pasan a NA. Enteros de Excel sin '.0'."""
+    if pd.api.types.is_float_dtype(series) and series.dropna().mod(1).eq(0).all():
+        series = series.astype("Int64")
+    cleaned = series.astype("string").str.strip()
+    return cleaned.mask(cleaned.isin(["", "nan", "NaN", "None", "<NA>"]))
+
+
+def parse_numbers(series: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """
+    Números con coma o punto decimal ("1234,5" -> 1234.5). Retorna (valores, inválidos):
+    inválido = la celda tenía algo pero no es un número.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float), pd.Series(False, index=series.index)
+    text = clean_text(series)
+    no_dot = ~text.str.contains(".", regex=False, na=False)
+    text = text.where(~no_dot, text.str.replace(",", ".", regex=False))
+    values = pd.to_numeric(text, errors="coerce")
+    return values, text.notna() & values.isna()
+
+
+def _latin1_fallback(error: UnicodeDecodeError) -> tuple[str, int]:
+    # Byte suelto no utf-8 más allá del bloque muestreado: se lee como latin-1
+    return error.object[error.start:error.end].decode("latin-1"), error.end
+
+
+codecs.register_error("latin1_fallback", _latin1_fallback)
+
+
+def sniff_csv(fileobj) -> tuple[str, str]:
+    """
+    Separador y encoding de un CSV mirando solo el comienzo del archivo
+    (listas de proveedores suelen venir con ';' y en latin-1). Deja el puntero al inicio.
+    """
+    head = fileobj.read(_SNIFF_BYTES)
+    fileobj.seek(0)
+    try:
+        text = head.decode("utf-8-sig")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as e:
+        # Un multibyte cortado al final del bloque no descarta utf-8
+        if e.start >= len(head) - 3:
+            text, encoding = head[:e.start].decode("utf-8-sig"), "utf-8-sig"
+        else:
+            text, encoding = head.decode("latin-1"), "latin-1"
+    try:
+        sep = csv.Sniffer().sniff(text.split("\n", 1)[0], delimiters=",;\t|").delimiter
+    except csv.Error:
+        sep = ","
+    return sep, encoding
+
+
+def read_csv_chunks(source, chunk_size: int = CSV_CHUNK_ROWS):
+    """
+    Lector incremental: pandas parsea de a `chunk_size` filas desde el archivo
+    (ruta o file object binario), sin materializarlo. Todo como texto para no
+    perder ceros a la izquierda de los códigos. El encoding sale de la muestra
+    inicial; si después aparece un byte latin-1 en un archivo utf-8, ese byte
+    se lee como latin-1 en vez de cortar la importación a mitad de camino.
+    """
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        with open(source, "rb") as fh:
+            yield from read_csv_chunks(fh, chunk_size)
+        return
+    sep, encoding = sniff_csv(source)
+    yield from pd.read_csv(
+        source, sep=sep, encoding=encoding, encoding_errors="latin1_fallback", dtype=str, chunksize=chunk_size
+    )
+
+
+def _insert_for(session: Session):
+    return pg_insert if session.get_bind().dialect.name == "postgresql" else sqlite_insert
+
+
+class ProductImportService:
+    """Importación de productos vectorizada con upsert en bulk."""
+
+    @staticmethod
+    def normalize(df: pd.DataFrame, row_offset: int = 0) -> tuple[pd.DataFrame, list]:
+        """
+        Lleva el DataFrame a columnas de Product. Retorna (frame, errores).
+        `frame` conserva `_row` (número de fila del archivo) para los reportes.
+        """
+        renamed = {}
+        for column in df.columns:
+            target = PRODUCT_COLUMN_ALIASES.get(normalize_header(column))
+            if target and target not in renamed.values():
+                renamed[column] = target
+        frame = pd.DataFrame({"_row": np.arange(len(df)) + row_offset}, index=df.index)
+        invalid = pd.Series("", index=df.index)
+
+        for column, target in renamed.items():
+            series = df[column]
+            if target in TEXT_COLUMNS:
+                frame[target] = clean_text(series)
+                continue
+            values, bad = parse_numbers(series)
+            if target in INT_COLUMNS:
+                values = np.floor(values).astype("Int64")
+            frame[target] = values
+            invalid = invalid.mask(bad & (invalid == ""), f"valor inválido en {target}")
+            negative = values.lt(0).fillna(False).astype(bool)
+            invalid = invalid.mask(negative & (invalid == ""), f"{target} negativo")
+
+        if "name" not in frame:
+            frame["name"] = pd.Series(pd.NA, index=df.index, dtype="string")
+        errors = []
+        missing_name = frame["name"].isna()
+        for row in frame.loc[missing_name & (invalid == ""), "_row"]:
+            errors.append({"row": int(row), "error": "sin nombre"})
+        for row, message in zip(frame.loc[invalid != "", "_row"], invalid[invalid != ""]):
+            errors.append({"row": int(row), "error": message})
+        keep = ~missing_name & (invalid == "")
+        return frame[keep].reset_index(drop=True), errors
+
+    @staticmethod
+    def load_keys(session: Session, tenant_id: int) -> dict:
+        """Mapas barcode / item_number / nombre -> id del tenant, en una consulta."""
+        rows = session.exec(
+            select(Product.id, Product.barcode, Product.item_number, Product.name)
+            .where(Product.tenant_id == tenant_id)
+            .order_by(Product.id)
+        ).all()
+        keys = {"barcode": {}, "item_number": {}, "name": {}}
+        for product_id, barcode, item_number, name in rows:
+            ProductImportService._remember(keys, product_id, barcode, item_number, name)
+        return keys
+
+    @staticmethod
+    def _remember(keys: dict, product_id: int, barcode, item_number, name) -> None:
+        # Ante duplicados gana el id más bajo, como la búsqueda .first() previa
+        if barcode:
+            keys["barcode"].setdefault(barcode, product_id)
+        if item_number:
+            keys["item_number"].setdefault(item_number, product_id)
+        if name:
+            keys["name"].setdefault(name, product_id)
+
+    @staticmethod
+    def _foreign_barcodes(session: Session, tenant_id: int, barcodes: list) -> set:
+        """El barcode es único global: detecta los que ya usa otro tenant."""
+        taken = set()
+        for i in range(0, len(barcodes), _ID_CHUNK):
+            taken.update(session.exec(
+                select(Product.barcode).where(
+                    Product.barcode.in_(barcodes[i:i + _ID_CHUNK]), Product.tenant_id != tenant_id
+                )
+            ).all())
+        return taken
+
+    @staticmethod
+    def _drop_barcode_clashes(session: Session, tenant_id: int, frame: pd.DataFrame, keys: dict, errors: list) -> pd.DataFrame:
+        """
+        Descarta (y reporta) las filas cuyo código violaría el índice único
+        global: repetido en otra fila del archivo, usado por otro producto del
+        tenant (actualización que cambia el código) o por otra empresa.
+        """
+        barcode = frame["barcode"]
+        has_code = barcode.notna()
+        reasons = pd.Series("", index=frame.index)
+
+        repeated = (has_code & barcode.duplicated(keep="last")).fillna(False).astype(bool)
+        reasons = reasons.mask(repeated, "el código {} está repetido en otra fila del archivo")
+
+        owner = barcode.map(keys["barcode"]).astype("Float64").astype("Int64")
+        taken = (frame["_id"].notna() & owner.notna() & (owner != frame["_id"])).fillna(False).astype(bool)
+        reasons = reasons.mask(taken & (reasons == ""), "el código {} ya lo usa otro producto")
+
+        foreign = ProductImportService._foreign_barcodes(
+            session, tenant_id, barcode[has_code & (reasons == "")].unique().tolist()
+        )
+        if foreign:
+            other_tenant = barcode.isin(foreign).fillna(False).astype(bool)
+            reasons = reasons.mask(other_tenant & (reasons == ""), "el código {} ya existe en otra empresa")
+
+        clash = reasons != ""
+        for row, code, reason in zip(frame.loc[clash, "_row"], barcode[clash], reasons[clash]):
+            errors.append({"row": int(row), "error": reason.format(code)})
+        return frame[~clash]
+
+    @staticmethod
+    def import_frame(
+        session: Session,
+        tenant_id: int,
+        df: pd.DataFrame,
+        keys: Optional[dict] = None,
+        match_on: tuple = ("barcode", "item_number"),
+        user_id: Optional[int] = None,
+        row_offset: int = 0,
+        commit: bool = True,
+    ) -> dict:
+        """
+        Importa un DataFrame (o un chunk: `keys` se reutiliza y se actualiza con
+        las altas, `row_offset` numera las filas). Confirma al final salvo
+        commit=False (el llamador confirma junto con su propio progreso).
+        `match_on`: columnas por las que se busca el producto existente, en orden.
+        El nombre solo se usa en filas sin código: un código nuevo es un producto
+        nuevo aunque repita el nombre de otro.
+        """
+        if keys is None:
+            keys = ProductImportService.load_keys(session, tenant_id)
+        frame, errors = ProductImportService.normalize(df, row_offset)
+
+        # Cruce vectorizado: el primer criterio que encuentra producto gana
+        matched = pd.Series(pd.NA, index=frame.index, dtype="Int64")
+        for column in match_on:
+            if column in frame:
+                hit = frame[column].map(keys[column]).astype("Float64").astype("Int64")
+                if column == "name" and "barcode" in frame:
+                    hit = hit.where(frame["barcode"].isna())
+                matched = matched.fillna(hit)
+        frame["_id"] = matched
+
+        # Duplicados dentro del archivo: queda la última fila de cada producto
+        target = frame["_id"].astype("string")
+        for column in match_on:
+            if column in frame:
+                target = target.fillna(column + ":" + frame[column])
+        target = target.fillna("row:" + frame["_row"].astype("string"))
+        duplicated = target.duplicated(keep="last")
+        for row in frame.loc[duplicated, "_row"]:
+            errors.append({"row": int(row), "error": "fila duplicada en el archivo (se usa la última)"})
+        frame = frame[~duplicated]
+
+        if "barcode" in frame and not frame.empty:
+            frame = ProductImportService._drop_barcode_clashes(session, tenant_id, frame, keys, errors)
+
+        updates = frame[frame["_id"].notna()]
+        inserts = frame[frame["_id"].isna()]
+
+        columns = [c for c in frame.columns if not c.startswith("_")]
+        stock_ledger_rows = []
+        updated = ProductImportService._apply_updates(session, tenant_id, updates, columns, user_id, stock_ledger_rows)
+        added = ProductImportService._apply_inserts(session, tenant_id, inserts, columns, keys, user_id, stock_ledger_rows)
+
+        if "barcode" in updates:
+            # Los chunks siguientes deben ver el código nuevo de cada producto actualizado
+            for product_id, barcode in zip(updates["_id"], updates["barcode"]):
+                if not pd.isna(barcode):
+                    keys["barcode"][barcode] = int(product_id)
+
+        stock_ledger.record(session, stock_ledger_rows)
+        if commit:
+            session.commit()
+        product_index.invalidate(tenant_id)
+
+        errors.sort(key=lambda e: e["row"])
+        return {"added": added, "updated": updated, "errors": errors}
+
+    @staticmethod
+    def import_csv_stream(
+        session: Session,
+        tenant_id: int,
+        source,
+        match_on: tuple = ("barcode", "item_number"),
+        user_id: Optional[int] = None,
+        chunk_size: int = CSV_CHUNK_ROWS,
+    ) -> dict:
+        """
+        Importa un CSV de cualquier tamaño con memoria acotada: parsea y confirma
+        chunk por chunk. Los mapas de claves se cargan una vez y se actualizan
+        con las altas de cada chunk. Se informan los primeros errores y el total.
+        Si el archivo se vuelve ilegible después de confirmar algún chunk, se
+        retorna lo importado con `partial` y `message` en lugar de fallar.
+        """
+        keys = ProductImportService.load_keys(session, tenant_id)
+        totals = {
+            "added": 0, "updated": 0, "rows": 0, "error_count": 0, "errors": [],
+            "partial": False, "message": None,
+        }
+        try:
+            for index, chunk in enumerate(read_csv_chunks(source, chunk_size)):
+                result = ProductImportService.import_frame(
+                    session, tenant_id, chunk, keys, match_on, user_id, row_offset=index * chunk_size + 2
+                )
+                totals["added"] += result["added"]
+                totals["updated"] += result["updated"]
+                totals["rows"] += len(chunk)
+                totals["error_count"] += len(result["errors"])
+                room = MAX_REPORTED_ERRORS - len(totals["errors"])
+                if room > 0:
+                    totals["errors"].extend(result["errors"][:room])
+        except (pd.errors.ParserError, UnicodeDecodeError) as e:
+            if not totals["rows"]:
+                raise
+            # Los chunks anteriores ya están confirmados: se informa la importación parcial
+            totals["partial"] = True
+            totals["message"] = f"Lectura interrumpida a partir de la fila {totals['rows'] + 2}: {e}"
+        return totals
+
+    @staticmethod
+    def _records(frame: pd.DataFrame, columns: list) -> list:
+        """Filas como dicts con None en lugar de NA (apto para executemany)."""
+        subset = frame[columns].astype(object)
+        return subset.where(subset.notna(), None).to_dict("records")
+
+    @staticmethod
+    def _apply_updates(session, tenant_id, updates, columns, user_id, ledger_rows) -> int:
+        if updates.empty:
+            return 0
+        ids = updates["_id"].astype(int).tolist()
+        records = ProductImportService._records(updates, columns)
+
+        if "stock_quantity" in columns:
+            # Lock + lectura del stock previo: el ledger registra el delta real
+            current = {}
+            for i in range(0, len(ids), _ID_CHUNK):
+                current.update(session.exec(
+                    select(Product.id, Product.stock_quantity)
+                    .where(Product.id.in_(sorted(ids[i:i + _ID_CHUNK])), Product.tenant_id == tenant_id)
+                    .order_by(Product.id)
+                    .with_for_update()
+                ).all())
+            for product_id, record in zip(ids, records):
+                new_stock = record["stock_quantity"]
+                if new_stock is not None and product_id in current:
+                    ledger_rows.append({
+                        "tenant_id": tenant_id, "product_id": product_id,
+                        "delta": int(new_stock) - (current[product_id] or 0),
+                        "reason": "importacion", "user_id": user_id,
+                    })
+
+        table = Product.__table__
+        params = [
+            {"u_id": product_id, **{f"u_{c}": record[c] for c in columns}}
+            for product_id, record in zip(ids, records)
+        ]
+        params.sort(key=lambda p: p["u_id"])
+        session.connection().execute(
+            update(table)
+            .where(table.c.id == bindparam("u_id"), table.c.tenant_id == tenant_id)
+            .values({c: func.coalesce(bindparam(f"u_{c}"), table.c[c]) for c in columns}),
+            params,
+        )
+        return len(params)
+
+    @staticmethod
+    def _apply_inserts(session, tenant_id, inserts, columns, keys, user_id, ledger_rows) -> int:
+        if inserts.empty:
+            return 0
+        rows = ProductImportService._records(inserts, columns)
+        generated = []
+        for row in rows:
+            row["tenant_id"] = tenant_id
+            for column in ("price", "cost_price"):
+                if row.get(column) is None:
+                    row[column] = 0.0
+            if row.get("stock_quantity") is None:
+                row["stock_quantity"] = 0
+            if not row.get("barcode"):
+                # Placeholder para el NOT NULL; luego se reemplaza por el id con ceros
+                row["barcode"] = f"{_TEMP_BARCODE}{uuid.uuid4().hex}"
+                generated.append(row["barcode"])
+        row_columns = sorted({k for row in rows for k in row})
+        rows = [{c: row.get(c) for c in row_columns} for row in rows]
+
+        insert = _insert_for(session)
+        stmt = insert(Product.__table__)
+        updatable = [c for c in row_columns if c not in ("tenant_id", "barcode")]
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["barcode"],
+            set_={c: stmt.excluded[c] for c in updatable},
+            where=Product.__table__.c.tenant_id == stmt.excluded.tenant_id,
+        )
+        session.connection().execute(stmt, rows)
+
+        # Ids de las altas (una consulta por lote de barcodes) para el ledger y los mapas
+        barcodes = [row["barcode"] for row in rows]
+        created = {}
+        for i in range(0, len(barcodes), _ID_CHUNK):
+            created.update({
+                barcode: (product_id, item_number, name, stock)
+                for product_id, barcode, item_number, name, stock in session.exec(
+                    select(Product.id, Product.barcode, Product.item_number, Product.name, Product.stock_quantity)
+                    .where(Product.barcode.in_(barcodes[i:i + _ID_CHUNK]), Product.tenant_id == tenant_id)
+                ).all()
+            })
+
+        if generated:
+            table = Product.__table__
+            session.connection().execute(
+                update(table).where(table.c.id == bindparam("g_id")).values(barcode=bindparam("g_barcode")),
+                [{"g_id": created[tmp][0], "g_barcode": str(created[tmp][0]).zfill(8)} for tmp in generated if tmp in created],
+            )
+        generated_set = set(generated)
+        for barcode, (product_id, item_number, name, stock) in created.items():
+            final_barcode = str(product_id).zfill(8) if barcode in generated_set else barcode
+            ProductImportService._remember(keys, product_id, final_barcode, item_number, name)
+            ledger_rows.append({
+                "tenant_id": tenant_id, "product_id": product_id, "delta": stock or 0,
+                "reason": "importacion", "user_id": user_id,
+            })
+        return len(rows)
+
+
+CLIENT_COLUMN_ALIASES = {
+    "name": "name", "nombre": "name", "cliente": "name",
+    "phone": "phone", "telefono": "phone", "tel": "phone", "celular": "phone",
+    "email": "email", "mail": "email", "correo": "email",
+    "address": "address", "direccion": "address", "domicilio": "address",
+    "razonsocial": "razon_social",
+    "cuit": "cuit", "cuil": "cuit", "cuitcuil": "cuit",
+    "ivacategory": "iva_category", "condicioniva": "iva_category", "categoriaiva": "iva_category", "iva": "iva_category",
+    "creditlimit": "credit_limit", "limitecredito": "credit_limit", "limitedecredito": "credit_limit",
+    "transportname": "transport_name", "transporte": "transport_name",
+    "transportaddress": "transport_address", "direcciontransporte": "transport_address",
+}
+
+
+def normalize_name(series: pd.Series) -> pd.Series:
+    """Clave de cruce de nombres: sin acentos, minúsculas y espacios simples."""
+    return (
+        series.astype("string")
+        .str.normalize("NFKD")
+        .str.encode("ascii", "ignore")
+        .str.decode("ascii")
+        .str.lower()
+        .str.split()
+        .str.join(" ")
+        .replace("", pd.NA)
+    )
+
+
+def normalize_cuit(series: pd.Series) -> pd.Series:
+    """Solo dígitos; una CUIT válida tiene 11 (otra cosa no sirve como clave)."""
+    digits = series.astype("string").str.replace(r"\D", "", regex=True)
+    return digits.where(digits.str.len() == 11)
+
+
+class ClientImportService:
+    """Importación de clientes vectorizada: cruce por CUIT y nombre normalizado, bulk insert/update."""
+
+    @staticmethod
+    def load_keys(session: Session, tenant_id: int) -> dict:
+        """Mapas CUIT -> id y nombre normalizado -> id del tenant, en una consulta."""
+        rows = session.exec(
+            select(Client.id, Client.name, Client.cuit).where(Client.tenant_id == tenant_id).order_by(Client.id)
+        ).all()
+        existing = pd.DataFrame(rows, columns=["id", "name", "cuit"])
+        keys = {"cuit": {}, "name": {}}
+        if existing.empty:
+            return keys
+        # Ante duplicados gana el id más bajo (drop_duplicates conserva el primero)
+        for column, normalize in (("cuit", normalize_cuit), ("name", normalize_name)):
+            normalized = pd.DataFrame({"key": normalize(existing[column]), "id": existing["id"]}).dropna()
+            keys[column] = dict(normalized.drop_duplicates("key").itertuples(index=False, name=None))
+        return keys
+
+    @staticmethod
+    def normalize(df: pd.DataFrame, row_offset: int = 0) -> tuple[pd.DataFrame, list]:
+        renamed = {}
+        for column in df.columns:
+            target = CLIENT_COLUMN_ALIASES.get(normalize_header(column))
+            if target and target not in renamed.values():
+                renamed[column] = target
+        frame = pd.DataFrame({"_row": np.arange(len(df)) + row_offset}, index=df.index)
+        for column, target in renamed.items():
+            if target == "credit_limit":
+                values, bad = parse_numbers(df[column])
+                frame[target] = values
+                frame["_bad_credit"] = bad
+            else:
+                frame[target] = clean_text(df[column])
+        if "name" not in frame:
+            frame["name"] = pd.Series(pd.NA, index=df.index, dtype="string")
+
+        errors = []
+        missing = frame["name"].isna()
+        bad = frame.pop("_bad_credit") if "_bad_credit" in frame else pd.Series(False, index=frame.index)
+        for row in frame.loc[bad & ~missing, "_row"]:
+            errors.append({"row": int(row), "action": "error", "error": "límite de crédito inválido"})
+        # Filas sin nombre se ignoran en silencio (renglones vacíos de la planilla)
+        return frame[~missing & ~bad].reset_index(drop=True), errors
+
+    @staticmethod
+    def import_frame(
+        session: Session,
+        tenant_id: int,
+        df: pd.DataFrame,
+        row_offset: int = 0,
+        commit: bool = True,
+        keys: Optional[dict] = None,
+        match_cuit: bool = True,
+    ) -> dict:
+        """
+        Importa clientes: existentes se actualizan (celdas vacías no pisan), el
+        resto se da de alta. El reporte tiene una entrada por fila del archivo.
+        """
+        if keys is None:
+            keys = ClientImportService.load_keys(session, tenant_id)
+        frame, errors = ClientImportService.normalize(df, row_offset)
+
+        frame["_name_key"] = normalize_name(frame["name"])
+        frame["_cuit_key"] = normalize_cuit(frame["cuit"]) if "cuit" in frame else pd.Series(pd.NA, index=frame.index, dtype="string")
+        by_cuit = frame["_cuit_key"].map(keys["cuit"]).astype("Float64").astype("Int64") if match_cuit else None
+        by_name = frame["_name_key"].map(keys["name"]).astype("Float64").astype("Int64")
+        frame["_id"] = by_cuit.fillna(by_name) if match_cuit else by_name
+        frame["_matched_by"] = np.where(
+            by_cuit.notna() if match_cuit else False, "cuit", np.where(by_name.notna(), "name", None)
+        )
+
+        # Duplicados en el archivo (mismo cliente existente, misma CUIT o mismo nombre):
+        # se combinan en una fila; la última gana y las anteriores completan celdas vacías
+        target = frame["_id"].astype("string")
+        if match_cuit:
+            with_cuit = frame[frame["_id"].isna() & frame["_cuit_key"].notna()]
+            name_to_cuit = with_cuit.drop_duplicates("_name_key", keep="last").set_index("_name_key")["_cuit_key"]
+            target = target.fillna("cuit:" + frame["_cuit_key"].fillna(frame["_name_key"].map(name_to_cuit)))
+        target = target.fillna("name:" + frame["_name_key"])
+        frame["_target"] = target
+        duplicated = target.duplicated(keep="last")
+        if duplicated.any():
+            last_row = frame.groupby("_target")["_row"].max()
+            for row, key in zip(frame.loc[duplicated, "_row"], target[duplicated]):
+                errors.append({
+                    "row": int(row), "action": "skipped",
+                    "error": f"cliente repetido en el archivo (combinado con la fila {int(last_row[key])})",
+                })
+            frame = frame.groupby("_target", sort=False).last().reset_index()
+
+        columns = [c for c in frame.columns if not c.startswith("_")]
+        updates = frame[frame["_id"].notna()]
+        inserts = frame[frame["_id"].isna()]
+        report = []
+
+        if not updates.empty:
+            fields = [c for c in columns if c != "name"]
+            if fields:
+                table = Client.__table__
+                records = ProductImportService._records(updates, fields)
+                session.connection().execute(
+                    update(table)
+                    .where(table.c.id == bindparam("u_id"), table.c.tenant_id == tenant_id)
+                    .values({c: func.coalesce(bindparam(f"u_{c}"), table.c[c]) for c in fields}),
+                    [
+                        {"u_id": int(client_id), **{f"u_{c}": record[c] for c in fields}}
+                        for client_id, record in zip(updates["_id"], records)
+                    ],
+                )
+            for row, client_id, matched_by in zip(updates["_row"], updates["_id"], updates["_matched_by"]):
+                report.append({"row": int(row), "action": "updated", "client_id": int(client_id), "matched_by": matched_by})
+
+        if not inserts.empty:
+            rows = ProductImportService._records(inserts, columns)
+            for row in rows:
+                row["tenant_id"] = tenant_id
+            table = Client.__table__
+            # insertmanyvalues: un INSERT por lote con RETURNING. El orden devuelto no está
+            # garantizado, así que se asocia por (nombre, CUIT), único entre las altas tras combinar
+            new_ids = {
+                (name, cuit): client_id for client_id, name, cuit in session.connection().execute(
+                    insert(table).returning(table.c.id, table.c.name, table.c.cuit), rows
+                ).all()
+            }
+            for row, record, name_key, cuit_key in zip(inserts["_row"], rows, inserts["_name_key"], inserts["_cuit_key"]):
+                client_id = new_ids[(record["name"], record.get("cuit"))]
+                keys["name"].setdefault(name_key, client_id)
+                if not pd.isna(cuit_key):
+                    keys["cuit"].setdefault(cuit_key, client_id)
+                report.append({"row": int(row), "action": "added", "client_id": client_id, "matched_by": None})
+
+        # Altas/cambios por core: los saldos de clientes del reporte cacheado
+        report_cache.touch(session, tenant_id)
+        if commit:
+            session.commit()
+        report.extend(errors)
+        report.sort(key=lambda r: r["row"])
+        return {
+            "added": len(inserts),
+            "updated": len(updates),
+            "errors": [{"row": e["row"], "error": e["error"]} for e in errors],
+            "report": report,
+        }
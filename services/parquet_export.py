@@ -0,0 +1,157 @@
+"""
+services/parquet_export.py
+==========================
+Exportación columnar (Parquet) de ventas, ítems, pagos, caja, compras y
+movimientos de stock de un tenant, para análisis fuera de la app
+(DuckDB, pandas, Spark).
+
+Layout particionado estilo Hive, una partición por mes:
+
+    <destino>/<tabla>/tenant_id=<t>/month=<YYYY-MM>/part-<desde>-<hasta>.parquet
+
+tenant_id va solo en la ruta (no dentro del archivo): si estuviera en ambos,
+los lectores Hive (pandas, pyarrow.dataset) fallan al unir los tipos. El
+rango y el mes de la partición son días locales de la zona del tenant.
+
+Las filas se leen ordenadas por fecha con `yield_per` y se escriben de a
+lotes con un ParquetWriter por partición (memoria acotada al lote). Columnas
+con diccionario y compresión zstd. Reexportar el mismo rango sobrescribe los
+mismos archivos; rangos superpuestos distintos duplican filas.
+
+pyarrow es opcional: se importa al usar la exportación.
+"""
+
+import itertools
+from datetime import date, datetime
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric, select
+from sqlmodel import Session
+
+from database.models import CashMovement, Payment, Purchase, Sale, SaleItem, StockMovement
+from services import time_windows
+from services.errors import ServiceError
+
+YIELD_PER = 10000
+COMPRESSION = "zstd"
+
+# tabla -> (modelo, columna de fecha usada para filtrar y particionar)
+TABLES = {
+    "sale": (Sale, Sale.timestamp),
+    "sale_item": (SaleItem, Sale.timestamp),
+    "payment": (Payment, Payment.date),
+    "cash_movement": (CashMovement, CashMovement.timestamp),
+    "purchase": (Purchase, Purchase.timestamp),
+    "stock_movement": (StockMovement, StockMovement.timestamp),
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as exc:
+        raise ServiceError("La exportación Parquet requiere pyarrow (pip install pyarrow)", 501) from exc
+    return pyarrow
+
+
+def _arrow_type(pa, column):
+    sql_type = column.type
+    if isinstance(sql_type, Boolean):
+        return pa.bool_()
+    if isinstance(sql_type, Integer):
+        return pa.int64()
+    if isinstance(sql_type, (Float, Numeric)):
+        return pa.float64()
+    if isinstance(sql_type, DateTime):
+        return pa.timestamp("us", tz="UTC")   # la base guarda UTC sin zona
+    if isinstance(sql_type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def _statement(name: str, tenant_id: int, start: datetime, end: datetime):
+    """SELECT de la tabla en el rango; sale_item hereda tenant y fecha de su venta.
+
+    tenant_id no se selecciona: ya es la clave de partición.
+    """
+    model, time_column = TABLES[name]
+    if name == "sale_item":
+        columns = [*SaleItem.__table__.columns, Sale.timestamp.label("sale_timestamp")]
+        stmt = select(*columns).join(Sale, Sale.id == SaleItem.sale_id)
+        tenant_column = Sale.tenant_id
+    else:
+        columns = [c for c in model.__table__.columns if c.name != "tenant_id"]
+        stmt = select(*columns)
+        tenant_column = model.tenant_id
+    stmt = stmt.where(tenant_column == tenant_id, time_column >= start, time_column < end)
+    return stmt.order_by(time_column, *[c for c in columns if c.name == "id"]), columns
+
+
+def export_table(
+    session: Session,
+    name: str,
+    tenant_id: int,
+    start: date,
+    end: date,
+    out_dir,
+) -> dict:
+    """Escribe una tabla en [start, end] (días locales inclusive). Retorna filas y archivos escritos."""
+    pa = _pyarrow()
+    zone = time_windows.tenant_zone(session, tenant_id)
+    start_ts, end_ts = time_windows.range_window(start, end, zone)
+    stmt, columns = _statement(name, tenant_id, start_ts, end_ts)
+    schema = pa.schema([(c.name, _arrow_type(pa, c)) for c in columns])
+    time_index = len(columns) - 1 if name == "sale_item" else [c.name for c in columns].index(TABLES[name][1].name)
+    base = Path(out_dir) / name / f"tenant_id={tenant_id}"
+    filename = f"part-{start:%Y%m%d}-{end:%Y%m%d}.parquet"
+
+    rows_written = 0
+    files = []
+    writer = None
+    current_month = None
+    result = session.execute(stmt.execution_options(yield_per=YIELD_PER))
+    try:
+        for batch in result.partitions():
+            # Filas ordenadas por fecha: cada mes local es un tramo contiguo del lote
+            for month, rows in itertools.groupby(
+                batch, key=lambda r: time_windows.local_day(r[time_index], zone).strftime("%Y-%m")
+            ):
+                rows = list(rows)
+                if month != current_month:
+                    if writer is not None:
+                        writer.close()
+                    path = base / f"month={month}" / filename
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    writer = pa.parquet.ParquetWriter(
+                        str(path), schema, compression=COMPRESSION, use_dictionary=True
+                    )
+                    files.append(str(path))
+                    current_month = month
+                arrays = [pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(schema)]
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+                rows_written += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    return {"rows": rows_written, "files": files}
+
+
+def export_tenant(
+    session: Session,
+    tenant_id: int,
+    start: date,
+    end: date,
+    out_dir,
+    tables: Optional[list] = None,
+) -> dict:
+    """Exporta las tablas pedidas (todas por defecto). {tabla: {"rows", "files"}}."""
+    if end < start:
+        raise ServiceError("La fecha final es anterior a la inicial")
+    tables = list(tables or TABLES)
+    unknown = [t for t in tables if t not in TABLES]
+    if unknown:
+        raise ServiceError(f"Tablas inválidas: {unknown}")
+    _pyarrow()
+    return {name: export_table(session, name, tenant_id, start, end, out_dir) for name in tables}
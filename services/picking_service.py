@@ -0,0 +1,518 @@
+"""
+services/picking_service.py
+===========================
+Generación de listas de picking con ruta optimizada.
+
+Asigna cantidades a posiciones (Bin) minimizando la cantidad de paradas y
+ordena el recorrido en serpentina: pasillos en orden natural, estantes
+ascendentes en pasillos pares y descendentes en impares, para que el
+operario no vuelva sobre sus pasos al cambiar de pasillo.
+
+Las olas consolidan varias ventas pendientes en un único recorrido y
+agregan instrucciones de separación (slot por orden) en cada línea.
+"""
+
+import re
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import bindparam, func, insert, update
+from sqlmodel import Session, select
+
+from database.models import Bin, BinStock, Product, Sale, SaleItem
+from services import stock_ledger
+from services.bin_stock_service import BinStockService, StockServiceError
+
+MAX_PICK_LINES = 1000
+
+_NATURAL_SPLIT = re.compile(r"(\d+)")
+
+
+def _natural_key(value: Optional[str]) -> tuple:
+    """
+    Clave de orden natural: "A2" < "A10". Los valores vacíos van al final.
+    """
+    if value is None or str(value).strip() == "":
+        return (1,)
+    parts = _NATURAL_SPLIT.split(str(value).strip().lower())
+    return (0,) + tuple((0, int(p)) if p.isdigit() else (1, p) for p in parts if p != "")
+
+
+def serpentine_key(bin_: Bin, aisle_rank: dict, shelf_rank: dict) -> tuple:
+    """
+    Clave de recorrido para una posición. `aisle_rank` mapea
+    (location_id, aisle) -> índice del pasillo y `shelf_rank`
+    (location_id, aisle, shelf) -> índice del estante dentro del pasillo.
+    Sin pasillo asignado: al final del depósito, por nombre.
+    """
+    if not bin_.aisle:
+        return (bin_.location_id, 1, 0, 0, (), _natural_key(bin_.name))
+    rank = aisle_rank[(bin_.location_id, bin_.aisle)]
+    shelf = shelf_rank[(bin_.location_id, bin_.aisle, bin_.shelf)]
+    if rank % 2 == 1:
+        # Pasillo impar: se recorre de vuelta (estantes en orden inverso)
+        shelf = -shelf
+    return (bin_.location_id, 0, rank, shelf, _natural_key(bin_.position), _natural_key(bin_.name))
+
+
+class PickingService:
+    """Listas de picking: asignación de posiciones y orden de recorrido."""
+
+    @staticmethod
+    def items_from_sales(session: Session, tenant_id: int, sale_ids: list) -> list:
+        """Demanda agregada por producto de una o varias ventas del tenant."""
+        sale_ids = set(sale_ids)
+        found = set(session.exec(
+            select(Sale.id).where(Sale.id.in_(sale_ids), Sale.tenant_id == tenant_id)
+        ).all())
+        missing = sorted(sale_ids - found)
+        if missing:
+            raise StockServiceError(f"Venta {missing[0]} no encontrada", 404)
+
+        rows = session.exec(
+            select(SaleItem.product_id, SaleItem.quantity)
+            .where(SaleItem.sale_id.in_(sale_ids), SaleItem.product_id.is_not(None))
+        ).all()
+        demand = defaultdict(int)
+        for product_id, quantity in rows:
+            demand[product_id] += quantity
+        return [{"product_id": pid, "quantity": qty} for pid, qty in demand.items()]
+
+    @staticmethod
+    def _allocate(demand: dict, candidates: dict, route_pos: dict) -> tuple[dict, list]:
+        """
+        Asignación greedy orientada a paradas:
+          1. Si una posición ya visitada cubre todo el pedido del producto, se usa.
+          2. Si no, la primera posición (en orden de ruta) que lo cubra entera.
+          3. Si ninguna alcanza, se toman las de mayor stock hasta cubrir
+             (menos posiciones), desempatando por orden de ruta.
+        Los productos con menos posiciones candidatas se asignan primero,
+        así los más flexibles se acomodan a las paradas ya elegidas.
+        Retorna ({bin_id: {product_id: qty}}, faltantes).
+        """
+        picks = defaultdict(dict)
+        shortages = []
+        order = sorted(demand, key=lambda pid: (len(candidates.get(pid, ())), pid))
+        for product_id in order:
+            needed = demand[product_id]
+            options = candidates.get(product_id, [])
+            covering = [(b, q) for b, q in options if q >= needed]
+            if covering:
+                covering.sort(key=lambda bq: (bq[0] not in picks, route_pos[bq[0]]))
+                picks[covering[0][0]][product_id] = needed
+                continue
+
+            remaining = needed
+            for bin_id, qty in sorted(options, key=lambda bq: (-bq[1], route_pos[bq[0]])):
+                take = min(qty, remaining)
+                picks[bin_id][product_id] = take
+                remaining -= take
+                if remaining == 0:
+                    break
+            if remaining > 0:
+                shortages.append({
+                    "product_id": product_id,
+                    "requested": needed,
+                    "allocated": needed - remaining,
+                })
+        return picks, shortages
+
+    @staticmethod
+    def build_pick_list(
+        session: Session,
+        tenant_id: int,
+        items: list,
+        location_id: Optional[int] = None,
+    ) -> dict:
+        """
+        Genera la lista de picking para `items` ([{product_id, quantity}]).
+        Solo lectura: no reserva ni descuenta stock.
+        """
+        if not items:
+            raise StockServiceError("Debes enviar al menos un item")
+        if len(items) > MAX_PICK_LINES:
+            raise StockServiceError(f"Máximo {MAX_PICK_LINES} líneas por lista")
+
+        demand = defaultdict(int)
+        for item in items:
+            if item["quantity"] <= 0:
+                raise StockServiceError("Todas las cantidades deben ser mayores a 0")
+            demand[item["product_id"]] += item["quantity"]
+        return PickingService._route_for_demand(session, tenant_id, demand, location_id)
+
+    @staticmethod
+    def _route_for_demand(
+        session: Session,
+        tenant_id: int,
+        demand: dict,
+        location_id: Optional[int] = None,
+        skip_missing: bool = False,
+    ) -> dict:
+        """
+        Asigna la demanda agregada ({product_id: qty}) a posiciones y arma la ruta.
+        Con `skip_missing`, los productos inexistentes (p. ej. borrados después
+        de la venta) se omiten y se informan en "skipped" en vez de dar 404.
+        """
+        products = {
+            p.id: p for p in session.exec(
+                select(Product).where(Product.id.in_(demand.keys()), Product.tenant_id == tenant_id)
+            ).all()
+        }
+        missing = sorted(demand.keys() - products.keys())
+        if missing and not skip_missing:
+            raise StockServiceError(f"Producto {missing[0]} no encontrado", 404)
+        skipped = [{"product_id": pid, "requested": demand[pid]} for pid in missing]
+        demand = {pid: qty for pid, qty in demand.items() if pid in products}
+
+        # Una sola consulta para todas las posiciones candidatas
+        stmt = (
+            select(BinStock.product_id, BinStock.quantity, Bin)
+            .join(Bin, BinStock.bin_id == Bin.id)
+            .where(
+                BinStock.tenant_id == tenant_id,
+                BinStock.product_id.in_(demand.keys()),
+                BinStock.quantity > 0,
+                Bin.is_active == True,  # noqa: E712
+            )
+        )
+        if location_id is not None:
+            stmt = stmt.where(Bin.location_id == location_id)
+
+        bins_by_id = {}
+        candidates = defaultdict(list)
+        for product_id, quantity, bin_ in session.exec(stmt).all():
+            bins_by_id[bin_.id] = bin_
+            candidates[product_id].append((bin_.id, quantity))
+
+        route = PickingService.route_order(bins_by_id.values())
+        route_pos = {b.id: i for i, b in enumerate(route)}
+        picks, shortages = PickingService._allocate(demand, candidates, route_pos)
+
+        stops = []
+        for bin_ in route:
+            if bin_.id not in picks:
+                continue
+            stops.append({
+                "sequence": len(stops) + 1,
+                "bin_id": bin_.id,
+                "bin_name": bin_.name,
+                "location_id": bin_.location_id,
+                "aisle": bin_.aisle,
+                "shelf": bin_.shelf,
+                "position": bin_.position,
+                "lines": [
+                    {
+                        "product_id": pid,
+                        "product_name": products[pid].name,
+                        "barcode": products[pid].barcode,
+                        "quantity": qty,
+                    }
+                    for pid, qty in sorted(picks[bin_.id].items())
+                ],
+            })
+
+        return {
+            "stops": stops,
+            "total_stops": len(stops),
+            "total_units": sum(l["quantity"] for s in stops for l in s["lines"]),
+            "shortages": shortages,
+            "skipped": skipped,
+        }
+
+    # ------------------------------------------------------------
+    # Salidas e ingresos por picking: una transacción por operación/lote
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def register_exit(session: Session, tenant_id: int, user_id: Optional[int], lines: list) -> dict:
+        """
+        Registra la salida de `lines` ([(Product, qty)]) como venta en una sola transacción:
+        cabecera, SaleItem en bulk, descuento por posición y descuento global condicional.
+        El UPDATE ... WHERE stock_quantity >= qty hace que dos operarios concurrentes
+        no puedan sobrevender; si alguno no alcanza, se revierte todo. Los locks siguen
+        el orden global del servicio de stock: BinStock primero, después Product por id.
+        """
+        demand = defaultdict(int)
+        products = {}
+        for product, qty in lines:
+            demand[product.id] += qty
+            products[product.id] = product
+
+        total_amount = sum(product.price * qty for product, qty in lines)
+        sale = Sale(
+            tenant_id=tenant_id, client_id=None, user_id=user_id,
+            total_amount=total_amount, picked_at=datetime.now(timezone.utc),
+        )
+        try:
+            session.add(sale)
+            session.flush()
+            sale_id = sale.id
+
+            BinStockService.consume_for_sale(session, tenant_id, demand, sale_id, user_id)
+
+            # Orden por id: dos salidas concurrentes bloquean productos en el mismo orden
+            for product_id in sorted(demand):
+                qty = demand[product_id]
+                result = session.exec(
+                    update(Product)
+                    .where(
+                        Product.id == product_id,
+                        Product.tenant_id == tenant_id,
+                        Product.stock_quantity >= qty,
+                    )
+                    .values(stock_quantity=Product.stock_quantity - qty)
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount != 1:
+                    product = products[product_id]
+                    available = session.exec(
+                        select(Product.stock_quantity).where(Product.id == product_id)
+                    ).first()
+                    raise StockServiceError(
+                        f"Stock insuficiente para {product.name}: disponible {available or 0}, solicitado {qty}",
+                        409,
+                    )
+
+            stock_ledger.record(session, [
+                {"tenant_id": tenant_id, "product_id": pid, "delta": -qty, "reason": "venta",
+                 "reference_type": "sale", "reference_id": sale_id, "user_id": user_id}
+                for pid, qty in sorted(demand.items())
+            ])
+            session.connection().execute(insert(SaleItem.__table__), [
+                {
+                    "sale_id": sale_id,
+                    "product_id": product.id,
+                    "product_name": product.name,
+                    "quantity": qty,
+                    "unit_price": product.price,
+                    "total": product.price * qty,
+                    "cost_price_at_sale": product.cost_price,
+                }
+                for product, qty in lines
+            ])
+        except StockServiceError:
+            session.rollback()
+            raise
+
+        session.commit()
+        return {"sale_id": sale_id, "total_amount": total_amount}
+
+    @staticmethod
+    def register_entries(session: Session, tenant_id: int, batch: dict, user_id: Optional[int] = None) -> dict:
+        """
+        Confirma un lote de ingresos escaneados ({product_id: qty}) en una transacción:
+        un UPDATE executemany con incremento atómico y una lectura del stock resultante.
+        Retorna {product_id: nuevo_stock}.
+        """
+        if not batch:
+            return {}
+        table = Product.__table__
+        session.connection().execute(
+            update(table)
+            .where(table.c.id == bindparam("p_id"), table.c.tenant_id == tenant_id)
+            .values(stock_quantity=func.coalesce(table.c.stock_quantity, 0) + bindparam("p_qty")),
+            [{"p_id": pid, "p_qty": batch[pid]} for pid in sorted(batch)],
+        )
+        new_stock = dict(session.exec(
+            select(Product.id, Product.stock_quantity)
+            .where(Product.id.in_(batch.keys()), Product.tenant_id == tenant_id)
+        ).all())
+        missing = sorted(batch.keys() - new_stock.keys())
+        if missing:
+            session.rollback()
+            raise StockServiceError(f"Producto {missing[0]} no encontrado", 404)
+        stock_ledger.record(session, [
+            {"tenant_id": tenant_id, "product_id": pid, "delta": qty, "reason": "ingreso", "user_id": user_id}
+            for pid, qty in sorted(batch.items())
+        ])
+        session.commit()
+        return new_stock
+
+    @staticmethod
+    def register_scanned_entries(session: Session, tenant_id: int, batch: dict) -> tuple[dict, dict]:
+        """
+        Como register_entries, pero omite los productos que ya no existen en el
+        tenant (p. ej. borrados durante la sesión de escaneo) en vez de rechazar
+        el lote entero. Retorna ({product_id: nuevo_stock}, {product_id: qty rechazada}).
+        """
+        known = set(session.exec(
+            select(Product.id).where(Product.id.in_(batch.keys()), Product.tenant_id == tenant_id)
+        ).all())
+        valid = {pid: qty for pid, qty in batch.items() if pid in known}
+        rejected = {pid: qty for pid, qty in batch.items() if pid not in known}
+        return PickingService.register_entries(session, tenant_id, valid), rejected
+
+    # ------------------------------------------------------------
+    # Olas (wave picking): muchas órdenes, un solo recorrido
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def pending_orders(
+        session: Session,
+        tenant_id: int,
+        since: Optional[datetime] = None,
+        sale_ids: Optional[list] = None,
+    ) -> list:
+        """
+        Pedidos a preparar (needs_picking) todavía sin preparar (picked_at IS NULL)
+        con su demanda por producto, en orden de llegada:
+        [{sale_id, client_id, items: {product_id: qty}}]. Las ventas de mostrador
+        se entregan en el acto y nunca entran en una ola.
+        """
+        stmt = (
+            select(Sale.id, Sale.client_id, SaleItem.product_id, SaleItem.quantity)
+            .join(SaleItem, SaleItem.sale_id == Sale.id)
+            .where(
+                Sale.tenant_id == tenant_id,
+                Sale.needs_picking == True,  # noqa: E712
+                Sale.picked_at.is_(None),
+                SaleItem.product_id.is_not(None),
+            )
+            .order_by(Sale.timestamp, Sale.id)
+        )
+        if since is not None:
+            stmt = stmt.where(Sale.timestamp >= since)
+        if sale_ids:
+            stmt = stmt.where(Sale.id.in_(sale_ids))
+
+        orders = {}
+        for sale_id, client_id, product_id, quantity in session.exec(stmt).all():
+            order = orders.setdefault(sale_id, {"sale_id": sale_id, "client_id": client_id, "items": defaultdict(int)})
+            order["items"][product_id] += quantity
+        return list(orders.values())
+
+    @staticmethod
+    def _group_waves(orders: list, max_orders: int, max_units: Optional[int]) -> list:
+        """
+        Agrupa órdenes consecutivas en olas hasta `max_orders` órdenes o
+        `max_units` unidades. Una orden más grande que `max_units` va sola.
+        """
+        waves, current, units = [], [], 0
+        for order in orders:
+            order_units = sum(order["items"].values())
+            full = len(current) >= max_orders or (
+                max_units is not None and current and units + order_units > max_units
+            )
+            if full:
+                waves.append(current)
+                current, units = [], 0
+            current.append(order)
+            units += order_units
+        if current:
+            waves.append(current)
+        return waves
+
+    @staticmethod
+    def _sort_instructions(stops: list, orders: list) -> list:
+        """
+        Reparte cada línea recogida entre las órdenes de la ola (FIFO por
+        llegada) y devuelve el resumen por orden. Cada orden tiene un slot
+        fijo (casillero de consolidación) numerado desde 1.
+        """
+        slots = {o["sale_id"]: i + 1 for i, o in enumerate(orders)}
+        pending = defaultdict(list)
+        for order in orders:
+            for product_id, qty in order["items"].items():
+                pending[product_id].append([order["sale_id"], qty])
+
+        picked_units = defaultdict(int)
+        for stop in stops:
+            for line in stop["lines"]:
+                queue, left, sort = pending[line["product_id"]], line["quantity"], []
+                while left and queue:
+                    sale_id, want = queue[0]
+                    take = min(want, left)
+                    sort.append({"sale_id": sale_id, "slot": slots[sale_id], "quantity": take})
+                    picked_units[sale_id] += take
+                    left -= take
+                    queue[0][1] -= take
+                    if queue[0][1] == 0:
+                        queue.pop(0)
+                line["sort"] = sort
+
+        return [
+            {
+                "sale_id": o["sale_id"],
+                "slot": slots[o["sale_id"]],
+                "client_id": o["client_id"],
+                "units": sum(o["items"].values()),
+                "picked_units": picked_units[o["sale_id"]],
+                "complete": picked_units[o["sale_id"]] == sum(o["items"].values()),
+            }
+            for o in orders
+        ]
+
+    @staticmethod
+    def plan_waves(
+        session: Session,
+        tenant_id: int,
+        max_orders: int = 20,
+        max_units: Optional[int] = None,
+        since: Optional[datetime] = None,
+        sale_ids: Optional[list] = None,
+        location_id: Optional[int] = None,
+    ) -> list:
+        """
+        Planifica olas sobre las ventas pendientes: por ola, una ruta
+        consolidada (cantidad agregada por producto/posición) con
+        instrucciones de separación por orden en cada línea.
+        Solo lectura: las órdenes se marcan recién con confirm_wave. Las líneas
+        de productos que ya no existen se omiten y se informan en "skipped".
+        """
+        if max_orders <= 0:
+            raise StockServiceError("max_orders debe ser mayor a 0")
+
+        orders = PickingService.pending_orders(session, tenant_id, since, sale_ids)
+        waves = []
+        for number, wave_orders in enumerate(
+            PickingService._group_waves(orders, max_orders, max_units), start=1
+        ):
+            demand = defaultdict(int)
+            for order in wave_orders:
+                for product_id, qty in order["items"].items():
+                    demand[product_id] += qty
+            plan = PickingService._route_for_demand(session, tenant_id, demand, location_id, skip_missing=True)
+            plan["orders"] = PickingService._sort_instructions(plan["stops"], wave_orders)
+            plan["wave"] = number
+            waves.append(plan)
+        return waves
+
+    @staticmethod
+    def confirm_wave(session: Session, tenant_id: int, sale_ids: list) -> dict:
+        """
+        Marca las ventas como preparadas. El UPDATE condicional
+        (picked_at IS NULL) evita que dos operarios confirmen la misma orden.
+        """
+        if not sale_ids:
+            raise StockServiceError("Debes enviar al menos una venta")
+        result = session.exec(
+            update(Sale)
+            .where(
+                Sale.tenant_id == tenant_id,
+                Sale.id.in_(set(sale_ids)),
+                Sale.picked_at.is_(None),
+            )
+            .values(picked_at=datetime.now(timezone.utc))
+        )
+        session.commit()
+        return {"ok": True, "confirmed": result.rowcount}
+
+    @staticmethod
+    def route_order(bins) -> list:
+        """Ordena posiciones según el recorrido en serpentina."""
+        bins = list(bins)
+        shelves_by_aisle = defaultdict(set)
+        for b in bins:
+            if b.aisle:
+                shelves_by_aisle[(b.location_id, b.aisle)].add(b.shelf)
+
+        aisle_rank, shelf_rank = {}, {}
+        next_rank = defaultdict(int)
+        for key in sorted(shelves_by_aisle, key=lambda k: (k[0], _natural_key(k[1]))):
+            loc_id, aisle = key
+            aisle_rank[key] = next_rank[loc_id]
+            next_rank[loc_id] += 1
+            for i, shelf in enumerate(sorted(shelves_by_aisle[key], key=_natural_key)):
+                shelf_rank[(loc_id, aisle, shelf)] = i
+        return sorted(bins, key=lambda b: serpentine_key(b, aisle_rank, shelf_rank))
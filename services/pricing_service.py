@@ -0,0 +1,313 @@
+"""
+services/pricing_service.py
+===========================
+Actualización masiva de precios, set-based.
+
+Un solo UPDATE sobre product con la regla de redondeo resuelta en SQL; el
+precio anterior queda en price_history. En Postgres ambas cosas son una única
+sentencia (CTE `UPDATE ... RETURNING` + `INSERT ... SELECT`); en SQLite, que
+no admite CTE con DML, son dos sentencias en la misma transacción.
+
+Listas de precios programadas: se cargan por adelantado y el scheduler las
+vuelca sobre las columnas de product al llegar effective_at. El POS y
+/api/products siguen leyendo una sola columna: no hay resolución por request.
+"""
+
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import Numeric, and_, cast, exists, func, insert, literal, select, union_all, update
+from sqlmodel import Session
+
+from database.models import PriceHistory, PriceList, PriceListItem, Product, Purchase, PurchaseItem
+from services.errors import ServiceError
+
+PRICE_FIELDS = ("price", "price_bulk", "price_retail", "cost_price")
+LIST_PRICE_FIELDS = ("price", "price_bulk", "price_retail")
+_ID_CHUNK = 5000
+ROUNDING_MODES = ("nearest", "up", "down")
+
+logger = logging.getLogger(__name__)
+
+
+class PricingService:
+    """Cambios de precio masivos con historial."""
+
+    @staticmethod
+    def product_filter(
+        tenant_id: int,
+        product_ids: Optional[list] = None,
+        category: Optional[str] = None,
+        supplier_id: Optional[int] = None,
+    ):
+        """
+        Condición WHERE sobre product. El proveedor se resuelve por las compras:
+        productos que figuran en algún comprobante de ese proveedor.
+        """
+        p = Product.__table__
+        conditions = [p.c.tenant_id == tenant_id]
+        if product_ids is not None:
+            conditions.append(p.c.id.in_(product_ids))
+        if category:
+            conditions.append(p.c.category == category)
+        if supplier_id is not None:
+            conditions.append(exists(
+                select(PurchaseItem.id)
+                .join(Purchase, PurchaseItem.purchase_id == Purchase.id)
+                .where(
+                    PurchaseItem.product_id == p.c.id,
+                    Purchase.supplier_id == supplier_id,
+                    Purchase.tenant_id == tenant_id,
+                )
+            ))
+        return and_(*conditions)
+
+    @staticmethod
+    def price_expression(column, percentage: float, round_to: float = 0.01, rounding: str = "nearest"):
+        """
+        Nuevo precio en SQL: column * (1 + pct/100) redondeado al múltiplo de
+        `round_to` (0.01 centavos, 1 pesos, 10/50/100 para precios de góndola).
+        Numeric para que round(x, 2) funcione también en Postgres.
+        """
+        if round_to <= 0:
+            raise ServiceError("El redondeo debe ser mayor a 0")
+        if rounding not in ROUNDING_MODES:
+            raise ServiceError(f"Modo de redondeo inválido: {rounding}")
+        step = cast(literal(round_to), Numeric)
+        scaled = cast(column, Numeric) * cast(literal(1 + percentage / 100.0), Numeric) / step
+        rounded = {"nearest": func.round, "up": func.ceil, "down": func.floor}[rounding](scaled)
+        return func.round(rounded * step, 2)
+
+    @staticmethod
+    def bulk_update_price(
+        session: Session,
+        tenant_id: int,
+        percentage: float,
+        fields: tuple = ("price",),
+        product_ids: Optional[list] = None,
+        category: Optional[str] = None,
+        supplier_id: Optional[int] = None,
+        round_to: float = 0.01,
+        rounding: str = "nearest",
+        user_id: Optional[int] = None,
+    ) -> dict:
+        """
+        Aplica `percentage` a las columnas de precio `fields` de los productos filtrados.
+        Las columnas en NULL (p.ej. price_bulk sin cargar) no se tocan ni se historizan.
+        """
+        fields = tuple(dict.fromkeys(fields))
+        if not fields:
+            raise ServiceError("Debe indicar al menos una columna de precio")
+        invalid = [f for f in fields if f not in PRICE_FIELDS]
+        if invalid:
+            raise ServiceError(f"Columnas de precio inválidas: {invalid}")
+        if percentage <= -100:
+            raise ServiceError("El porcentaje debe ser mayor a -100")
+
+        p = Product.__table__
+        where = PricingService.product_filter(tenant_id, product_ids, category, supplier_id)
+        batch_id = uuid.uuid4().hex
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        history = PriceHistory.__table__
+        history_cols = ["tenant_id", "product_id", "price_field", "old_price", "new_price",
+                        "source", "batch_id", "user_id", "created_at"]
+
+        def history_rows(field, source, id_col, old_col, new_col):
+            return select(
+                literal(tenant_id), id_col, literal(field), old_col, new_col,
+                literal("bulk_update"), literal(batch_id), literal(user_id), literal(now),
+            ).select_from(source).where(old_col.is_not(None))
+
+        if session.get_bind().dialect.name == "postgresql":
+            # Una sentencia: bloquea, actualiza y devuelve viejo/nuevo; el INSERT lee del CTE
+            old = select(p.c.id, *[p.c[f] for f in fields]).where(where).with_for_update().subquery("old")
+            changed = (
+                update(p)
+                .where(p.c.id == old.c.id)
+                .values({f: PricingService.price_expression(old.c[f], percentage, round_to, rounding) for f in fields})
+                .returning(p.c.id, *[old.c[f].label(f"old_{f}") for f in fields], *[p.c[f].label(f"new_{f}") for f in fields])
+                .cte("changed")
+            )
+            selects = []
+            for field in fields:
+                selects.append(history_rows(field, changed, changed.c.id, changed.c[f"old_{field}"], changed.c[f"new_{field}"]))
+            session.connection().execute(insert(history).from_select(history_cols, union_all(*selects)))
+        else:
+            selects = []
+            for field in fields:
+                new_value = PricingService.price_expression(p.c[field], percentage, round_to, rounding)
+                selects.append(history_rows(field, p, p.c.id, p.c[field], new_value).where(where))
+            session.connection().execute(insert(history).from_select(history_cols, union_all(*selects)))
+            session.connection().execute(
+                update(p).where(where).values(
+                    {f: PricingService.price_expression(p.c[f], percentage, round_to, rounding) for f in fields}
+                )
+            )
+
+        updated = session.execute(
+            select(func.count(func.distinct(history.c.product_id))).where(history.c.batch_id == batch_id)
+        ).scalar_one()
+        session.commit()
+        return {"status": "success", "updated_count": updated, "batch_id": batch_id, "fields": list(fields)}
+
+    # ------------------------------------------------------------
+    # Listas de precios programadas
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def create_price_list(
+        session: Session,
+        tenant_id: int,
+        name: str,
+        effective_at: datetime,
+        items: list,
+        user_id: Optional[int] = None,
+    ) -> PriceList:
+        """
+        Programa una lista (items: product_id y price/price_bulk/price_retail opcionales).
+        Valida los productos del tenant por lotes e inserta los ítems en bulk.
+        """
+        if not items:
+            raise ServiceError("La lista debe tener al menos un producto")
+        seen = set()
+        for item in items:
+            if item["product_id"] in seen:
+                raise ServiceError(f"Producto repetido en la lista: {item['product_id']}")
+            seen.add(item["product_id"])
+            values = [item.get(f) for f in LIST_PRICE_FIELDS]
+            if all(v is None for v in values):
+                raise ServiceError(f"El producto {item['product_id']} no tiene precios")
+            if any(v is not None and v < 0 for v in values):
+                raise ServiceError("Los precios no pueden ser negativos")
+
+        ids = sorted(seen)
+        known = set()
+        for i in range(0, len(ids), _ID_CHUNK):
+            known.update(session.execute(
+                select(Product.id).where(Product.tenant_id == tenant_id, Product.id.in_(ids[i:i + _ID_CHUNK]))
+            ).scalars())
+        missing = sorted(seen - known)
+        if missing:
+            raise ServiceError(f"Productos no encontrados: {missing[:20]}", 404)
+
+        if effective_at.tzinfo:
+            effective_at = effective_at.astimezone(timezone.utc).replace(tzinfo=None)
+        price_list = PriceList(
+            tenant_id=tenant_id, name=name, effective_at=effective_at,
+            item_count=len(items), created_by=user_id,
+        )
+        session.add(price_list)
+        session.flush()
+        session.connection().execute(insert(PriceListItem.__table__), [
+            {"price_list_id": price_list.id, "product_id": item["product_id"],
+             **{f: item.get(f) for f in LIST_PRICE_FIELDS}}
+            for item in items
+        ])
+        session.commit()
+        session.refresh(price_list)
+        return price_list
+
+    @staticmethod
+    def cancel_price_list(session: Session, tenant_id: int, price_list_id: int) -> None:
+        p = PriceList.__table__
+        result = session.connection().execute(
+            update(p)
+            .where(p.c.id == price_list_id, p.c.tenant_id == tenant_id, p.c.status == "scheduled")
+            .values(status="cancelled")
+        )
+        if result.rowcount != 1:
+            session.rollback()
+            raise ServiceError("La lista no existe o ya no está programada", 409)
+        session.commit()
+
+    @staticmethod
+    def apply_price_list(session: Session, price_list_id: int, user_id: Optional[int] = None) -> Optional[int]:
+        """
+        Vuelca la lista sobre product. El cambio de estado es un UPDATE condicional:
+        si otro proceso ya la tomó (o se canceló) retorna None sin tocar precios.
+        Historial + UPDATE ... FROM en la misma transacción que el claim.
+        """
+        pl = PriceList.__table__
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        claimed = session.connection().execute(
+            update(pl)
+            .where(pl.c.id == price_list_id, pl.c.status == "scheduled")
+            .values(status="applied", applied_at=now)
+        )
+        if claimed.rowcount != 1:
+            session.rollback()
+            return None
+        tenant_id = session.execute(select(pl.c.tenant_id).where(pl.c.id == price_list_id)).scalar_one()
+
+        p = Product.__table__
+        item = PriceListItem.__table__
+        batch_id = f"pricelist-{price_list_id}"
+        selects = [
+            select(
+                literal(tenant_id), p.c.id, literal(field), p.c[field], item.c[field],
+                literal("price_list"), literal(batch_id), literal(user_id), literal(now),
+            )
+            .select_from(p.join(item, item.c.product_id == p.c.id))
+            .where(
+                item.c.price_list_id == price_list_id,
+                p.c.tenant_id == tenant_id,
+                item.c[field].is_not(None),
+                p.c[field].is_not(None),
+                p.c[field] != item.c[field],
+            )
+            for field in LIST_PRICE_FIELDS
+        ]
+        session.connection().execute(insert(PriceHistory.__table__).from_select(
+            ["tenant_id", "product_id", "price_field", "old_price", "new_price",
+             "source", "batch_id", "user_id", "created_at"],
+            union_all(*selects),
+        ))
+        result = session.connection().execute(
+            update(p)
+            .where(item.c.product_id == p.c.id, item.c.price_list_id == price_list_id, p.c.tenant_id == tenant_id)
+            .values({f: func.coalesce(item.c[f], p.c[f]) for f in LIST_PRICE_FIELDS})
+        )
+        session.connection().execute(
+            update(pl).where(pl.c.id == price_list_id).values(applied_count=result.rowcount)
+        )
+        session.commit()
+        return result.rowcount
+
+    @staticmethod
+    def apply_due_price_lists(session: Session, now: Optional[datetime] = None) -> list:
+        """
+        Aplica, en orden de vigencia, todas las listas vencidas de todos los tenants.
+        Cada lista es su propia transacción: si una falla se revierte, queda en
+        estado "failed" (se registra en el log) y se sigue con las siguientes.
+        """
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        due = session.execute(
+            select(PriceList.id)
+            .where(PriceList.status == "scheduled", PriceList.effective_at <= now)
+            .order_by(PriceList.effective_at, PriceList.id)
+        ).scalars().all()
+        applied = []
+        for price_list_id in due:
+            try:
+                if PricingService.apply_price_list(session, price_list_id) is not None:
+                    applied.append(price_list_id)
+            except Exception:
+                # Una lista rota no frena a las demás: queda "failed" y no se reintenta
+                session.rollback()
+                logger.exception("Price list %s failed to apply", price_list_id)
+                PricingService._mark_failed(session, price_list_id)
+        return applied
+
+    @staticmethod
+    def _mark_failed(session: Session, price_list_id: int) -> None:
+        pl = PriceList.__table__
+        try:
+            session.connection().execute(
+                update(pl).where(pl.c.id == price_list_id, pl.c.status == "scheduled").values(status="failed")
+            )
+            session.commit()
+        except Exception:
+            session.rollback()
+            logger.exception("Price list %s could not be marked as failed", price_list_id)
@@ -0,0 +1,202 @@
+"""
+services/product_index.py
+=========================
+Índice en memoria para resolver escaneos (barcode / item_number) sin ir a la base.
+
+Por tenant: un dict barcode -> id, un dict item_number -> id y un trie sobre
+item_number para la búsqueda por prefijo de picking. Se carga perezosamente
+con una sola consulta y se mantiene al día con eventos ORM de Product
+(aplicados recién en el commit). Cambios hechos por otros procesos o por
+UPDATE masivos se cubren con un TTL y con la verificación que hace el
+llamador sobre el producto resuelto.
+"""
+
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from database.models import Product
+
+INDEX_TTL_SECONDS = 300
+
+# Regla de prefijo de picking: se prueban term[:3], term[:4] y term[:5],
+# siempre más cortos que el término. Solo esos largos de item_number pueden matchear.
+PREFIX_MIN = 3
+PREFIX_MAX = 5
+_LEAF = "$"
+
+
+class TenantScanIndex:
+    """Mapas exactos + trie de prefijos de un tenant."""
+
+    def __init__(self):
+        self.barcodes: dict = {}
+        self.item_numbers: dict = {}
+        self.trie: dict = {}
+        self.loaded_at = time.monotonic()
+
+    def add(self, product_id: int, barcode: Optional[str], item_number: Optional[str]) -> None:
+        # setdefault: ante duplicados gana el id más bajo (el índice se carga ordenado por id)
+        if barcode:
+            self.barcodes.setdefault(barcode, product_id)
+        if item_number:
+            self.item_numbers.setdefault(item_number, product_id)
+            if PREFIX_MIN <= len(item_number) <= PREFIX_MAX:
+                node = self.trie
+                for ch in item_number:
+                    node = node.setdefault(ch, {})
+                node.setdefault(_LEAF, product_id)
+
+    def discard(self, product_id: int, barcode: Optional[str], item_number: Optional[str]) -> None:
+        if barcode and self.barcodes.get(barcode) == product_id:
+            del self.barcodes[barcode]
+        if item_number and self.item_numbers.get(item_number) == product_id:
+            del self.item_numbers[item_number]
+            node = self.trie
+            for ch in item_number:
+                node = node.get(ch)
+                if node is None:
+                    return
+            if node.get(_LEAF) == product_id:
+                del node[_LEAF]
+
+    def resolve(self, term: str) -> Optional[tuple[int, str]]:
+        """
+        Mismo orden que la búsqueda en base: barcode exacto, item_number exacto,
+        y si el término tiene 4+ caracteres, el item_number más largo que sea
+        prefijo (3 a 5 caracteres). Retorna (product_id, regla) o None.
+        """
+        product_id = self.barcodes.get(term)
+        if product_id is not None:
+            return product_id, "barcode"
+        product_id = self.item_numbers.get(term)
+        if product_id is not None:
+            return product_id, "item_number"
+        if len(term) < PREFIX_MIN + 1:
+            return None
+
+        node, best = self.trie, None
+        for depth, ch in enumerate(term[:min(len(term) - 1, PREFIX_MAX)], start=1):
+            node = node.get(ch)
+            if node is None:
+                break
+            if depth >= PREFIX_MIN and _LEAF in node:
+                best = node[_LEAF]
+        return (best, "prefix") if best is not None else None
+
+
+_indexes: dict = {}
+_lock = threading.Lock()
+
+
+def _load(session: Session, tenant_id: int) -> TenantScanIndex:
+    index = TenantScanIndex()
+    rows = session.exec(
+        select(Product.id, Product.barcode, Product.item_number)
+        .where(Product.tenant_id == tenant_id)
+        .order_by(Product.id)
+    ).all()
+    for product_id, barcode, item_number in rows:
+        index.add(product_id, barcode, item_number)
+    return index
+
+
+def get_index(session: Session, tenant_id: int) -> TenantScanIndex:
+    """Índice del tenant; lo (re)carga si no existe o venció el TTL."""
+    index = _indexes.get(tenant_id)
+    if index is not None and time.monotonic() - index.loaded_at < INDEX_TTL_SECONDS:
+        return index
+    with _lock:
+        index = _indexes.get(tenant_id)
+        if index is None or time.monotonic() - index.loaded_at >= INDEX_TTL_SECONDS:
+            index = _load(session, tenant_id)
+            _indexes[tenant_id] = index
+    return index
+
+
+def lookup(session: Session, tenant_id: int, term: str) -> Optional[tuple[int, str]]:
+    return get_index(session, tenant_id).resolve(term)
+
+
+def matches(product: Product, term: str, rule: str) -> bool:
+    """Verifica que el producto resuelto siga cumpliendo la regla (índice posiblemente viejo)."""
+    if rule == "barcode":
+        return product.barcode == term
+    if rule == "item_number":
+        return product.item_number == term
+    return bool(product.item_number) and term.startswith(product.item_number)
+
+
+def invalidate(tenant_id: Optional[int] = None) -> None:
+    """Descarta el índice de un tenant (o todos). Usar tras UPDATE/INSERT masivos por core."""
+    with _lock:
+        if tenant_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(tenant_id, None)
+
+
+def remember(tenant_id: int, product_id: int, barcode: Optional[str], item_number: Optional[str]) -> None:
+    """Agrega al índice (si está cargado) un producto encontrado por fuera de él."""
+    index = _indexes.get(tenant_id)
+    if index is not None:
+        index.add(product_id, barcode, item_number)
+
+
+# ------------------------------------------------------------
+# Eventos ORM: cambios de Product se aplican al índice en el commit
+# ------------------------------------------------------------
+
+_PENDING_KEY = "product_index_changes"
+
+
+def _old_and_new(state, attr: str) -> tuple:
+    history = state.attrs[attr].history
+    new = getattr(state.object, attr)
+    old = history.deleted[0] if history.deleted else new
+    return old, new
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _collect_product_changes(session, flush_context):
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Product):
+            changes.append(("add", obj.tenant_id, obj.id, None, None, obj.barcode, obj.item_number))
+    for obj in session.dirty:
+        if not isinstance(obj, Product):
+            continue
+        state = inspect(obj)
+        old_barcode, barcode = _old_and_new(state, "barcode")
+        old_item, item_number = _old_and_new(state, "item_number")
+        if (old_barcode, old_item) != (barcode, item_number):
+            changes.append(("update", obj.tenant_id, obj.id, old_barcode, old_item, barcode, item_number))
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            changes.append(("delete", obj.tenant_id, obj.id, obj.barcode, obj.item_number, None, None))
+    if changes:
+        session.info.setdefault(_PENDING_KEY, []).extend(changes)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _apply_product_changes(session):
+    for kind, tenant_id, product_id, old_barcode, old_item, barcode, item_number in session.info.pop(_PENDING_KEY, []):
+        index = _indexes.get(tenant_id)
+        if index is None:
+            continue
+        index.discard(product_id, old_barcode, old_item)
+        if kind != "delete":
+            index.add(product_id, barcode, item_number)
+
+
+@event.listens_for(OrmSession, "after_soft_rollback")
+def _discard_product_changes(session, previous_transaction):
+    # Un SAVEPOINT revertido no descarta lo pendiente de la transacción externa;
+    # si quedó algo de más, la verificación del llamador lo corrige.
+    if previous_transaction.nested:
+        return
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,176 @@
+"""
+services/profitability.py
+=========================
+Reporte de rentabilidad (/reports/profitability) sobre el costo capturado al
+vender (SaleItem.cost_price_at_sale).
+
+El reporte es una agregación SQL por día, categoría y producto: los días
+cerrados salen de DailyMarginRollup (ver services/sales_rollup.py) y solo el
+día en curso se agrega desde los ítems. Un año entero son unas pocas filas
+por producto y día, sin recorrer ventas en Python.
+
+`backfill_costs` completa el costo de los ítems históricos (anteriores a la
+captura): último costo de compra del producto a la fecha de la venta y, si no
+hay compras, el costo actual del producto. Los ítems que quedan sin costo se
+informan como `uncosted_units`.
+"""
+
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import Date, func, literal, select, union_all, update
+from sqlmodel import Session
+
+from database.models import DailyMarginRollup, Product, Purchase, PurchaseItem, Sale, SaleItem
+from services import report_cache, sales_rollup, time_windows
+
+BACKFILL_BATCH = 5000
+UNCATEGORIZED = "Sin categoría"
+
+
+# ------------------------------------------------------------
+# Backfill de costos históricos
+# ------------------------------------------------------------
+
+def _historical_cost(tenant_id: int):
+    """Costo unitario estimado de un ítem sin costo (correlacionado con SaleItem en el UPDATE)."""
+    purchase_cost = (
+        select(PurchaseItem.unit_cost)
+        .join(Purchase, Purchase.id == PurchaseItem.purchase_id)
+        .join(Sale, Sale.id == SaleItem.sale_id)
+        .where(
+            PurchaseItem.product_id == SaleItem.product_id,
+            Purchase.tenant_id == tenant_id,
+            Purchase.timestamp <= Sale.timestamp,
+        )
+        .order_by(Purchase.timestamp.desc(), PurchaseItem.id.desc())
+        .limit(1)
+        .correlate(SaleItem.__table__)
+        .scalar_subquery()
+    )
+    current_cost = (
+        select(Product.cost_price)
+        .where(Product.id == SaleItem.product_id)
+        .correlate(SaleItem.__table__)
+        .scalar_subquery()
+    )
+    return func.coalesce(purchase_cost, current_cost)
+
+
+def backfill_costs(session: Session, tenant_id: int, batch_size: int = BACKFILL_BATCH) -> int:
+    """
+    Completa cost_price_at_sale de los ítems del tenant que no lo tienen, de a
+    lotes por id (un commit por lote). Invalida los rollups de los días tocados.
+    Retorna la cantidad de ítems que quedaron con costo.
+    """
+    zone = time_windows.tenant_zone(session, tenant_id)
+    estimate = _historical_cost(tenant_id)
+    last_id = 0
+    updated = 0
+    while True:
+        rows = session.execute(
+            select(SaleItem.id, Sale.timestamp)
+            .join(Sale, Sale.id == SaleItem.sale_id)
+            .where(Sale.tenant_id == tenant_id, SaleItem.cost_price_at_sale.is_(None), SaleItem.id > last_id)
+            .order_by(SaleItem.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        ids = [row[0] for row in rows]
+        conn = session.connection()
+        conn.execute(update(SaleItem.__table__).where(SaleItem.id.in_(ids)).values(cost_price_at_sale=estimate))
+        updated += conn.execute(
+            select(func.count(SaleItem.id)).where(SaleItem.id.in_(ids), SaleItem.cost_price_at_sale.is_not(None))
+        ).scalar()
+        # UPDATE por core: los listeners de rollups y caché no lo ven
+        sales_rollup.invalidate(session, tenant_id, {time_windows.local_day(ts, zone) for _, ts in rows})
+        report_cache.touch(session, tenant_id)
+        session.commit()
+        last_id = ids[-1]
+    return updated
+
+
+# ------------------------------------------------------------
+# Reporte
+# ------------------------------------------------------------
+
+def _margin(revenue, cost, units, uncosted, **labels) -> dict:
+    revenue = float(revenue or 0)
+    cost = float(cost or 0)
+    profit = revenue - cost
+    return {
+        **labels,
+        "units": int(units or 0),
+        "revenue": revenue,
+        "cost": cost,
+        "profit": profit,
+        "margin": (profit / revenue * 100) if revenue > 0 else 0.0,
+        "uncosted_units": int(uncosted or 0),
+    }
+
+
+def _rows(session: Session, tenant_id: int, first: date, last: date):
+    """Filas por día y producto: rollups de días cerrados + agregado de hoy."""
+    closed_last, raw = sales_rollup.split_range(session, tenant_id, first, last)
+    m = DailyMarginRollup
+    parts = [
+        select(m.day, m.product_id, m.product_name, m.category, m.units, m.revenue, m.cost, m.uncosted_units)
+        .where(m.tenant_id == tenant_id, m.day >= first, m.day <= closed_last)
+    ]
+    if raw:
+        parts.append(
+            select(literal(raw[0], Date).label("day"), *sales_rollup.margin_columns())
+            .select_from(SaleItem)
+            .join(Sale, Sale.id == SaleItem.sale_id)
+            .outerjoin(Product, Product.id == SaleItem.product_id)
+            .where(Sale.tenant_id == tenant_id, Sale.timestamp >= raw[1], Sale.timestamp < raw[2])
+            .group_by(SaleItem.product_id, SaleItem.product_name, Product.category)
+        )
+    return union_all(*parts).subquery()
+
+
+def report(session: Session, tenant_id: int, first: date, last: date, limit: Optional[int] = 50) -> dict:
+    """
+    Ingreso, costo, utilidad y margen % del rango de días locales first..last:
+    totales, por día, por categoría y por producto (los `limit` de mayor utilidad).
+    """
+    sales_rollup.ensure_closed_days(session, tenant_id, first, last)
+    rows = _rows(session, tenant_id, first, last)
+    revenue = func.sum(rows.c.revenue)
+    cost = func.sum(rows.c.cost)
+    units = func.sum(rows.c.units)
+    uncosted = func.sum(rows.c.uncosted_units)
+
+    by_day = [
+        _margin(r, c, u, n, day=str(day))
+        for day, r, c, u, n in session.execute(
+            select(rows.c.day, revenue, cost, units, uncosted).group_by(rows.c.day).order_by(rows.c.day)
+        ).all()
+    ]
+    category = func.coalesce(rows.c.category, UNCATEGORIZED)
+    by_category = [
+        _margin(r, c, u, n, category=name)
+        for name, r, c, u, n in session.execute(
+            select(category, revenue, cost, units, uncosted).group_by(category).order_by((revenue - cost).desc())
+        ).all()
+    ]
+    product_stmt = (
+        select(rows.c.product_id, rows.c.product_name, category, revenue, cost, units, uncosted)
+        .group_by(rows.c.product_id, rows.c.product_name, category)
+        .order_by((revenue - cost).desc(), rows.c.product_name)
+    )
+    if limit:
+        product_stmt = product_stmt.limit(limit)
+    by_product = [
+        _margin(r, c, u, n, product_id=pid, product_name=name, category=cat)
+        for pid, name, cat, r, c, u, n in session.execute(product_stmt).all()
+    ]
+
+    totals = _margin(
+        sum(d["revenue"] for d in by_day),
+        sum(d["cost"] for d in by_day),
+        sum(d["units"] for d in by_day),
+        sum(d["uncosted_units"] for d in by_day),
+    )
+    return {"totals": totals, "by_day": by_day, "by_category": by_category, "by_product": by_product}
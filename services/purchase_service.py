@@ -2,6 +2,7 @@ from typing import List, Dict, Any, Optional
 from sqlmodel import Session, select
 
 from database.models import Product, Purchase, PurchaseItem, Supplier, CashMovement
+from services import stock_ledger
 
 
 class PurchaseService:
@@ -37,6 +38,7 @@ class PurchaseService:
         )
         session.add(purchase)
         session.flush()
+        stock_ledger.tag(session, "compra", reference=purchase, user_id=user_id)
 
         total_amount = 0.0
         for item_info in items_data:
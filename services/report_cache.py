@@ -0,0 +1,225 @@
+"""
+services/report_cache.py
+========================
+Caché en memoria de resultados de reportes pesados (/api/reports/summary,
+/reports/profitability), con stale-while-revalidate.
+
+Clave: (tenant, reporte, parámetros). Cada entrada guarda la versión de
+datos del tenant con la que se calculó; la versión sube en cada commit que
+toca ventas, ítems, pagos, caja, compras, clientes, proveedores o la
+configuración (eventos ORM, aplicados recién en el commit). Una entrada es:
+
+- fresca: misma versión y menos de `ttl` segundos -> se sirve (hit);
+- vieja: cambió la versión o pasó el TTL, pero tiene menos de `max_stale`
+  segundos -> se sirve igual y se recalcula en segundo plano (stale);
+- ausente o demasiado vieja -> se calcula en el request (miss).
+
+Un solo cálculo por clave a la vez: los requests concurrentes de una clave
+sin entrada esperan el mismo cálculo, y una clave vieja se refresca una sola
+vez. Los resultados se comparten entre requests: no modificarlos.
+
+La versión es por proceso: con varios workers, las escrituras hechas en otro
+proceso se ven al vencer el TTL. Las escrituras por core (sin ORM) deben
+llamar a `touch(session, tenant_id)` antes del commit.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session
+
+from database.models import CashMovement, Client, Payment, Purchase, Sale, SaleItem, Settings, Supplier
+
+logger = logging.getLogger(__name__)
+
+TTL_SECONDS = float(os.getenv("REPORT_CACHE_TTL", "60"))
+MAX_STALE_SECONDS = float(os.getenv("REPORT_CACHE_MAX_STALE", "900"))
+MAX_ENTRIES = 512
+
+_WATCHED = (Sale, Payment, CashMovement, Purchase, Client, Supplier, Settings)
+
+
+class _Entry:
+    def __init__(self, value, version: int):
+        self.value = value
+        self.version = version
+        self.computed_at = time.monotonic()
+
+
+_entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+_inflight: dict = {}
+_versions: dict = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="report-cache")
+_metrics: dict = defaultdict(lambda: {
+    "hits": 0, "stale": 0, "misses": 0, "refreshes": 0, "errors": 0, "compute_seconds": 0.0,
+})
+
+
+def _freeze(params) -> tuple:
+    if isinstance(params, dict):
+        return tuple(sorted(params.items()))
+    return tuple(params or ())
+
+
+def get(
+    session: Session,
+    tenant_id: int,
+    report: str,
+    params,
+    compute: Callable[[Session], object],
+    ttl: Optional[float] = None,
+    max_stale: Optional[float] = None,
+):
+    """
+    Resultado de `compute(session)` para (tenant, report, params), desde la caché
+    si está fresca o vieja-servible. El refresco en segundo plano abre su propia
+    sesión sobre el mismo engine.
+    """
+    ttl = TTL_SECONDS if ttl is None else ttl
+    max_stale = MAX_STALE_SECONDS if max_stale is None else max_stale
+    key = (tenant_id, report, _freeze(params))
+    stats = _metrics[report]
+    refresh = None
+
+    with _lock:
+        version = _versions.get(tenant_id, 0)
+        entry = _entries.get(key)
+        age = time.monotonic() - entry.computed_at if entry is not None else None
+        if entry is not None and entry.version == version and age < ttl:
+            stats["hits"] += 1
+            _entries.move_to_end(key)
+            return entry.value
+        serve_stale = entry is not None and age < max_stale
+        if serve_stale:
+            stats["stale"] += 1
+            _entries.move_to_end(key)
+            if key not in _inflight:
+                refresh = _inflight[key] = Future()
+        else:
+            stats["misses"] += 1
+            future = _inflight.get(key)
+            owner = future is None
+            if owner:
+                future = _inflight[key] = Future()
+
+    if serve_stale:
+        if refresh is not None:
+            _executor.submit(_refresh, key, report, version, compute, session.get_bind(), refresh)
+        return entry.value
+    if not owner:
+        # Otro request ya lo está calculando
+        return future.result()
+    return _compute(key, report, version, compute, session, future)
+
+
+def _compute(key: tuple, report: str, version: int, compute, session: Session, future: Future):
+    started = time.monotonic()
+    try:
+        value = compute(session)
+    except BaseException as exc:
+        with _lock:
+            _inflight.pop(key, None)
+            _metrics[report]["errors"] += 1
+        future.set_exception(exc)
+        raise
+    with _lock:
+        _entries[key] = _Entry(value, version)
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+        _inflight.pop(key, None)
+        _metrics[report]["compute_seconds"] += time.monotonic() - started
+    future.set_result(value)
+    return value
+
+
+def _refresh(key: tuple, report: str, version: int, compute, bind, future: Future) -> None:
+    with _lock:
+        _metrics[report]["refreshes"] += 1
+    try:
+        with Session(bind) as session:
+            _compute(key, report, version, compute, session, future)
+    except Exception:
+        logger.exception("Report cache refresh failed for %s", key)
+
+
+# ------------------------------------------------------------
+# Versión de datos por tenant
+# ------------------------------------------------------------
+
+def bump(tenant_id: int) -> None:
+    """Marca los reportes del tenant como viejos (se sirven y se recalculan)."""
+    with _lock:
+        _versions[tenant_id] = _versions.get(tenant_id, 0) + 1
+
+
+def touch(session: Session, tenant_id: int) -> None:
+    """Escrituras por core: sube la versión del tenant cuando la sesión hace commit."""
+    session.info.setdefault(_PENDING_KEY, set()).add(tenant_id)
+
+
+def clear(tenant_id: Optional[int] = None) -> None:
+    """Descarta entradas (todas o las de un tenant)."""
+    with _lock:
+        for key in [k for k in _entries if tenant_id is None or k[0] == tenant_id]:
+            del _entries[key]
+
+
+def stats() -> dict:
+    """Contadores por reporte (hits, stale, misses, refreshes, errors) y entradas en memoria."""
+    with _lock:
+        reports = {}
+        for report, counters in _metrics.items():
+            served = counters["hits"] + counters["stale"] + counters["misses"]
+            reports[report] = {
+                **counters,
+                "compute_seconds": round(counters["compute_seconds"], 3),
+                "hit_ratio": round((counters["hits"] + counters["stale"]) / served, 3) if served else 0.0,
+            }
+        return {"entries": len(_entries), "reports": reports}
+
+
+# ------------------------------------------------------------
+# Eventos ORM: escrituras que cambian reportes suben la versión en el commit
+# ------------------------------------------------------------
+
+_PENDING_KEY = "report_cache_tenants"
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _collect_writes(session, flush_context):
+    tenants = set()
+    sale_ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, _WATCHED):
+            tenants.add(obj.tenant_id)
+        elif isinstance(obj, SaleItem) and obj.sale_id is not None:
+            sale_ids.add(obj.sale_id)
+    if sale_ids:
+        tenants.update(session.connection().execute(
+            select(Sale.tenant_id).where(Sale.id.in_(sale_ids))
+        ).scalars())
+    tenants.discard(None)
+    if tenants:
+        session.info.setdefault(_PENDING_KEY, set()).update(tenants)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _apply_writes(session):
+    for tenant_id in session.info.pop(_PENDING_KEY, ()):
+        bump(tenant_id)
+
+
+@event.listens_for(OrmSession, "after_soft_rollback")
+def _discard_writes(session, previous_transaction):
+    if previous_transaction.nested:
+        return
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,305 @@
+"""
+services/sales_rollup.py
+========================
+Rollups diarios por tenant para /api/reports/summary (y el chat de IA, que
+lo reutiliza): ventas por día, unidades/importe por producto y caja por canal;
+y de /reports/profitability: ingreso y costo por producto (services/profitability.py).
+
+Los días son días de negocio locales (Settings.timezone, ver
+services/time_windows.py). Los días cerrados (anteriores a hoy) se leen de
+las tablas de rollup; solo el día en curso se agrega desde las filas crudas.
+Un día cerrado se agrega una vez (job horario o, si falta, el primer reporte
+que lo pide) y queda marcado en RollupDay. Cada día se agrega sobre su rango
+UTC [inicio, fin), que usa el índice por fecha.
+
+Invalidación: un listener after_flush detecta altas/cambios/bajas de Sale,
+SaleItem y CashMovement con fecha de un día cerrado y borra la marca; el
+día se vuelve a agregar en la próxima lectura. El listener solo ve el ORM:
+los INSERT/UPDATE/DELETE por core que toquen días cerrados deben llamar a
+`invalidate(...)` o, si abarcan todo el tenant, a `invalidate_all` (también
+ante un cambio de zona horaria). Escrituras por core existentes:
+
+- profitability.backfill_costs (UPDATE de ítems viejos): invalidate por lote;
+- tenant_backup_service.restore_tenant_snapshot (DELETE de ventas): invalidate_all;
+- PickingService.register_exit y client_ledger_import (INSERT con fecha de
+  hoy): el día en curso no tiene rollup, no hace falta invalidar.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable
+
+from sqlalchemy import Date, case, delete, event, func, insert, inspect, literal, select, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session
+
+from database.models import (
+    CashMovement, DailyCashRollup, DailyMarginRollup, DailyProductRollup, DailySalesRollup, Product, RollupDay,
+    Sale, SaleItem,
+)
+from services import time_windows
+
+BACKFILL_DAYS = 35
+_ROLLUP_TABLES = (DailySalesRollup, DailyProductRollup, DailyMarginRollup, DailyCashRollup)
+
+
+def _spans(days: list) -> list:
+    """Días ordenados -> tramos contiguos [(desde, hasta)]."""
+    spans = []
+    for day in days:
+        if spans and day == spans[-1][1] + timedelta(days=1):
+            spans[-1][1] = day
+        else:
+            spans.append([day, day])
+    return [tuple(span) for span in spans]
+
+
+# ------------------------------------------------------------
+# Construcción
+# ------------------------------------------------------------
+
+def margin_columns() -> tuple:
+    """Agregados de margen por ítem (SaleItem ⋈ Sale ⟕ Product), compartidos con la lectura de hoy."""
+    uncosted = SaleItem.cost_price_at_sale.is_(None)
+    return (
+        SaleItem.product_id,
+        SaleItem.product_name,
+        Product.category,
+        func.coalesce(func.sum(SaleItem.quantity), 0).label("units"),
+        func.coalesce(func.sum(SaleItem.total), 0.0).label("revenue"),
+        func.coalesce(func.sum(SaleItem.quantity * func.coalesce(SaleItem.cost_price_at_sale, 0.0)), 0.0).label("cost"),
+        func.coalesce(func.sum(case((uncosted, SaleItem.quantity), else_=0)), 0).label("uncosted_units"),
+    )
+
+
+def build_span(session: Session, tenant_id: int, first: date, last: date, zone=None) -> None:
+    """
+    (Re)agrega los días locales first..last en la transacción actual. La marca
+    se inserta primero: si otro proceso está agregando los mismos días, el
+    UNIQUE de RollupDay hace fallar a uno de los dos antes de duplicar filas.
+    """
+    zone = zone or time_windows.tenant_zone(session, tenant_id)
+    conn = session.connection()
+    conn.execute(delete(RollupDay.__table__).where(
+        RollupDay.tenant_id == tenant_id, RollupDay.day >= first, RollupDay.day <= last
+    ))
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    days = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+    conn.execute(insert(RollupDay.__table__), [
+        {"tenant_id": tenant_id, "day": day, "built_at": now} for day in days
+    ])
+    for model in _ROLLUP_TABLES:
+        conn.execute(delete(model.__table__).where(model.tenant_id == tenant_id, model.day >= first, model.day <= last))
+
+    for day in days:
+        start_ts, end_ts = time_windows.day_window(day, zone)
+        in_day = (Sale.tenant_id == tenant_id, Sale.timestamp >= start_ts, Sale.timestamp < end_ts)
+        conn.execute(insert(DailySalesRollup.__table__).from_select(
+            ["tenant_id", "day", "sale_count", "total_amount"],
+            select(literal(tenant_id), literal(day, Date), func.count(Sale.id), func.coalesce(func.sum(Sale.total_amount), 0.0))
+            .where(*in_day)
+            .having(func.count(Sale.id) > 0),
+        ))
+        conn.execute(insert(DailyProductRollup.__table__).from_select(
+            ["tenant_id", "day", "product_name", "units", "amount"],
+            select(
+                literal(tenant_id), literal(day, Date), SaleItem.product_name,
+                func.coalesce(func.sum(SaleItem.quantity), 0), func.coalesce(func.sum(SaleItem.total), 0.0),
+            )
+            .join(Sale, Sale.id == SaleItem.sale_id)
+            .where(*in_day)
+            .group_by(SaleItem.product_name),
+        ))
+        conn.execute(insert(DailyMarginRollup.__table__).from_select(
+            ["tenant_id", "day", "product_id", "product_name", "category", "units", "revenue", "cost", "uncosted_units"],
+            select(literal(tenant_id), literal(day, Date), *margin_columns())
+            .select_from(SaleItem)
+            .join(Sale, Sale.id == SaleItem.sale_id)
+            .outerjoin(Product, Product.id == SaleItem.product_id)
+            .where(*in_day)
+            .group_by(SaleItem.product_id, SaleItem.product_name, Product.category),
+        ))
+        channel = func.coalesce(CashMovement.reference_type, "manual")
+        conn.execute(insert(DailyCashRollup.__table__).from_select(
+            ["tenant_id", "day", "channel", "ingresos", "egresos"],
+            select(
+                literal(tenant_id), literal(day, Date), channel,
+                func.coalesce(func.sum(case((CashMovement.movement_type == "in", CashMovement.amount), else_=0)), 0.0),
+                func.coalesce(func.sum(case((CashMovement.movement_type == "out", CashMovement.amount), else_=0)), 0.0),
+            )
+            .where(CashMovement.tenant_id == tenant_id, CashMovement.timestamp >= start_ts, CashMovement.timestamp < end_ts)
+            .group_by(channel),
+        ))
+
+
+def ensure_closed_days(session: Session, tenant_id: int, first: date, last: date) -> int:
+    """Agrega los días cerrados de first..last que no tienen marca. Retorna cuántos días agregó."""
+    zone = time_windows.tenant_zone(session, tenant_id)
+    last = min(last, time_windows.local_today(zone) - timedelta(days=1))
+    if first > last:
+        return 0
+    built = set(session.execute(
+        select(RollupDay.day).where(RollupDay.tenant_id == tenant_id, RollupDay.day >= first, RollupDay.day <= last)
+    ).scalars())
+    missing = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+    missing = [day for day in missing if day not in built]
+    if not missing:
+        return 0
+    try:
+        for span_first, span_last in _spans(missing):
+            build_span(session, tenant_id, span_first, span_last, zone)
+        session.commit()
+    except IntegrityError:
+        # Otro proceso agregó los mismos días: sus rollups valen
+        session.rollback()
+        return 0
+    return len(missing)
+
+
+def build_recent(session: Session, tenant_id: int, days: int = BACKFILL_DAYS) -> int:
+    """Job: deja agregados los últimos `days` días cerrados."""
+    yesterday = time_windows.local_today(time_windows.tenant_zone(session, tenant_id)) - timedelta(days=1)
+    return ensure_closed_days(session, tenant_id, yesterday - timedelta(days=days - 1), yesterday)
+
+
+# ------------------------------------------------------------
+# Invalidación
+# ------------------------------------------------------------
+
+def invalidate(session: Session, tenant_id: int, days: Iterable[date]) -> None:
+    """Borra la marca de los días (en la transacción actual); se re-agregan al leerlos."""
+    days = sorted(set(days))
+    if days:
+        session.connection().execute(
+            delete(RollupDay.__table__).where(RollupDay.tenant_id == tenant_id, RollupDay.day.in_(days))
+        )
+
+
+def invalidate_all(session: Session, tenant_id: int) -> None:
+    """Todos los días del tenant (p.ej. cambió su zona horaria)."""
+    session.connection().execute(delete(RollupDay.__table__).where(RollupDay.tenant_id == tenant_id))
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _invalidate_closed_days(session, flush_context):
+    touched = set()
+    sale_ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Sale, CashMovement)):
+            # Si cambió la fecha, también el día anterior
+            history = inspect(obj).attrs.timestamp.history
+            for timestamp in (obj.timestamp, *history.deleted):
+                if timestamp is not None:
+                    touched.add((obj.tenant_id, timestamp))
+        elif isinstance(obj, SaleItem) and obj.sale_id is not None:
+            sale_ids.add(obj.sale_id)
+    if sale_ids:
+        touched.update(session.connection().execute(
+            select(Sale.tenant_id, Sale.timestamp).where(Sale.id.in_(sale_ids))
+        ).all())
+
+    by_tenant = {}
+    for tenant_id, timestamp in touched:
+        if tenant_id is not None:
+            by_tenant.setdefault(tenant_id, set()).add(timestamp)
+    for tenant_id, timestamps in by_tenant.items():
+        zone = time_windows.tenant_zone(session, tenant_id)
+        today = time_windows.local_today(zone)
+        days = {time_windows.local_day(ts, zone) for ts in timestamps}
+        invalidate(session, tenant_id, [day for day in days if day < today])
+
+
+# ------------------------------------------------------------
+# Lectura: rollups de días cerrados + filas crudas de hoy
+# ------------------------------------------------------------
+
+def split_range(session: Session, tenant_id: int, first: date, last: date) -> tuple:
+    """(último día cerrado del rango, (hoy, inicio, fin) si hoy está en el rango, si no None)."""
+    zone = time_windows.tenant_zone(session, tenant_id)
+    today = time_windows.local_today(zone)
+    closed_last = min(last, today - timedelta(days=1))
+    raw = (today, *time_windows.day_window(today, zone)) if first <= today <= last else None
+    return closed_last, raw
+
+
+def sales_by_day(session: Session, tenant_id: int, first: date, last: date) -> list:
+    closed_last, raw = split_range(session, tenant_id, first, last)
+    parts = [
+        select(DailySalesRollup.day.label("day"), DailySalesRollup.total_amount.label("total"))
+        .where(DailySalesRollup.tenant_id == tenant_id, DailySalesRollup.day >= first, DailySalesRollup.day <= closed_last)
+    ]
+    if raw:
+        parts.append(
+            select(literal(raw[0], Date).label("day"), Sale.total_amount.label("total"))
+            .where(Sale.tenant_id == tenant_id, Sale.timestamp >= raw[1], Sale.timestamp < raw[2])
+        )
+    rows = union_all(*parts).subquery()
+    result = session.execute(
+        select(rows.c.day, func.sum(rows.c.total)).group_by(rows.c.day).order_by(rows.c.day)
+    ).all()
+    return [{"day": str(day), "total": float(total or 0)} for day, total in result]
+
+
+def top_products(session: Session, tenant_id: int, first: date, last: date, limit: int = 10) -> list:
+    closed_last, raw = split_range(session, tenant_id, first, last)
+    parts = [
+        select(DailyProductRollup.product_name, DailyProductRollup.units, DailyProductRollup.amount)
+        .where(DailyProductRollup.tenant_id == tenant_id, DailyProductRollup.day >= first, DailyProductRollup.day <= closed_last)
+    ]
+    if raw:
+        parts.append(
+            select(SaleItem.product_name, SaleItem.quantity.label("units"), SaleItem.total.label("amount"))
+            .join(Sale, Sale.id == SaleItem.sale_id)
+            .where(Sale.tenant_id == tenant_id, Sale.timestamp >= raw[1], Sale.timestamp < raw[2])
+        )
+    rows = union_all(*parts).subquery()
+    amount = func.sum(rows.c.amount)
+    result = session.execute(
+        select(rows.c.product_name, func.sum(rows.c.units), amount)
+        .group_by(rows.c.product_name)
+        .order_by(amount.desc())
+        .limit(limit)
+    ).all()
+    return [
+        {"product_name": name, "units": int(units or 0), "amount": float(total or 0)}
+        for name, units, total in result
+    ]
+
+
+def cash_by_day(session: Session, tenant_id: int, first: date, last: date) -> list:
+    closed_last, raw = split_range(session, tenant_id, first, last)
+    parts = [
+        select(DailyCashRollup.day.label("day"), DailyCashRollup.ingresos, DailyCashRollup.egresos)
+        .where(DailyCashRollup.tenant_id == tenant_id, DailyCashRollup.day >= first, DailyCashRollup.day <= closed_last)
+    ]
+    if raw:
+        parts.append(
+            select(
+                literal(raw[0], Date).label("day"),
+                case((CashMovement.movement_type == "in", CashMovement.amount), else_=0).label("ingresos"),
+                case((CashMovement.movement_type == "out", CashMovement.amount), else_=0).label("egresos"),
+            )
+            .where(CashMovement.tenant_id == tenant_id, CashMovement.timestamp >= raw[1], CashMovement.timestamp < raw[2])
+        )
+    rows = union_all(*parts).subquery()
+    result = session.execute(
+        select(rows.c.day, func.sum(rows.c.ingresos), func.sum(rows.c.egresos))
+        .group_by(rows.c.day)
+        .order_by(rows.c.day)
+    ).all()
+    cash = []
+    for day, ingresos, egresos in result:
+        ingresos = float(ingresos or 0)
+        egresos = float(abs(egresos or 0))
+        cash.append({"day": str(day), "ingresos": ingresos, "egresos": egresos, "balance": ingresos - egresos})
+    return cash
+
+
+def summary(session: Session, tenant_id: int, first: date, last: date) -> dict:
+    """Las tres series del reporte; agrega antes los días cerrados que falten."""
+    ensure_closed_days(session, tenant_id, first, last)
+    return {
+        "sales_by_day": sales_by_day(session, tenant_id, first, last),
+        "top_products": top_products(session, tenant_id, first, last),
+        "cash_by_day": cash_by_day(session, tenant_id, first, last),
+    }
@@ -0,0 +1,63 @@
+"""
+services/scan_session.py
+========================
+Carrito de escaneo del lado del servidor para sesiones WebSocket de picking.
+
+Acumula los ingresos escaneados y decide cuándo confirmarlos: cada
+`batch_size` escaneos o cuando el primer escaneo pendiente cumple
+`max_delay` segundos, lo que ocurra primero. La persistencia la hace
+PickingService.register_entries, una transacción por lote.
+"""
+
+import time
+from collections import defaultdict
+from typing import Optional
+
+
+class ScanCart:
+    """Estado de una sesión de escaneo (una conexión)."""
+
+    def __init__(self, batch_size: int = 50, max_delay: float = 0.5, clock=time.monotonic):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._clock = clock
+        self.pending: dict = defaultdict(int)
+        self.pending_scans = 0
+        self.first_pending_at: Optional[float] = None
+        self.totals: dict = defaultdict(int)   # confirmado en esta sesión, por producto
+        self.batches = 0
+
+    def add(self, product_id: int, qty: int) -> bool:
+        """Suma un escaneo. Retorna True si el lote ya debe confirmarse."""
+        if self.first_pending_at is None:
+            self.first_pending_at = self._clock()
+        self.pending[product_id] += qty
+        self.pending_scans += 1
+        return self.pending_scans >= self.batch_size
+
+    def seconds_until_due(self) -> Optional[float]:
+        """Tiempo hasta que venza el lote pendiente (None si no hay nada pendiente)."""
+        if self.first_pending_at is None:
+            return None
+        return max(0.0, self.first_pending_at + self.max_delay - self._clock())
+
+    def take_pending(self) -> dict:
+        """Entrega el lote pendiente y deja el carrito listo para el siguiente."""
+        batch = dict(self.pending)
+        self.pending = defaultdict(int)
+        self.pending_scans = 0
+        self.first_pending_at = None
+        return batch
+
+    def restore(self, batch: dict) -> None:
+        """Devuelve un lote que no se pudo confirmar (se reintenta con el próximo)."""
+        for product_id, qty in batch.items():
+            self.add(product_id, qty)
+
+    def confirm(self, batch: dict) -> None:
+        for product_id, qty in batch.items():
+            self.totals[product_id] += qty
+        self.batches += 1
+
+    def pending_qty(self, product_id: int) -> int:
+        return self.pending.get(product_id, 0)
@@ -8,6 +8,7 @@ from fastapi import HTTPException, UploadFile
 from sqlmodel import Session, select
 
 from database.models import Settings, Tenant, User
+from services import sales_rollup, time_windows
 
 
 _IMAGE_SIGNATURES = [
@@ -35,6 +36,7 @@ class SettingsService:
         "printer_name",
         "label_width_mm",
         "label_height_mm",
+        "timezone",
         "logo_file",
     }
     SUPPORTED_LOGO_CONTENT_TYPES = {"image/png", "image/jpeg", "image/webp", "image/gif", "image/svg+xml"}
@@ -83,6 +85,7 @@ class SettingsService:
         printer_name: Optional[str] = None,
         label_width_mm: Optional[int] = None,
         label_height_mm: Optional[int] = None,
+        timezone: Optional[str] = None,
         logo_file: Optional[UploadFile] = None,
     ) -> Settings:
         if company_name is not None:
@@ -105,6 +108,14 @@ class SettingsService:
                 raise HTTPException(status_code=400, detail="label_height_mm must be greater than 0")
             settings.label_height_mm = label_height_mm
 
+        timezone_changed = False
+        if timezone is not None:
+            normalized_timezone = timezone.strip()
+            if not time_windows.is_valid_zone(normalized_timezone):
+                raise HTTPException(status_code=400, detail="timezone must be a valid IANA zone (e.g. America/Argentina/Buenos_Aires)")
+            timezone_changed = normalized_timezone != settings.timezone
+            settings.timezone = normalized_timezone
+
         if logo_file and logo_file.filename:
             if logo_file.content_type not in SettingsService.SUPPORTED_LOGO_CONTENT_TYPES:
                 raise HTTPException(status_code=400, detail="logo_file must be a valid image (png, jpg, webp, gif, svg)")
@@ -132,6 +143,11 @@ class SettingsService:
             settings.logo_url = f"/{file_location}"
 
         session.add(settings)
+        if timezone_changed:
+            # Los rollups están agregados por día local: se rehacen con la zona nueva
+            sales_rollup.invalidate_all(session, settings.tenant_id)
         session.commit()
+        if timezone_changed:
+            time_windows.forget(settings.tenant_id)
         session.refresh(settings)
         return settings
@@ -0,0 +1,210 @@
+"""
+services/slotting_service.py
+============================
+Recomendaciones de slotting por velocidad de picking (ABC).
+
+Los productos se clasifican por frecuencia de picking (líneas de venta)
+sobre el historial completo del período. Los A se acercan al despacho,
+entendido como el inicio del recorrido en serpentina de PickingService.
+Los movimientos salen como documentos de transferencia listos para
+POST /wms/api/documents/transfer.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, func, select
+
+from database.models import Bin, BinStock, Location, Product, Sale, SaleItem
+from services.bin_stock_service import MAX_DOCUMENT_LINES, StockServiceError
+from services.picking_service import PickingService
+
+
+class SlottingService:
+    """Clasificación ABC y propuesta de reubicación de productos."""
+
+    @staticmethod
+    def pick_velocity(session: Session, tenant_id: int, since: datetime) -> pd.DataFrame:
+        """
+        Frecuencia de picking por producto desde `since`.
+        La agregación corre en la base (GROUP BY): solo viaja una fila por producto.
+        """
+        rows = session.exec(
+            select(
+                SaleItem.product_id,
+                func.count(SaleItem.id),
+                func.coalesce(func.sum(SaleItem.quantity), 0),
+            )
+            .join(Sale, SaleItem.sale_id == Sale.id)
+            .where(
+                Sale.tenant_id == tenant_id,
+                Sale.timestamp >= since,
+                SaleItem.product_id.is_not(None),
+            )
+            .group_by(SaleItem.product_id)
+        ).all()
+        return pd.DataFrame(rows, columns=["product_id", "picks", "units"])
+
+    @staticmethod
+    def classify_abc(velocity: pd.DataFrame, a_share: float = 0.8, b_share: float = 0.95) -> pd.DataFrame:
+        """
+        Agrega la columna `abc` según el aporte acumulado de picks:
+        A hasta `a_share`, B hasta `b_share`, el resto C (incluye sin ventas).
+        """
+        df = velocity.sort_values(["picks", "product_id"], ascending=[False, True]).reset_index(drop=True)
+        total = df["picks"].sum()
+        if total == 0:
+            df["abc"] = "C"
+            return df
+        # Participación acumulada *antes* de cada producto: el que cruza el umbral sigue siendo A
+        prior_share = (df["picks"].cumsum() - df["picks"]) / total
+        df["abc"] = np.select(
+            [df["picks"] == 0, prior_share < a_share, prior_share < b_share],
+            ["C", "A", "B"],
+            default="C",
+        )
+        return df
+
+    @staticmethod
+    def recommend(
+        session: Session,
+        tenant_id: int,
+        location_id: int,
+        days: int = 365,
+        max_moves: int = 50,
+        a_share: float = 0.8,
+        b_share: float = 0.95,
+    ) -> dict:
+        """
+        Propone acercar los productos A a las posiciones más cercanas al despacho.
+        Si la posición objetivo está ocupada por productos no-A, se intercambian:
+        los ocupantes pasan a la posición que libera el producto A.
+        Solo lectura: no mueve stock.
+        """
+        location = session.get(Location, location_id)
+        if not location or location.tenant_id != tenant_id:
+            raise StockServiceError("Depósito no encontrado", 404)
+
+        bins = session.exec(
+            select(Bin).where(
+                Bin.tenant_id == tenant_id,
+                Bin.location_id == location_id,
+                Bin.is_active == True,  # noqa: E712
+            )
+        ).all()
+        route = PickingService.route_order(bins)
+        rank = {b.id: i for i, b in enumerate(route)}
+        bins_by_id = {b.id: b for b in route}
+
+        stock = pd.DataFrame(
+            session.exec(
+                select(BinStock.product_id, BinStock.bin_id, BinStock.quantity).where(
+                    BinStock.tenant_id == tenant_id,
+                    BinStock.bin_id.in_(rank.keys()),
+                    BinStock.quantity > 0,
+                )
+            ).all(),
+            columns=["product_id", "bin_id", "quantity"],
+        )
+        if stock.empty:
+            return {"location_id": location_id, "classes": {}, "moves": [], "documents": [],
+                    "travel_before": 0, "travel_after": 0, "travel_reduction_pct": 0.0}
+
+        # Posición principal de cada producto: la de mayor cantidad en este depósito
+        stock["rank"] = stock["bin_id"].map(rank)
+        primary = (
+            stock.sort_values(["product_id", "quantity", "rank"], ascending=[True, False, True])
+            .drop_duplicates("product_id")
+            .set_index("product_id")
+        )
+
+        since = datetime.utcnow() - timedelta(days=days)
+        velocity = SlottingService.pick_velocity(session, tenant_id, since)
+        velocity = (
+            primary[[]].reset_index()
+            .merge(velocity, on="product_id", how="left")
+            .fillna({"picks": 0, "units": 0})
+        )
+        ranked = SlottingService.classify_abc(velocity, a_share, b_share)
+        abc = ranked.set_index("product_id")["abc"]
+        picks = ranked.set_index("product_id")["picks"]
+
+        # Contenido mutable por posición: los intercambios previos cambian lo que hay en cada una
+        contents = {}
+        for product_id, bin_id, quantity in stock[["product_id", "bin_id", "quantity"]].itertuples(index=False):
+            contents.setdefault(bin_id, {})[product_id] = int(quantity)
+        placed = primary["bin_id"].to_dict()
+        claimed = set()
+        lines, moves = [], []
+
+        for product_id in ranked.loc[ranked["abc"] == "A", "product_id"]:
+            if len(moves) >= max_moves:
+                break
+            current_bin = placed[product_id]
+            target = next((b.id for b in route if b.id not in claimed), None)
+            if target is None:
+                break
+            if rank[current_bin] <= rank[target]:
+                claimed.add(current_bin)
+                continue
+
+            displaced = {p: q for p, q in contents.get(target, {}).items() if p != product_id}
+            if any(abc.get(p) == "A" for p in displaced):
+                claimed.add(current_bin)
+                continue
+
+            qty = contents[current_bin][product_id]
+            target_bin, source_bin = bins_by_id[target], bins_by_id[current_bin]
+            if target_bin.max_capacity is not None and qty + contents.get(target, {}).get(product_id, 0) > target_bin.max_capacity:
+                continue
+            remaining_source = sum(contents[current_bin].values()) - qty
+            if source_bin.max_capacity is not None and remaining_source + sum(displaced.values()) > source_bin.max_capacity:
+                continue
+
+            claimed.add(target)
+            lines.append({"product_id": int(product_id), "from_bin_id": current_bin,
+                          "to_bin_id": target, "quantity": qty})
+            for other, other_qty in displaced.items():
+                lines.append({"product_id": int(other), "from_bin_id": target,
+                              "to_bin_id": current_bin, "quantity": other_qty})
+                contents[current_bin][other] = contents[current_bin].get(other, 0) + other_qty
+                if placed.get(other) == target:
+                    placed[other] = current_bin
+            del contents[current_bin][product_id]
+            contents[target] = {product_id: qty + contents.get(target, {}).get(product_id, 0)}
+            placed[product_id] = target
+            moves.append({
+                "product_id": int(product_id),
+                "abc": "A",
+                "from_bin_id": current_bin,
+                "from_bin_name": source_bin.name,
+                "to_bin_id": target,
+                "to_bin_name": target_bin.name,
+                "quantity": qty,
+                "swapped_product_ids": [int(p) for p in displaced],
+            })
+
+        # Distancia ponderada por picks (rango en la ruta como proxy de recorrido)
+        travel_before = int((primary["rank"] * picks.reindex(primary.index).to_numpy()).sum())
+        travel_after = int(sum(rank[placed[p]] * picks[p] for p in primary.index))
+        names = dict(session.exec(
+            select(Product.id, Product.name).where(Product.id.in_([m["product_id"] for m in moves]))
+        ).all()) if moves else {}
+        for m in moves:
+            m["product_name"] = names.get(m["product_id"])
+
+        documents = [
+            {"lines": lines[i:i + MAX_DOCUMENT_LINES], "notes": f"Slotting ABC depósito {location.name}"}
+            for i in range(0, len(lines), MAX_DOCUMENT_LINES)
+        ]
+        return {
+            "location_id": location_id,
+            "classes": {k: int(v) for k, v in ranked["abc"].value_counts().items()},
+            "moves": moves,
+            "documents": documents,
+            "travel_before": travel_before,
+            "travel_after": travel_after,
+            "travel_reduction_pct": round(100 * (travel_before - travel_after) / travel_before, 1)
+            if travel_before else 0.0,
+        }
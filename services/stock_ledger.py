@@ -0,0 +1,254 @@
+"""
+services/stock_ledger.py
+========================
+Libro mayor append-only de product.stock_quantity y consultas "stock al día X".
+
+Dos formas de registrar:
+  - Cambios por ORM (product.stock_quantity = ...): un listener after_flush
+    escribe el delta automáticamente. El motivo sale de `tag(session, ...)`;
+    sin etiqueta se registra como "alta" o "edicion".
+  - UPDATE por core (executemany, condicionales): el servicio llama a
+    `record(session, rows)` con los deltas reales, en la misma transacción.
+
+Los checkpoints guardan la foto completa del stock; `stock_as_of` reconstruye
+desde el checkpoint más cercano a la fecha (hacia adelante o hacia atrás).
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import event, func, insert, inspect, literal
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+from database.models import Product, StockCheckpoint, StockCheckpointLine, StockLedgerEntry
+
+CHECKPOINT_INTERVAL = timedelta(days=1)
+
+_TAG_KEY = "stock_ledger_tag"
+
+
+def _utcnow_naive() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _naive(value: datetime) -> datetime:
+    """Las columnas son timestamp sin zona (UTC): se comparan valores naive."""
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def tag(
+    session: Session,
+    reason: str,
+    reference=None,
+    reference_type: Optional[str] = None,
+    user_id: Optional[int] = None,
+) -> None:
+    """
+    Motivo de los próximos cambios de stock por ORM en esta sesión (hasta el commit).
+    `reference` puede ser un objeto sin id todavía (p.ej. la Sale): se lee en el flush.
+    """
+    session.info[_TAG_KEY] = {
+        "reason": reason,
+        "reference": reference,
+        "reference_type": reference_type or (type(reference).__name__.lower() if reference is not None else None),
+        "user_id": user_id,
+    }
+
+
+def record(session: Session, rows: list) -> None:
+    """
+    Inserta entradas del ledger en bulk. Cada fila: tenant_id, product_id, delta, reason
+    y opcionalmente reference_type, reference_id, user_id. Los deltas en 0 se omiten.
+    """
+    now = _utcnow_naive()
+    entries = [
+        {
+            "tenant_id": r["tenant_id"],
+            "product_id": r["product_id"],
+            "delta": r["delta"],
+            "reason": r["reason"],
+            "reference_type": r.get("reference_type"),
+            "reference_id": r.get("reference_id"),
+            "user_id": r.get("user_id"),
+            "created_at": now,
+        }
+        for r in rows
+        if r["delta"]
+    ]
+    if entries:
+        session.connection().execute(insert(StockLedgerEntry.__table__), entries)
+
+
+def record_tenant_removal(session: Session, tenant_id: int, reason: str = "baja", user_id: Optional[int] = None) -> None:
+    """Antes de un DELETE masivo de productos: lleva a 0 el stock de cada uno en el ledger (INSERT ... SELECT)."""
+    session.connection().execute(
+        insert(StockLedgerEntry.__table__).from_select(
+            ["tenant_id", "product_id", "delta", "reason", "user_id", "created_at"],
+            select(
+                Product.tenant_id, Product.id, -Product.stock_quantity,
+                literal(reason), literal(user_id), literal(_utcnow_naive()),
+            ).where(Product.tenant_id == tenant_id, Product.stock_quantity != 0),
+        )
+    )
+
+
+@event.listens_for(Product.stock_quantity, "set", active_history=True)
+def _load_previous_stock(target, value, oldvalue, initiator):
+    """active_history: al asignar sobre un objeto expirado se carga el valor previo (delta exacto)."""
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _ledger_orm_changes(session, flush_context):
+    rows = []
+    for obj in session.new:
+        if isinstance(obj, Product) and obj.stock_quantity:
+            rows.append((obj, obj.stock_quantity, "alta"))
+    for obj in session.dirty:
+        if not isinstance(obj, Product):
+            continue
+        history = inspect(obj).attrs.stock_quantity.history
+        if history.deleted and history.added:
+            delta = (history.added[0] or 0) - (history.deleted[0] or 0)
+            if delta:
+                rows.append((obj, delta, "edicion"))
+    for obj in session.deleted:
+        if isinstance(obj, Product) and obj.stock_quantity:
+            rows.append((obj, -obj.stock_quantity, "baja"))
+    if not rows:
+        return
+
+    context = session.info.get(_TAG_KEY) or {}
+    reference = context.get("reference")
+    record(session, [
+        {
+            "tenant_id": product.tenant_id,
+            "product_id": product.id,
+            "delta": delta,
+            "reason": context.get("reason", default_reason),
+            "reference_type": context.get("reference_type"),
+            "reference_id": getattr(reference, "id", None),
+            "user_id": context.get("user_id"),
+        }
+        for product, delta, default_reason in rows
+    ])
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _clear_tag(session):
+    session.info.pop(_TAG_KEY, None)
+
+
+@event.listens_for(OrmSession, "after_soft_rollback")
+def _clear_tag_on_rollback(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop(_TAG_KEY, None)
+
+
+# ------------------------------------------------------------
+# Checkpoints y reconstrucción
+# ------------------------------------------------------------
+
+def create_checkpoint(session: Session, tenant_id: int) -> StockCheckpoint:
+    """Foto del stock actual del tenant: cabecera + un INSERT ... SELECT."""
+    checkpoint = StockCheckpoint(tenant_id=tenant_id, taken_at=_utcnow_naive())
+    session.add(checkpoint)
+    session.flush()
+    table = StockCheckpointLine.__table__
+    result = session.connection().execute(
+        insert(table).from_select(
+            ["checkpoint_id", "product_id", "quantity"],
+            select(literal(checkpoint.id), Product.id, func.coalesce(Product.stock_quantity, 0))
+            .where(Product.tenant_id == tenant_id),
+        )
+    )
+    checkpoint.product_count = result.rowcount
+    session.add(checkpoint)
+    session.commit()
+    session.refresh(checkpoint)
+    return checkpoint
+
+
+def checkpoint_if_due(session: Session, tenant_id: int) -> Optional[StockCheckpoint]:
+    """Crea un checkpoint si el último tiene más de CHECKPOINT_INTERVAL."""
+    last = session.exec(
+        select(func.max(StockCheckpoint.taken_at)).where(StockCheckpoint.tenant_id == tenant_id)
+    ).one()
+    if last is not None and _utcnow_naive() - _naive(last) < CHECKPOINT_INTERVAL:
+        return None
+    return create_checkpoint(session, tenant_id)
+
+
+def _ledger_sums(session: Session, tenant_id: int, after: datetime, until: Optional[datetime], product_ids) -> dict:
+    stmt = (
+        select(StockLedgerEntry.product_id, func.sum(StockLedgerEntry.delta))
+        .where(StockLedgerEntry.tenant_id == tenant_id, StockLedgerEntry.created_at > after)
+        .group_by(StockLedgerEntry.product_id)
+    )
+    if until is not None:
+        stmt = stmt.where(StockLedgerEntry.created_at <= until)
+    if product_ids:
+        stmt = stmt.where(StockLedgerEntry.product_id.in_(product_ids))
+    return {pid: int(total) for pid, total in session.exec(stmt).all()}
+
+
+def stock_as_of(session: Session, tenant_id: int, at: datetime, product_ids: Optional[list] = None) -> dict:
+    """
+    Stock de cada producto al instante `at`.
+    Parte del punto conocido más cercano a `at`: un checkpoint anterior (suma los
+    deltas hasta `at`), o uno posterior / el stock actual (resta los deltas desde `at`).
+    """
+    at = _naive(at)
+    before = session.exec(
+        select(StockCheckpoint)
+        .where(StockCheckpoint.tenant_id == tenant_id, StockCheckpoint.taken_at <= at)
+        .order_by(StockCheckpoint.taken_at.desc())
+    ).first()
+    after = session.exec(
+        select(StockCheckpoint)
+        .where(StockCheckpoint.tenant_id == tenant_id, StockCheckpoint.taken_at > at)
+        .order_by(StockCheckpoint.taken_at)
+    ).first()
+    now = _utcnow_naive()
+    after_time = _naive(after.taken_at) if after else now
+    before_time = _naive(before.taken_at) if before else None
+
+    forward = before is not None and (at - before_time) <= (after_time - at)
+    base_checkpoint = before if forward else after
+
+    if base_checkpoint is not None:
+        stmt = select(StockCheckpointLine.product_id, StockCheckpointLine.quantity).where(
+            StockCheckpointLine.checkpoint_id == base_checkpoint.id
+        )
+        if product_ids:
+            stmt = stmt.where(StockCheckpointLine.product_id.in_(product_ids))
+        base = dict(session.exec(stmt).all())
+    else:
+        # Sin checkpoint posterior: el stock actual es el punto de partida
+        stmt = select(Product.id, func.coalesce(Product.stock_quantity, 0)).where(Product.tenant_id == tenant_id)
+        if product_ids:
+            stmt = stmt.where(Product.id.in_(product_ids))
+        base = dict(session.exec(stmt).all())
+
+    if forward:
+        deltas = _ledger_sums(session, tenant_id, before_time, at, product_ids)
+        sign = 1
+    else:
+        deltas = _ledger_sums(session, tenant_id, at, after_time if after else None, product_ids)
+        sign = -1
+
+    stock = dict(base)
+    for pid, total in deltas.items():
+        stock[pid] = stock.get(pid, 0) + sign * total
+
+    ledger_start = session.exec(
+        select(func.min(StockLedgerEntry.created_at)).where(StockLedgerEntry.tenant_id == tenant_id)
+    ).one()
+    return {
+        "at": at,
+        "source": "checkpoint" if base_checkpoint is not None else "current",
+        "checkpoint_id": base_checkpoint.id if base_checkpoint is not None else None,
+        "direction": "forward" if forward else "backward",
+        "ledger_start": ledger_start,
+        "stock": stock,
+    }
@@ -6,6 +6,8 @@ from typing import List, Optional
 import os
 from datetime import datetime
 
+from services import stock_ledger
+
 class StockService:
     def __init__(self, static_dir: str = "static/barcodes"):
         self.static_dir = static_dir
@@ -25,13 +27,16 @@ class StockService:
         code.save(full_path) # saves as filename.svg
         return f"{filename}.svg"
 
-    def process_sale(self, session: Session, user_id: int, tenant_id: int, items_data: List[dict], payment_method: str = "cash", client_id: Optional[int] = None, amount_paid: Optional[float] = None, split_cash: Optional[float] = None, split_transfer: Optional[float] = None) -> Sale:
+    def process_sale(self, session: Session, user_id: int, tenant_id: int, items_data: List[dict], payment_method: str = "cash", client_id: Optional[int] = None, amount_paid: Optional[float] = None, split_cash: Optional[float] = None, split_transfer: Optional[float] = None, needs_picking: bool = False) -> Sale:
         """
         Creates a Sale record and updates product stock.
         If client_id is provided and amount_paid > 0, creates a Payment record.
         items_data expected format: [{"product_id": 1, "quantity": 2}, ...]
+        needs_picking marks the sale as an order to be prepared by wave picking;
+        counter sales (the default) are handed over immediately.
         """
-        sale = Sale(tenant_id=tenant_id, user_id=user_id, payment_method=payment_method, client_id=client_id, timestamp=datetime.now())
+        sale = Sale(tenant_id=tenant_id, user_id=user_id, payment_method=payment_method, client_id=client_id, timestamp=datetime.now(), needs_picking=needs_picking)
+        stock_ledger.tag(session, "venta", reference=sale, user_id=user_id)
         total_sale = 0.0
         
         for item in items_data:
@@ -65,7 +70,8 @@ class StockService:
                 product_name=product.name,
                 quantity=qty,
                 unit_price=unit_price,
-                total=line_total
+                total=line_total,
+                cost_price_at_sale=product.cost_price
             )
             sale.items.append(sale_item)
             
@@ -8,6 +8,7 @@ from sqlalchemy import delete
 from sqlmodel import Session, select
 
 from database.models import Client, Payment, Product, Sale, SaleItem, Settings, User
+from services import product_index, report_cache, sales_rollup, time_windows
 
 
 def _serialize_datetime(value):
@@ -78,6 +79,9 @@ def restore_tenant_snapshot(session: Session, tenant_id: int, data: dict[str, An
     session.exec(delete(Client).where(Client.tenant_id == tenant_id))
     session.exec(delete(User).where(User.tenant_id == tenant_id))
     session.exec(delete(Settings).where(Settings.tenant_id == tenant_id))
+    # Bajas por core: los listeners de rollups y caché de reportes no las ven
+    sales_rollup.invalidate_all(session, tenant_id)
+    report_cache.touch(session, tenant_id)
     session.commit()
 
     for row in data.get("products", []):
@@ -108,4 +112,7 @@ def restore_tenant_snapshot(session: Session, tenant_id: int, data: dict[str, An
         session.add(Payment(**payload))
 
     session.commit()
+    # La configuración restaurada puede traer otra zona horaria; productos reemplazados por core
+    time_windows.forget(tenant_id)
+    product_index.invalidate(tenant_id)
     return {"status": "success", "message": "Tenant restored successfully"}
@@ -0,0 +1,112 @@
+"""
+services/time_windows.py
+========================
+Día de negocio por tenant. Los timestamps se guardan en UTC sin zona; los
+reportes, la caja y los rollups cortan por día local (Settings.timezone).
+
+Un día local se traduce a un rango de timestamps UTC [inicio, fin): las
+consultas filtran `col >= inicio AND col < fin` (usa el índice por fecha)
+en lugar de aplicar date()/zonas sobre la columna. Con horario de verano el
+rango puede durar 23 o 25 horas; ZoneInfo lo resuelve.
+"""
+
+import os
+import time as _time
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import select
+
+from database.models import Settings
+
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "America/Argentina/Buenos_Aires")
+_CACHE_TTL = 60.0
+
+# tenant_id -> (ZoneInfo, vence)
+_zones: dict = {}
+
+
+def get_zone(name: Optional[str]) -> ZoneInfo:
+    """ZoneInfo del nombre IANA; vacío o inválido cae en DEFAULT_TIMEZONE."""
+    for candidate in (name, DEFAULT_TIMEZONE, "UTC"):
+        if not candidate:
+            continue
+        try:
+            return ZoneInfo(candidate)
+        except (ZoneInfoNotFoundError, ValueError):
+            continue
+    return ZoneInfo("UTC")
+
+
+def is_valid_zone(name: str) -> bool:
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+def tenant_zone(session, tenant_id: Optional[int]) -> ZoneInfo:
+    """Zona del tenant (cacheada unos segundos; `forget` al cambiar la configuración)."""
+    cached = _zones.get(tenant_id)
+    if cached and cached[1] > _time.monotonic():
+        return cached[0]
+    # Por la conexión: se puede llamar desde un listener de flush
+    name = session.connection().execute(
+        select(Settings.timezone).where(Settings.tenant_id == tenant_id).limit(1)
+    ).scalar()
+    zone = get_zone(name)
+    _zones[tenant_id] = (zone, _time.monotonic() + _CACHE_TTL)
+    return zone
+
+
+def forget(tenant_id: Optional[int] = None) -> None:
+    if tenant_id is None:
+        _zones.clear()
+    else:
+        _zones.pop(tenant_id, None)
+
+
+def _to_utc_naive(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def local_now(zone: ZoneInfo) -> datetime:
+    return datetime.now(zone)
+
+
+def local_today(zone: ZoneInfo) -> date:
+    return datetime.now(zone).date()
+
+
+def local_day(value: datetime, zone: ZoneInfo) -> date:
+    """Día local de un timestamp de la base (naive = UTC)."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(zone).date()
+
+
+def day_start(day: date, zone: ZoneInfo) -> datetime:
+    """Comienzo del día local, en UTC naive."""
+    return _to_utc_naive(datetime.combine(day, time.min, tzinfo=zone))
+
+
+def day_window(day: date, zone: ZoneInfo) -> tuple[datetime, datetime]:
+    """[inicio, fin) en UTC naive del día local."""
+    return day_start(day, zone), day_start(day + timedelta(days=1), zone)
+
+
+def range_window(first: date, last: date, zone: ZoneInfo) -> tuple[datetime, datetime]:
+    """[inicio, fin) en UTC naive de los días locales first..last (inclusive)."""
+    return day_start(first, zone), day_start(last + timedelta(days=1), zone)
+
+
+def parse_day(value: Optional[str], zone: ZoneInfo, default: Optional[date] = None) -> date:
+    """Fecha 'YYYY-MM-DD' del request; vacía o inválida -> default (hoy local)."""
+    if value:
+        try:
+            return datetime.fromisoformat(value).date()
+        except ValueError:
+            pass
+    return default or local_today(zone)
@@ -302,6 +302,7 @@ function openCheckoutModal() {
     document.getElementById('pay-cash').value = total.toFixed(2);
     document.getElementById('pay-transfer').value = 0;
     document.getElementById('pay-account').value = 0;
+    document.getElementById('needs-picking').checked = false;
     
     const isCasual = !clientSelect || !clientSelect.value;
     document.getElementById('account-row').style.display = isCasual ? 'none' : 'flex';
@@ -395,7 +396,9 @@ async function confirmCheckout() {
         items: cart.map(i => ({ product_id: i.product_id, quantity: i.quantity })),
         client_id: clientId ? parseInt(clientId, 10) : null,
         amount_paid: amountPaid,
-        payment_method: paymentMethod
+        payment_method: paymentMethod,
+        // Venta de mostrador (false) o pedido que entra en las olas de picking (true)
+        needs_picking: document.getElementById('needs-picking').checked
     };
 
     const btn = document.querySelector('#payment-modal .btn:not([onclick*="close"])');
@@ -0,0 +1,227 @@
+"""Tests for BinStockService — backfill, transfers and adjustments on SQLite."""
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from database.models import Bin, BinStock, Location, Product, StockMovement, Tenant
+from services.bin_stock_service import BinStockService, StockServiceError
+
+
+# --------------- helpers ---------------
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+
+    # pysqlite never emits BEGIN itself, so a released SAVEPOINT would autocommit
+    # and survive the outer rollback. Standard SQLAlchemy recipe for SQLite.
+    @event.listens_for(engine, "connect")
+    def _disable_pysqlite_tx(dbapi_connection, _):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _emit_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add(Tenant(id=1, name="Test"))
+        s.commit()
+        yield s
+
+
+def _add_products(session, count, stock=10):
+    products = [
+        Product(tenant_id=1, name=f"P{i}", barcode=f"BC{i:05d}", stock_quantity=stock)
+        for i in range(count)
+    ]
+    session.add_all(products)
+    session.commit()
+    return products
+
+
+# --------------- backfill_default_location ---------------
+
+def test_backfill_inserts_one_row_per_product_with_stock(session):
+    _add_products(session, 5)
+    session.add(Product(tenant_id=1, name="Sin stock", barcode="ZERO", stock_quantity=0))
+    session.commit()
+
+    result = BinStockService.backfill_default_location(session, tenant_id=1)
+
+    assert result["products_backfilled"] == 5
+    rows = session.exec(select(BinStock).where(BinStock.bin_id == result["default_bin_id"])).all()
+    assert sorted(r.quantity for r in rows) == [10] * 5
+
+
+def test_backfill_is_idempotent(session):
+    _add_products(session, 3)
+    BinStockService.backfill_default_location(session, tenant_id=1)
+
+    second = BinStockService.backfill_default_location(session, tenant_id=1)
+
+    assert second["products_backfilled"] == 0
+    assert len(session.exec(select(Location)).all()) == 1
+    assert len(session.exec(select(Bin)).all()) == 1
+
+
+def test_backfill_chunked_covers_every_product(session):
+    _add_products(session, 23)
+
+    result = BinStockService.backfill_default_location(session, tenant_id=1, chunk_size=5)
+
+    assert result["products_backfilled"] == 23
+    assert result["chunks"] == 5
+    assert len(session.exec(select(BinStock)).all()) == 23
+
+
+# --------------- documents ---------------
+
+def _setup_bins(session, stock=10):
+    products = _add_products(session, 3, stock=stock)
+    location = Location(tenant_id=1, name="Central")
+    session.add(location)
+    session.flush()
+    bins = [Bin(tenant_id=1, location_id=location.id, name=f"A-{i}") for i in range(3)]
+    session.add_all(bins)
+    session.flush()
+    session.add_all(BinStock(tenant_id=1, bin_id=bins[0].id, product_id=p.id, quantity=stock) for p in products)
+    session.commit()
+    return products, bins
+
+
+def _qty(session, bin_id, product_id):
+    row = session.exec(
+        select(BinStock).where(BinStock.bin_id == bin_id, BinStock.product_id == product_id)
+    ).first()
+    if row:
+        session.refresh(row)
+    return row.quantity if row else 0
+
+
+def test_transfer_document_moves_every_line(session):
+    products, bins = _setup_bins(session)
+    lines = [
+        {"product_id": p.id, "from_bin_id": bins[0].id, "to_bin_id": bins[1].id, "quantity": 4}
+        for p in products
+    ]
+
+    result = BinStockService.apply_transfer_document(session, 1, lines, request_id="doc-1")
+
+    assert result["movements"] == 3
+    for p in products:
+        assert _qty(session, bins[0].id, p.id) == 6
+        assert _qty(session, bins[1].id, p.id) == 4
+    movements = session.exec(select(StockMovement)).all()
+    assert {m.document_id for m in movements} == {result["document_id"]}
+
+
+def test_transfer_document_is_all_or_nothing(session):
+    products, bins = _setup_bins(session)
+    lines = [
+        {"product_id": products[0].id, "from_bin_id": bins[0].id, "to_bin_id": bins[1].id, "quantity": 4},
+        {"product_id": products[1].id, "from_bin_id": bins[0].id, "to_bin_id": bins[1].id, "quantity": 99},
+    ]
+
+    with pytest.raises(StockServiceError) as exc:
+        BinStockService.apply_transfer_document(session, 1, lines)
+    session.rollback()
+
+    assert exc.value.status_code == 409
+    assert _qty(session, bins[1].id, products[0].id) == 0
+    assert session.exec(select(StockMovement)).all() == []
+
+
+def test_transfer_document_is_idempotent_by_request_id(session):
+    products, bins = _setup_bins(session)
+    lines = [{"product_id": products[0].id, "from_bin_id": bins[0].id, "to_bin_id": bins[1].id, "quantity": 2}]
+
+    first = BinStockService.apply_transfer_document(session, 1, lines, request_id="doc-1")
+    second = BinStockService.apply_transfer_document(session, 1, lines, request_id="doc-1")
+
+    assert second == {"ok": True, "idempotent": True, "document_id": first["document_id"]}
+    assert _qty(session, bins[1].id, products[0].id) == 2
+
+
+def test_adjustment_document_syncs_global_stock(session):
+    products, bins = _setup_bins(session)
+    lines = [
+        {"bin_id": bins[0].id, "product_id": products[0].id, "quantity": 7},
+        {"bin_id": bins[2].id, "product_id": products[0].id, "quantity": 5},
+        {"bin_id": bins[0].id, "product_id": products[1].id, "quantity": 10},
+    ]
+
+    result = BinStockService.apply_adjustment_document(session, 1, lines)
+
+    assert result["movements"] == 2
+    session.refresh(products[0])
+    session.refresh(products[1])
+    assert products[0].stock_quantity == 12
+    assert products[1].stock_quantity == 10
+
+
+# --------------- request_id idempotency ---------------
+
+def test_transfer_stock_replay_does_not_move_twice(session):
+    products, bins = _setup_bins(session)
+    pid = products[0].id
+
+    first = BinStockService.transfer_stock(session, 1, pid, bins[0].id, bins[1].id, 3, request_id="t-1")
+    second = BinStockService.transfer_stock(session, 1, pid, bins[0].id, bins[1].id, 3, request_id="t-1")
+
+    assert second == {"ok": True, "idempotent": True, "movement_id": first["movement_id"]}
+    assert _qty(session, bins[0].id, pid) == 7
+    assert _qty(session, bins[1].id, pid) == 3
+    assert len(session.exec(select(StockMovement)).all()) == 1
+
+
+def test_transfer_stock_failed_claim_is_released(session):
+    products, bins = _setup_bins(session)
+    pid = products[0].id
+
+    with pytest.raises(StockServiceError):
+        BinStockService.transfer_stock(session, 1, pid, bins[0].id, bins[1].id, 99, request_id="t-2")
+    retry = BinStockService.transfer_stock(session, 1, pid, bins[0].id, bins[1].id, 5, request_id="t-2")
+
+    assert "idempotent" not in retry
+    assert _qty(session, bins[1].id, pid) == 5
+
+
+def test_adjust_stock_replay_does_not_adjust_twice(session):
+    products, bins = _setup_bins(session)
+    pid = products[0].id
+
+    first = BinStockService.adjust_stock(session, 1, bins[0].id, pid, 4, request_id="a-1")
+    second = BinStockService.adjust_stock(session, 1, bins[0].id, pid, 8, request_id="a-1")
+
+    assert first["new_quantity"] == 4
+    assert second["idempotent"] is True
+    assert _qty(session, bins[0].id, pid) == 4
+
+
+def test_adjust_stock_applies_a_sql_delta_to_global_stock(session):
+    """A stale Product in the session must not overwrite a concurrent stock change."""
+    products, bins = _setup_bins(session)
+    pid = products[0].id
+    stale = session.get(Product, pid)
+    before = stale.stock_quantity
+    # Concurrent sale committed through core, invisible to the loaded Product
+    session.connection().exec_driver_sql(f"UPDATE product SET stock_quantity = stock_quantity - 3 WHERE id = {pid}")
+
+    BinStockService.adjust_stock(session, 1, bins[0].id, pid, _qty(session, bins[0].id, pid) + 2)
+
+    session.expire_all()
+    assert session.get(Product, pid).stock_quantity == before - 3 + 2
+
+
+def test_request_id_is_scoped_per_tenant(session):
+    products, bins = _setup_bins(session)
+    session.add(StockMovement(tenant_id=2, product_id=products[0].id, to_bin_id=bins[2].id, quantity=1, reason="ajuste", request_id="shared"))
+    session.commit()
+
+    result = BinStockService.transfer_stock(
+        session, 1, products[0].id, bins[0].id, bins[1].id, 1, request_id="shared"
+    )
+
+    assert "idempotent" not in result
@@ -0,0 +1,90 @@
+"""Tests for the client ledger import — one sheet per client, opening balances, process pool."""
+
+import pytest
+from openpyxl import Workbook
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from database.models import Client, ImportJob, Sale, Tenant
+from services import client_ledger_import, import_jobs
+from services.client_ledger_import import import_ledger, scan_workbook
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    wb = Workbook()
+    wb.remove(wb.active)
+    sheets = {
+        "Juan Pérez ": [("Fecha", "Debe", "Restan"), ("01/01", 1000, 1000), ("02/01", 500, 1500), (None, None, None)],
+        "Ana": [("Fecha", "Saldo"), ("01/01", "200,50")],
+        "Beto": [("Fecha", "Saldo"), ("01/01", 300)],
+        "Carla": [("Fecha", "Importe"), ("01/01", 10)],
+        "juan perez": [("Fecha", "Restan"), ("01/01", 999)],
+        "Malo": [("Fecha", "Restan"), ("01/01", "abc")],
+    }
+    for name, rows in sheets.items():
+        ws = wb.create_sheet(name)
+        for row in rows:
+            ws.append(row)
+    path = tmp_path / "clientes.xlsx"
+    wb.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ledger.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add(Tenant(id=1, name="Test"))
+        s.add_all([Client(id=1, tenant_id=1, name="ana"), Client(id=2, tenant_id=1, name="Beto")])
+        s.add(Sale(tenant_id=1, client_id=2, total_amount=50.0))
+        s.commit()
+    return engine
+
+
+def test_scan_reads_last_balance_of_each_sheet(workbook):
+    progress = []
+    results = scan_workbook(workbook, workers=1, progress=lambda done, total: progress.append((done, total)))
+
+    assert [(r["sheet"], r.get("value")) for r in results] == [
+        ("Juan Pérez ", 1500), ("Ana", "200,50"), ("Beto", 300), ("Carla", None), ("juan perez", 999), ("Malo", "abc"),
+    ]
+    assert progress[-1] == (6, 6)
+
+
+def test_process_pool_returns_sheets_in_workbook_order(workbook, monkeypatch):
+    monkeypatch.setattr(client_ledger_import, "MIN_SHEETS_FOR_POOL", 1)
+    monkeypatch.setattr(client_ledger_import, "SHEETS_PER_TASK", 2)
+
+    assert scan_workbook(workbook, workers=2) == scan_workbook(workbook, workers=1)
+
+
+def test_import_creates_clients_and_opening_balances_in_bulk(engine, workbook):
+    with Session(engine) as s:
+        result = import_ledger(s, 1, workbook, workers=1)
+
+        assert (result["added"], result["updated"], result["opening_balances"], result["sheets_processed"]) == (2, 2, 2, 6)
+        assert result["errors"] == ["Sheet Malo: saldo inválido"]
+        clients = {c.name: c.id for c in s.exec(select(Client)).all()}
+        assert set(clients) == {"ana", "Beto", "Juan Pérez", "Carla"}
+        sales = s.exec(select(Sale).where(Sale.payment_status == "pending").order_by(Sale.client_id)).all()
+        assert [(sale.client_id, sale.total_amount, sale.payment_method) for sale in sales] == [
+            (1, 200.5, "account"), (clients["Juan Pérez"], 1500.0, "account"),
+        ]
+
+        # Reimportar no duplica clientes ni saldos
+        again = import_ledger(s, 1, workbook, workers=1)
+        assert (again["added"], again["opening_balances"]) == (0, 0)
+
+
+def test_background_job_reports_sheet_progress(engine, workbook, tmp_path, monkeypatch):
+    monkeypatch.setattr(import_jobs, "IMPORT_DIR", tmp_path / "imports")
+    with Session(engine) as s:
+        with open(workbook, "rb") as fh:
+            job_id = import_jobs.create_job(s, 1, None, "client_ledger", fh, "clientes.xlsx").id
+
+    assert import_jobs.run_job(job_id, engine) == "completed"
+    with Session(engine) as s:
+        job = s.get(ImportJob, job_id)
+        assert (job.total_rows, job.processed_rows, job.added, job.updated, job.error_count) == (6, 6, 2, 2, 1)
+        assert len(s.exec(select(Sale)).all()) == 3
@@ -0,0 +1,121 @@
+"""Tests for CycleCountService — weighted task sampling and bulk count submission."""
+
+from datetime import date
+
+import numpy as np
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from database.models import Bin, BinStock, CycleCountTask, Location, Product, StockMovement, Tenant
+from services.bin_stock_service import StockServiceError
+from services.cycle_count_service import CycleCountService
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add(Tenant(id=1, name="Test"))
+        s.add(Location(id=1, tenant_id=1, name="Central"))
+        s.commit()
+        yield s
+
+
+def _stock_slots(session, n, cost=1.0):
+    products, bins = [], []
+    for i in range(n):
+        product = Product(tenant_id=1, name=f"P{i}", barcode=f"B{i}", stock_quantity=10, cost_price=cost)
+        bin_ = Bin(tenant_id=1, location_id=1, name=f"A-{i}", aisle="A", shelf=str(i))
+        session.add_all([product, bin_])
+        products.append(product)
+        bins.append(bin_)
+    session.flush()
+    for product, bin_ in zip(products, bins):
+        session.add(BinStock(tenant_id=1, bin_id=bin_.id, product_id=product.id, quantity=10))
+    session.commit()
+    return products, bins
+
+
+def test_weighted_sample_prefers_heavy_items():
+    weights = np.array([100.0] + [1.0] * 99)
+    rng = np.random.default_rng(0)
+
+    hits = sum(0 in CycleCountService.weighted_sample(weights, 5, rng) for _ in range(200))
+
+    assert hits > 190
+
+
+def test_generation_is_idempotent_per_day(session):
+    _stock_slots(session, 10)
+    day = date(2026, 1, 5)
+
+    first = CycleCountService.generate_daily_tasks(session, 1, day, count=4, seed=1)
+    again = CycleCountService.generate_daily_tasks(session, 1, day, count=4, seed=2)
+    more = CycleCountService.generate_daily_tasks(session, 1, day, count=6, seed=3)
+
+    tasks = session.exec(select(CycleCountTask)).all()
+    assert (first["created"], again["created"], more["created"]) == (4, 0, 2)
+    assert len({(t.bin_id, t.product_id) for t in tasks}) == 6
+
+
+def test_submit_counts_applies_variances_in_one_document(session):
+    products, bins = _stock_slots(session, 3)
+    CycleCountService.generate_daily_tasks(session, 1, date(2026, 1, 5), count=3, seed=1)
+    tasks = {t.product_id: t for t in session.exec(select(CycleCountTask)).all()}
+    counts = [
+        {"task_id": tasks[products[0].id].id, "counted_quantity": 10},
+        {"task_id": tasks[products[1].id].id, "counted_quantity": 7},
+        {"task_id": tasks[products[2].id].id, "counted_quantity": 12},
+    ]
+
+    result = CycleCountService.submit_counts(session, 1, counts, request_id="cc-1")
+
+    assert (result["counted"], result["adjusted"]) == (3, 2)
+    session.expire_all()
+    assert [session.get(Product, p.id).stock_quantity for p in products] == [10, 7, 12]
+    movements = session.exec(select(StockMovement)).all()
+    assert {m.document_id for m in movements} == {result["document_id"]}
+    assert {m.reason for m in movements} == {"conteo_ciclico"}
+    assert sorted(t.variance for t in session.exec(select(CycleCountTask)).all()) == [-3, 0, 2]
+
+    # Reintento del mismo lote: no vuelve a ajustar
+    assert CycleCountService.submit_counts(session, 1, counts, request_id="cc-1")["idempotent"] is True
+    assert len(session.exec(select(StockMovement)).all()) == 2
+
+    summary = CycleCountService.summary(session, 1, date(2026, 1, 1))
+    assert (summary["counted"], summary["with_variance"], summary["absolute_variance"]) == (3, 2, 5)
+
+
+def test_reused_request_id_leaves_new_tasks_pending(session):
+    products, bins = _stock_slots(session, 2)
+    CycleCountService.generate_daily_tasks(session, 1, date(2026, 1, 5), count=2, seed=1)
+    first, second = session.exec(select(CycleCountTask).order_by(CycleCountTask.id)).all()
+
+    CycleCountService.submit_counts(session, 1, [{"task_id": first.id, "counted_quantity": 8}], request_id="cc-1")
+    again = CycleCountService.submit_counts(session, 1, [{"task_id": first.id, "counted_quantity": 8}], request_id="cc-1")
+    assert again["idempotent"] is True
+
+    with pytest.raises(StockServiceError) as exc:
+        CycleCountService.submit_counts(session, 1, [{"task_id": second.id, "counted_quantity": 5}], request_id="cc-1")
+    assert exc.value.status_code == 409
+
+    session.expire_all()
+    assert session.get(CycleCountTask, second.id).status == "pending"
+    assert len(session.exec(select(StockMovement)).all()) == 1
+
+
+def test_failed_adjustment_leaves_tasks_pending(session):
+    products, bins = _stock_slots(session, 1)
+    bins[0].max_capacity = 10
+    session.add(bins[0])
+    session.commit()
+    CycleCountService.generate_daily_tasks(session, 1, date(2026, 1, 5), count=1)
+    task = session.exec(select(CycleCountTask)).one()
+
+    with pytest.raises(StockServiceError):
+        CycleCountService.submit_counts(session, 1, [{"task_id": task.id, "counted_quantity": 11}])
+
+    session.expire_all()
+    assert session.get(CycleCountTask, task.id).status == "pending"
+    assert session.get(BinStock, 1).quantity == 10
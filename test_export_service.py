@@ -0,0 +1,70 @@
+"""Tests for the streaming exporters — CSV chunks, write-only XLSX and lazy query iteration."""
+
+import csv
+import io
+
+import pytest
+from openpyxl import load_workbook
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine
+
+from database.models import Client, Product, Tenant
+from services import export_service
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add_all([Tenant(id=1, name="Test"), Tenant(id=2, name="Otro")])
+        s.add_all([
+            Product(tenant_id=1, name=f"Producto {i}", barcode=f"B{i}", price=10.0 + i, stock_quantity=i)
+            for i in range(50)
+        ])
+        s.add(Product(tenant_id=2, name="Ajeno", barcode="X"))
+        s.add(Client(tenant_id=1, name="José", cuit="20-1"))
+        s.commit()
+    return engine
+
+
+def test_csv_is_sent_in_chunks_while_rows_are_read(engine, monkeypatch):
+    monkeypatch.setattr(export_service, "CHUNK_SIZE", 200)
+    monkeypatch.setattr(export_service, "YIELD_PER", 10)
+    body, media_type, ext = export_service.products_export(1, "csv", engine)
+
+    chunks = list(body)
+    assert (media_type, ext) == (export_service.CSV_MEDIA_TYPE, "csv")
+    assert len(chunks) > 5
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8-sig"))))
+    assert rows[0] == list(export_service.PRODUCT_COLUMNS)
+    assert len(rows) == 51
+    assert rows[1][1:3] == ["Producto 0", ""]
+
+
+def test_query_runs_only_when_the_response_is_consumed(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    body, _, _ = export_service.clients_export(1, "csv", engine)
+    assert statements == []
+
+    text = b"".join(body).decode("utf-8-sig")
+    assert len(statements) == 1
+    assert "José" in text
+
+
+def test_xlsx_export_has_all_rows_and_multiple_sheets(engine):
+    body, media_type, ext = export_service.products_export(1, "xlsx", engine)
+    workbook = load_workbook(io.BytesIO(b"".join(body)), read_only=True)
+    rows = list(workbook["productos"].iter_rows(values_only=True))
+    assert ext == "xlsx"
+    assert rows[0] == tuple(export_service.PRODUCT_COLUMNS)
+    assert len(rows) == 51
+
+    sheets = [
+        ("ventas", *export_service.dict_rows([{"day": "2026-01-01", "total": 5.0}], ["day", "total"])),
+        ("vacia", *export_service.dict_rows([], ["name", "balance"])),
+    ]
+    workbook = load_workbook(io.BytesIO(b"".join(export_service.xlsx_stream(sheets))))
+    assert list(workbook["ventas"].values) == [("day", "total"), ("2026-01-01", 5.0)]
+    assert list(workbook["vacia"].values) == [("name", "balance")]
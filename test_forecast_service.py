@@ -0,0 +1,117 @@
+"""Tests for ForecastService — demand matrix, vectorized forecasts, reorder points and supplier suggestions."""
+
+from datetime import timedelta
+
+import numpy as np
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from database.models import Product, Purchase, PurchaseItem, ReorderSuggestion, Sale, SaleItem, Settings, Supplier, Tenant
+from services import time_windows
+from services.errors import ServiceError
+from services.forecast_service import ForecastService
+
+ZONE = time_windows.get_zone("America/Argentina/Buenos_Aires")
+TODAY = time_windows.local_today(ZONE)
+
+
+def _at(days_ago: int):
+    return time_windows.day_start(TODAY - timedelta(days=days_ago), ZONE) + timedelta(hours=12)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    time_windows.forget()
+    with Session(engine) as s:
+        s.add(Tenant(id=1, name="Test"))
+        s.add(Settings(tenant_id=1, timezone="America/Argentina/Buenos_Aires"))
+        s.add(Supplier(id=1, tenant_id=1, name="Distribuidora"))
+        s.add_all([
+            # 4 por día los últimos 30 días, en bultos de 6
+            Product(id=1, tenant_id=1, name="Rápido", barcode="R", stock_quantity=10, cant_bulto=6, cost_price=2.0),
+            # Se vendió una vez hace mucho: stock de sobra
+            Product(id=2, tenant_id=1, name="Lento", barcode="L", stock_quantity=50, cost_price=1.0),
+            Product(id=3, tenant_id=1, name="Sin ventas", barcode="S", stock_quantity=0, min_stock_level=5),
+        ])
+        s.add(Purchase(id=1, tenant_id=1, supplier_id=1, timestamp=_at(60)))
+        s.add(PurchaseItem(purchase_id=1, product_id=1, product_name="Rápido", quantity=100, unit_cost=1.5, total=150.0))
+        for days_ago in range(1, 31):
+            sale = Sale(tenant_id=1, total_amount=4.0, timestamp=_at(days_ago))
+            s.add(sale)
+            s.flush()
+            s.add(SaleItem(sale_id=sale.id, product_id=1, product_name="Rápido", quantity=4, unit_price=1.0, total=4.0))
+        sale = Sale(tenant_id=1, total_amount=1.0, timestamp=_at(200))
+        s.add(sale)
+        s.flush()
+        s.add(SaleItem(sale_id=sale.id, product_id=2, product_name="Lento", quantity=1, unit_price=1.0, total=1.0))
+        s.commit()
+        yield s
+
+
+def test_forecast_ignores_days_before_first_sale():
+    matrix = np.array([
+        [0, 0, 0, 0, 2, 2, 2, 2],
+        [1, 1, 1, 1, 1, 1, 1, 9],
+    ], dtype=np.float32)
+
+    sma, std = ForecastService.forecast(matrix, "sma", window=4)
+    assert sma.tolist() == [2.0, 3.0]
+    assert std[0] == 0.0
+
+    ses, _ = ForecastService.forecast(matrix, "ses", alpha=0.5)
+    assert ses[0] == pytest.approx(2.0)
+    assert ses[1] == pytest.approx(5.0)
+
+    with pytest.raises(ServiceError):
+        ForecastService.forecast(matrix, "arima")
+
+
+def test_reorder_points_round_up_to_pack():
+    points = ForecastService.reorder_points(
+        forecast=np.array([4.0, 4.0]), std=np.array([0.0, 0.0]),
+        stock=np.array([10.0, 100.0]), pack=np.array([6.0, np.nan]),
+        lead_time_days=7, review_days=7,
+    )
+    assert points["reorder_point"].tolist() == [28.0, 28.0]
+    # Objetivo 56 - stock 10 = 46 -> 8 bultos de 6
+    assert points["suggested"].tolist() == [48, 0]
+
+
+def test_run_writes_suggestions_and_min_stock(session):
+    result = ForecastService.run(session, 1, method="sma", history_days=365, window=28, update_min_stock=True)
+
+    assert (result["products"], result["to_reorder"]) == (2, 1)
+    suggestions = {s.product_id: s for s in session.exec(select(ReorderSuggestion)).all()}
+    fast = suggestions[1]
+    assert fast.forecast_daily == pytest.approx(4.0)
+    assert (fast.supplier_id, fast.unit_cost, fast.suggested_quantity) == (1, 1.5, 48)
+    assert suggestions[2].suggested_quantity == 0 and suggestions[2].supplier_id is None
+
+    levels = dict(session.exec(select(Product.id, Product.min_stock_level)).all())
+    assert levels[1] == 28
+    assert levels[2] == 1  # sin demanda reciente: solo el stock de seguridad
+    assert levels[3] == 5  # sin historial: conserva su nivel manual
+
+    groups = ForecastService.suggestions_by_supplier(session, 1)
+    assert [(g["supplier_name"], g["estimated_cost"]) for g in groups] == [("Distribuidora", 72.0)]
+    assert groups[0]["items"][0]["suggested_quantity"] == 48
+
+
+def test_run_if_due_runs_once_per_day(session):
+    assert ForecastService.run_if_due(session, 1, method="sma") is not None
+    assert ForecastService.run_if_due(session, 1, method="sma") is None
+
+
+def test_manual_min_stock_levels_are_kept_by_default(session):
+    session.get(Product, 1).min_stock_level = 3
+    session.commit()
+
+    assert ForecastService.run(session, 1, method="sma")["min_stock_updated"] == 0
+    session.expire_all()
+    assert session.get(Product, 1).min_stock_level == 3
+    assert session.exec(select(ReorderSuggestion).where(ReorderSuggestion.product_id == 1)).one().reorder_point == pytest.approx(28)
+
+    with pytest.raises(ServiceError):
+        ForecastService.run(session, 1, history_days=10_000)
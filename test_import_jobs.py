@@ -0,0 +1,145 @@
+"""Tests for background import jobs — chunked commits, cancellation and resume."""
+
+import io
+import time
+
+import pandas as pd
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from database.models import ImportJob, Product, Tenant
+from services import import_jobs
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(import_jobs, "IMPORT_DIR", tmp_path)
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add(Tenant(id=1, name="Test"))
+        s.commit()
+    return engine
+
+
+def _csv(rows):
+    df = pd.DataFrame({"name": [f"P{i}" for i in range(rows)], "barcode": [f"B{i}" for i in range(rows)], "price": 10})
+    return io.BytesIO(df.to_csv(index=False).encode())
+
+
+def _job(engine, rows=25, chunk_size=10, **changes):
+    with Session(engine) as s:
+        job = import_jobs.create_job(s, 1, None, "products", _csv(rows), "lista.csv", chunk_size)
+        for key, value in changes.items():
+            setattr(job, key, value)
+        s.add(job)
+        s.commit()
+        return job.id
+
+
+def test_job_processes_all_chunks(engine):
+    job_id = _job(engine)
+
+    assert import_jobs.run_job(job_id, engine) == "completed"
+    assert import_jobs.run_job(job_id, engine) is None  # ya no está en cola
+
+    with Session(engine) as s:
+        job = s.get(ImportJob, job_id)
+        assert (job.total_rows, job.processed_rows, job.last_chunk, job.added) == (25, 25, 2, 25)
+        assert len(s.exec(select(Product)).all()) == 25
+
+
+def test_cancel_before_start(engine):
+    job_id = _job(engine)
+    with Session(engine) as s:
+        assert import_jobs.request_cancel(s, 1, job_id).status == "cancelled"
+
+    assert import_jobs.run_job(job_id, engine) is None
+
+
+def test_running_job_stops_at_cancel_flag_and_resumes_from_last_chunk(engine):
+    job_id = _job(engine, status="queued", cancel_requested=True)
+    assert import_jobs.run_job(job_id, engine) == "cancelled"
+
+    # Reanudación con el chunk 0 ya confirmado: solo se procesan los siguientes
+    with Session(engine) as s:
+        job = s.get(ImportJob, job_id)
+        job.status, job.cancel_requested, job.last_chunk, job.processed_rows = "queued", False, 0, 10
+        s.add(job)
+        s.commit()
+
+    assert import_jobs.run_job(job_id, engine) == "completed"
+    with Session(engine) as s:
+        names = {p.name for p in s.exec(select(Product)).all()}
+        job = s.get(ImportJob, job_id)
+    assert names == {f"P{i}" for i in range(10, 25)}
+    assert (job.processed_rows, job.added) == (25, 15)
+
+
+def test_failed_chunk_is_rolled_back_and_job_can_resume(engine, monkeypatch):
+    job_id = _job(engine)
+    original = import_jobs.ProductImportService.import_frame
+    calls = []
+
+    def flaky(session, tenant_id, df, *args, **kwargs):
+        calls.append(len(df))
+        if len(calls) == 2:
+            session.add(Product(tenant_id=1, name="parcial", barcode="PARCIAL"))
+            session.flush()
+            raise RuntimeError("se cortó la conexión")
+        return original(session, tenant_id, df, *args, **kwargs)
+
+    monkeypatch.setattr(import_jobs.ProductImportService, "import_frame", flaky)
+    assert import_jobs.run_job(job_id, engine) == "failed"
+    with Session(engine) as s:
+        job = s.get(ImportJob, job_id)
+        assert (job.last_chunk, job.processed_rows, job.message) == (0, 10, "se cortó la conexión")
+        assert s.exec(select(Product).where(Product.barcode == "PARCIAL")).first() is None
+        monkeypatch.setattr(import_jobs, "submit", lambda job_id: None)
+        import_jobs.resume(s, 1, job_id)
+
+    assert import_jobs.run_job(job_id, engine) == "completed"
+    with Session(engine) as s:
+        assert len(s.exec(select(Product)).all()) == 25
+
+
+def test_slow_chunk_keeps_the_heartbeat_fresh(engine, monkeypatch):
+    job_id = _job(engine, rows=5)
+    monkeypatch.setattr(import_jobs, "HEARTBEAT_INTERVAL", 0.02)
+    original = import_jobs.ProductImportService.import_frame
+    beats = []
+
+    def slow(session, tenant_id, df, *args, **kwargs):
+        with Session(engine) as other:
+            beats.append(other.get(ImportJob, job_id).heartbeat_at)
+            time.sleep(0.2)
+            other.expire_all()
+            beats.append(other.get(ImportJob, job_id).heartbeat_at)
+        return original(session, tenant_id, df, *args, **kwargs)
+
+    monkeypatch.setattr(import_jobs.ProductImportService, "import_frame", slow)
+    assert import_jobs.run_job(job_id, engine) == "completed"
+    assert beats[1] > beats[0]
+
+
+def test_excel_rows_are_counted_from_the_sheet_dimension(tmp_path):
+    path = tmp_path / "lista.xlsx"
+    pd.DataFrame({"name": [f"P{i}" for i in range(7)], "price": 1}).to_excel(path, index=False)
+
+    assert import_jobs.count_rows(str(path)) == 7
+
+
+def test_excel_chunks_are_streamed_without_read_excel(tmp_path, monkeypatch):
+    path = tmp_path / "lista.xlsx"
+    pd.DataFrame({"name": [f"P{i}" for i in range(7)], "price": range(7)}).to_excel(path, index=False)
+
+    def whole_sheet(*args, **kwargs):
+        raise AssertionError("the sheet must not be loaded in one DataFrame")
+
+    monkeypatch.setattr(import_jobs.pd, "read_excel", whole_sheet)
+    chunks = list(import_jobs.iter_chunks(str(path), 3))
+
+    assert [(index, start, len(frame)) for index, frame, start in chunks] == [(0, 2, 3), (1, 5, 3), (2, 8, 1)]
+    assert list(chunks[1][1].columns) == ["name", "price"]
+    assert chunks[1][1]["name"].tolist() == ["P3", "P4", "P5"]
+    assert chunks[2][1]["price"].tolist() == [6]
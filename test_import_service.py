@@ -0,0 +1,209 @@
+"""Tests for the import services — vectorized normalization, bulk upsert and streamed CSV."""
+
+import io
+
+import pandas as pd
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from database.models import Client, Product, StockLedgerEntry, Tenant
+from services.import_service import ClientImportService, ProductImportService, read_csv_chunks
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add_all([Tenant(id=1, name="Test"), Tenant(id=2, name="Otro")])
+        s.add_all([
+            Product(id=1, tenant_id=1, name="Ojota", barcode="779001", item_number="210", price=100, stock_quantity=5,
+                    category="Verano"),
+            Product(id=2, tenant_id=1, name="Faja", barcode="779002", item_number="795", price=200, stock_quantity=1),
+            Product(id=3, tenant_id=2, name="Ajeno", barcode="999", price=1),
+        ])
+        s.commit()
+    return engine
+
+
+def _products(session):
+    session.expire_all()
+    return {p.id: p for p in session.exec(select(Product).where(Product.tenant_id == 1)).all()}
+
+
+def test_updates_inserts_and_row_errors(engine):
+    df = pd.DataFrame({
+        "Nombre": ["Ojota nueva", "Faja", "Gomón", "Sin código", None, "Mala", "Ajeno", "Faja 2"],
+        "Código": [779001, None, "779003", None, "x", "779004", "999", None],
+        "Artículo": [None, "795", None, None, None, None, None, "795"],
+        "Precio": ["150,5", None, 300, 10, 1, "abc", 1, 250],
+        "Stock": [8, 3, 4, None, 1, 1, 1, None],
+    })
+    with Session(engine) as s:
+        result = ProductImportService.import_frame(s, 1, df, row_offset=2)
+        products = _products(s)
+
+    assert (result["added"], result["updated"]) == (2, 2)
+    assert [(e["row"], e["error"]) for e in result["errors"]] == [
+        (3, "fila duplicada en el archivo (se usa la última)"),
+        (6, "sin nombre"),
+        (7, "valor inválido en price"),
+        (8, "el código 999 ya existe en otra empresa"),
+    ]
+    assert (products[1].name, products[1].price, products[1].stock_quantity, products[1].category) == (
+        "Ojota nueva", 150.5, 8, "Verano"
+    )
+    # Celdas vacías no pisan: stock de la Faja queda en 1, precio pasa a 250
+    assert (products[2].name, products[2].price, products[2].stock_quantity) == ("Faja 2", 250, 1)
+    new = {p.name: p for p in products.values() if p.id > 3}
+    assert new["Gomón"].barcode == "779003"
+    assert new["Sin código"].barcode == str(new["Sin código"].id).zfill(8)
+
+    with Session(engine) as s:
+        ledger = {(e.product_id, e.delta) for e in s.exec(select(StockLedgerEntry).where(StockLedgerEntry.reason == "importacion")).all()}
+    assert ledger == {(1, 3), (new["Gomón"].id, 4)}
+
+
+def test_import_uses_constant_number_of_statements(engine):
+    df = pd.DataFrame({"name": [f"P{i}" for i in range(500)], "barcode": [f"B{i}" for i in range(500)], "price": 1.0})
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    with Session(engine) as s:
+        result = ProductImportService.import_frame(s, 1, df)
+
+    assert result["added"] == 500
+    assert len(statements) < 10
+
+
+def test_match_by_name_when_barcode_missing(engine):
+    df = pd.DataFrame({"nombre": ["Faja"], "precio": [999], "costo": [500]})
+    with Session(engine) as s:
+        result = ProductImportService.import_frame(s, 1, df, match_on=("barcode", "name"))
+        products = _products(s)
+
+    assert (result["added"], result["updated"]) == (0, 1)
+    assert (products[2].price, products[2].cost_price) == (999, 500)
+
+
+def test_new_barcode_is_a_new_product_even_with_a_known_name(engine):
+    df = pd.DataFrame({"nombre": ["Faja"], "codigo": ["NUEVO-1"], "precio": [5]})
+    with Session(engine) as s:
+        result = ProductImportService.import_frame(s, 1, df, match_on=("barcode", "name"))
+        products = _products(s)
+
+    assert (result["added"], result["updated"]) == (1, 0)
+    assert products[2].price == 200
+    assert {p.name for p in products.values()} >= {"Faja"} and len(products) == 3
+
+
+def test_updates_that_take_a_used_barcode_are_row_errors(engine):
+    """An update matched by item number must not move onto another product's barcode."""
+    df = pd.DataFrame({"nombre": ["Faja", "Ojota"], "codigo": ["999", "779002"], "articulo": ["795", "210"]})
+    with Session(engine) as s:
+        result = ProductImportService.import_frame(s, 1, df, match_on=("item_number", "barcode"), row_offset=2)
+        products = _products(s)
+
+    assert (result["added"], result["updated"]) == (0, 0)
+    assert [(e["row"], e["error"]) for e in result["errors"]] == [
+        (2, "el código 999 ya existe en otra empresa"),
+        (3, "el código 779002 ya lo usa otro producto"),
+    ]
+    assert (products[1].barcode, products[2].barcode) == ("779001", "779002")
+
+    df = pd.DataFrame({"nombre": ["Nuevo", "Faja"], "codigo": ["N1", "N1"], "articulo": [None, "795"]})
+    with Session(engine) as s:
+        result = ProductImportService.import_frame(s, 1, df, row_offset=2)
+        products = _products(s)
+
+    assert (result["added"], result["updated"]) == (0, 1)
+    assert [(e["row"], e["error"]) for e in result["errors"]] == [
+        (2, "el código N1 está repetido en otra fila del archivo"),
+    ]
+    assert products[2].barcode == "N1" and len(products) == 2
+
+
+def test_streamed_csv_is_imported_chunk_by_chunk(engine):
+    lines = ["Código;Nombre;Precio"] + [f"00{i};Artículo {i};{i},50" for i in range(25)]
+    source = io.BytesIO("\n".join(lines).encode("latin-1"))
+    commits = []
+    with Session(engine) as s:
+        event.listen(s, "after_commit", lambda session: commits.append(1))
+        result = ProductImportService.import_csv_stream(s, 1, source, chunk_size=10)
+        products = {p.barcode: p for p in _products(s).values()}
+
+    assert (result["rows"], result["added"], result["error_count"]) == (25, 25, 0)
+    assert len(commits) == 3
+    assert products["003"].name == "Artículo 3"
+    assert products["003"].price == 3.5
+
+
+def test_latin1_byte_after_the_sniffed_sample_is_read(engine):
+    body = "".join(f"A{i};Artículo {i};1\n" for i in range(3000)).encode("utf-8")
+    source = io.BytesIO(b"Codigo;Nombre;Precio\n" + body + "Z1;Año nuevo;2\n".encode("latin-1"))
+    assert len(body) > 64 * 1024
+    with Session(engine) as s:
+        result = ProductImportService.import_csv_stream(s, 1, source, chunk_size=1000)
+        names = {p.barcode: p.name for p in _products(s).values()}
+
+    assert (result["rows"], result["partial"]) == (3001, False)
+    assert (names["A5"], names["Z1"]) == ("Artículo 5", "Año nuevo")
+
+
+def test_unreadable_tail_reports_a_partial_import(engine):
+    lines = ["Código;Nombre;Precio"] + [f"C{i};Artículo {i};1" for i in range(20)] + ['X;"rota;1', "Y;b;2"]
+    with Session(engine) as s:
+        result = ProductImportService.import_csv_stream(s, 1, io.BytesIO("\n".join(lines).encode()), chunk_size=10)
+
+    assert (result["added"], result["partial"]) == (20, True)
+    assert result["message"].startswith("Lectura interrumpida a partir de la fila 22")
+
+
+def test_csv_reader_is_lazy():
+    source = io.BytesIO(("name,price\n" + "x,1\n" * 100).encode())
+    chunks = read_csv_chunks(source, chunk_size=30)
+
+    first = next(chunks)
+    assert len(first) == 30
+    assert sum(len(c) for c in chunks) == 70
+
+
+def test_clients_match_by_cuit_then_accent_insensitive_name(engine):
+    with Session(engine) as s:
+        s.add_all([
+            Client(id=1, tenant_id=1, name="José Pérez", phone="111"),
+            Client(id=2, tenant_id=1, name="Comercial Norte SA", cuit="30-71234567-8"),
+            Client(id=3, tenant_id=2, name="jose perez"),
+        ])
+        s.commit()
+
+    df = pd.DataFrame({
+        "Nombre": ["JOSE  PEREZ", "Norte (nuevo nombre)", "Cliente Nuevo", "cliente nuevo", None, "Límite malo"],
+        "CUIT": [None, "30712345678", "20-11111111-1", None, None, None],
+        "Teléfono": [None, "222", "333", "444", None, None],
+        "Límite de crédito": [None, "1500,5", None, None, None, "mucho"],
+    })
+    with Session(engine) as s:
+        result = ClientImportService.import_frame(s, 1, df, row_offset=2)
+        s.expire_all()
+        clients = {c.id: c for c in s.exec(select(Client).where(Client.tenant_id == 1)).all()}
+
+    assert (result["added"], result["updated"]) == (1, 2)
+    assert [(r["row"], r["action"], r.get("matched_by")) for r in result["report"]] == [
+        (2, "updated", "name"), (3, "updated", "cuit"), (4, "skipped", None), (5, "added", None), (7, "error", None),
+    ]
+    assert clients[1].phone == "111"
+    assert (clients[2].name, clients[2].phone, clients[2].credit_limit) == ("Comercial Norte SA", "222", 1500.5)
+    new = [c for c in clients.values() if c.id > 3]
+    assert [(c.name, c.phone, c.cuit) for c in new] == [("cliente nuevo", "444", "20-11111111-1")]
+
+
+def test_client_import_uses_constant_number_of_statements(engine):
+    df = pd.DataFrame({"Name": [f"Cliente {i}" for i in range(300)], "Phone": "1"})
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    with Session(engine) as s:
+        result = ClientImportService.import_frame(s, 1, df)
+
+    assert result["added"] == 300
+    assert len(statements) < 10
@@ -0,0 +1,98 @@
+"""Tests for the partitioned Parquet export used for offline analytics."""
+
+from datetime import date, datetime
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+
+from database.models import CashMovement, Client, Payment, Sale, SaleItem, Tenant
+from services import parquet_export
+from services.errors import ServiceError
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add_all([Tenant(id=1, name="Test"), Tenant(id=2, name="Otro")])
+        s.add(Client(id=1, tenant_id=1, name="Ana"))
+        s.add_all([
+            Sale(id=1, tenant_id=1, total_amount=100.0, timestamp=datetime(2026, 1, 31, 23, 0)),
+            Sale(id=2, tenant_id=1, total_amount=50.0, payment_method="card", timestamp=datetime(2026, 2, 1, 10, 0)),
+            Sale(id=3, tenant_id=1, total_amount=70.0, timestamp=datetime(2026, 3, 5)),
+            Sale(id=4, tenant_id=2, total_amount=999.0, timestamp=datetime(2026, 1, 15)),
+        ])
+        s.add_all([
+            SaleItem(sale_id=1, product_name="A", quantity=1, unit_price=100.0, total=100.0),
+            SaleItem(sale_id=2, product_name="A", quantity=2, unit_price=25.0, total=50.0),
+            SaleItem(sale_id=4, product_name="Z", quantity=1, unit_price=999.0, total=999.0),
+        ])
+        s.add(Payment(tenant_id=1, client_id=1, amount=30.0, date=datetime(2026, 2, 10)))
+        s.add(CashMovement(tenant_id=1, movement_type="in", amount=5.0, concept="x", timestamp=datetime(2026, 1, 2)))
+        s.commit()
+    return engine
+
+
+def test_export_partitions_by_month_and_tenant(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(parquet_export, "YIELD_PER", 1)
+    with Session(engine) as s:
+        result = parquet_export.export_tenant(s, 1, date(2026, 1, 1), date(2026, 2, 28), tmp_path)
+
+    assert {name: r["rows"] for name, r in result.items()} == {
+        "sale": 2, "sale_item": 2, "payment": 1, "cash_movement": 1, "purchase": 0, "stock_movement": 0,
+    }
+    sale_dir = tmp_path / "sale" / "tenant_id=1"
+    assert sorted(p.name for p in sale_dir.iterdir()) == ["month=2026-01", "month=2026-02"]
+
+    table = pq.read_table(sale_dir / "month=2026-02" / "part-20260101-20260228.parquet")
+    assert table.column("id").to_pylist() == [2]
+    assert str(table.schema.field("timestamp").type) == "timestamp[us, tz=UTC]"
+    metadata = pq.ParquetFile(sale_dir / "month=2026-02" / "part-20260101-20260228.parquet").metadata
+    column = metadata.row_group(0).column(table.schema.get_field_index("payment_method"))
+    assert column.compression == "ZSTD"
+    assert any("DICTIONARY" in encoding for encoding in column.encodings)
+
+    items = pq.read_table(tmp_path / "sale_item" / "tenant_id=1" / "month=2026-01" / "part-20260101-20260228.parquet")
+    assert items.column("sale_id").to_pylist() == [1]
+    assert items.schema.names[-1] == "sale_timestamp"
+
+
+def test_export_dataset_root_reads_with_hive_partitions(engine, tmp_path):
+    """tenant_id lives only in the path, so reading the dataset root must not clash."""
+    pd = pytest.importorskip("pandas")
+    with Session(engine) as s:
+        parquet_export.export_tenant(s, 1, date(2026, 1, 1), date(2026, 2, 28), tmp_path, ["sale", "payment"])
+
+    sales = pd.read_parquet(tmp_path / "sale")
+    assert sorted(sales["id"].tolist()) == [1, 2]
+    assert set(sales["tenant_id"].astype(str)) == {"1"}
+    assert "tenant_id" not in pq.read_schema(
+        tmp_path / "sale" / "tenant_id=1" / "month=2026-01" / "part-20260101-20260228.parquet"
+    ).names
+    assert len(pd.read_parquet(tmp_path / "payment")) == 1
+
+
+def test_export_uses_tenant_local_days(engine, tmp_path):
+    """The range and the month partition follow the tenant zone (Buenos Aires, UTC-3)."""
+    with Session(engine) as s:
+        # 2026-03-01 01:00 UTC is still 2026-02-28 in Buenos Aires
+        s.add(Sale(id=5, tenant_id=1, total_amount=10.0, timestamp=datetime(2026, 3, 1, 1, 0)))
+        # 2026-01-01 02:00 UTC is 2025-12-31 locally: outside the range
+        s.add(Sale(id=6, tenant_id=1, total_amount=10.0, timestamp=datetime(2026, 1, 1, 2, 0)))
+        s.commit()
+        result = parquet_export.export_tenant(s, 1, date(2026, 1, 1), date(2026, 2, 28), tmp_path, ["sale"])
+
+    assert result["sale"]["rows"] == 3
+    feb = pq.read_table(tmp_path / "sale" / "tenant_id=1" / "month=2026-02" / "part-20260101-20260228.parquet")
+    assert feb.column("id").to_pylist() == [2, 5]
+
+
+def test_export_validates_tables_and_range(engine, tmp_path):
+    with Session(engine) as s:
+        with pytest.raises(ServiceError):
+            parquet_export.export_tenant(s, 1, date(2026, 1, 1), date(2026, 1, 31), tmp_path, ["product"])
+        with pytest.raises(ServiceError):
+            parquet_export.export_tenant(s, 1, date(2026, 2, 1), date(2026, 1, 1), tmp_path)
@@ -0,0 +1,240 @@
+"""Tests for PickingService — bin allocation, serpentine route order, waves and exits."""
+
+from types import SimpleNamespace
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from database.models import Bin, BinStock, Location, Product, Sale, SaleItem, StockMovement, Tenant
+from services.bin_stock_service import StockServiceError
+from services.picking_service import PickingService, _natural_key
+
+
+# --------------- helpers ---------------
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add(Tenant(id=1, name="Test"))
+        s.add(Location(id=1, tenant_id=1, name="Central"))
+        s.commit()
+        yield s
+
+
+def _bin(session, name, aisle=None, shelf=None, position=None):
+    b = Bin(tenant_id=1, location_id=1, name=name, aisle=aisle, shelf=shelf, position=position)
+    session.add(b)
+    session.flush()
+    return b
+
+
+def _stock(session, bin_, product, qty):
+    session.add(BinStock(tenant_id=1, bin_id=bin_.id, product_id=product.id, quantity=qty))
+
+
+def _product(session, name):
+    p = Product(tenant_id=1, name=name, barcode=name, price=10.0, stock_quantity=100)
+    session.add(p)
+    session.flush()
+    return p
+
+
+# --------------- route order ---------------
+
+def test_natural_key_orders_numbers_numerically():
+    assert sorted(["A10", "A2", "A1", None], key=_natural_key) == ["A1", "A2", "A10", None]
+
+
+def test_route_is_serpentine_across_aisles():
+    bins = [
+        SimpleNamespace(id=i, location_id=1, name=f"{a}-{s}", aisle=a, shelf=s, position=None)
+        for i, (a, s) in enumerate([("B", "1"), ("A", "2"), ("B", "10"), ("A", "1"), ("C", "1"), ("B", "2")])
+    ]
+    bins.append(SimpleNamespace(id=99, location_id=1, name="PISO", aisle=None, shelf=None, position=None))
+
+    route = [b.name for b in PickingService.route_order(bins)]
+
+    assert route == ["A-1", "A-2", "B-10", "B-2", "B-1", "C-1", "PISO"]
+
+
+# --------------- allocation ---------------
+
+def test_single_bin_covering_demand_is_preferred(session):
+    p = _product(session, "P1")
+    small, large = _bin(session, "S", "A", "1"), _bin(session, "L", "B", "1")
+    _stock(session, small, p, 3)
+    _stock(session, large, p, 20)
+    session.commit()
+
+    result = PickingService.build_pick_list(session, 1, [{"product_id": p.id, "quantity": 5}])
+
+    assert result["total_stops"] == 1
+    assert result["stops"][0]["bin_id"] == large.id
+    assert result["shortages"] == []
+
+
+def test_products_share_an_already_visited_stop(session):
+    p1, p2 = _product(session, "P1"), _product(session, "P2")
+    shared, early = _bin(session, "X", "C", "1"), _bin(session, "E", "A", "1")
+    _stock(session, shared, p1, 10)
+    _stock(session, shared, p2, 10)
+    _stock(session, early, p2, 10)
+    session.commit()
+
+    items = [{"product_id": p1.id, "quantity": 2}, {"product_id": p2.id, "quantity": 2}]
+    result = PickingService.build_pick_list(session, 1, items)
+
+    assert result["total_stops"] == 1
+    assert {l["product_id"] for l in result["stops"][0]["lines"]} == {p1.id, p2.id}
+
+
+def test_shortage_is_reported_with_partial_allocation(session):
+    p = _product(session, "P1")
+    a, b = _bin(session, "A", "A", "1"), _bin(session, "B", "B", "1")
+    _stock(session, a, p, 4)
+    _stock(session, b, p, 3)
+    session.commit()
+
+    result = PickingService.build_pick_list(session, 1, [{"product_id": p.id, "quantity": 10}])
+
+    assert result["total_units"] == 7
+    assert result["shortages"] == [{"product_id": p.id, "requested": 10, "allocated": 7}]
+
+
+def test_items_from_sales_aggregates_and_checks_tenant(session):
+    p = _product(session, "P1")
+    sales = [Sale(tenant_id=1), Sale(tenant_id=1), Sale(tenant_id=2)]
+    session.add_all(sales)
+    session.flush()
+    for sale in sales:
+        session.add(SaleItem(sale_id=sale.id, product_id=p.id, product_name="P1", quantity=2, unit_price=1, total=2))
+    session.commit()
+
+    items = PickingService.items_from_sales(session, 1, [sales[0].id, sales[1].id])
+    assert items == [{"product_id": p.id, "quantity": 4}]
+
+    with pytest.raises(StockServiceError) as exc:
+        PickingService.items_from_sales(session, 1, [sales[2].id])
+    assert exc.value.status_code == 404
+
+
+# --------------- waves ---------------
+
+def _order(session, product, qty, needs_picking=True):
+    sale = Sale(tenant_id=1, needs_picking=needs_picking)
+    session.add(sale)
+    session.flush()
+    product_id = product if isinstance(product, int) else product.id
+    session.add(SaleItem(sale_id=sale.id, product_id=product_id, product_name=f"P{product_id}",
+                         quantity=qty, unit_price=1, total=qty))
+    return sale
+
+
+def test_wave_consolidates_orders_and_splits_by_slot(session):
+    p1, p2 = _product(session, "P1"), _product(session, "P2")
+    a, b = _bin(session, "A", "A", "1"), _bin(session, "B", "B", "1")
+    _stock(session, a, p1, 50)
+    _stock(session, b, p2, 50)
+    orders = [_order(session, p1, 2), _order(session, p1, 3), _order(session, p2, 4)]
+    session.commit()
+
+    waves = PickingService.plan_waves(session, 1, max_orders=20)
+
+    assert len(waves) == 1
+    wave = waves[0]
+    assert wave["total_stops"] == 2
+    first_line = wave["stops"][0]["lines"][0]
+    assert first_line["quantity"] == 5
+    assert first_line["sort"] == [
+        {"sale_id": orders[0].id, "slot": 1, "quantity": 2},
+        {"sale_id": orders[1].id, "slot": 2, "quantity": 3},
+    ]
+    assert all(o["complete"] for o in wave["orders"])
+
+
+def test_waves_respect_order_and_unit_limits(session):
+    p = _product(session, "P1")
+    for qty in (4, 4, 4, 4, 4):
+        _order(session, p, qty)
+    session.commit()
+
+    assert [len(w["orders"]) for w in PickingService.plan_waves(session, 1, max_orders=2)] == [2, 2, 1]
+    assert [len(w["orders"]) for w in PickingService.plan_waves(session, 1, max_units=12)] == [3, 2]
+
+
+def test_confirmed_orders_leave_the_queue(session):
+    p = _product(session, "P1")
+    first, second = _order(session, p, 1), _order(session, p, 1)
+    session.commit()
+
+    assert PickingService.confirm_wave(session, 1, [first.id])["confirmed"] == 1
+    assert PickingService.confirm_wave(session, 1, [first.id])["confirmed"] == 0
+
+    waves = PickingService.plan_waves(session, 1)
+    assert [o["sale_id"] for o in waves[0]["orders"]] == [second.id]
+
+
+def test_counter_sales_never_enter_a_wave(session):
+    p = _product(session, "P1")
+    _order(session, p, 1, needs_picking=False)
+    order = _order(session, p, 2)
+    session.commit()
+
+    assert [o["sale_id"] for o in PickingService.pending_orders(session, 1)] == [order.id]
+
+
+def test_wave_skips_deleted_products(session):
+    p = _product(session, "P1")
+    a = _bin(session, "A", "A", "1")
+    _stock(session, a, p, 10)
+    order = _order(session, p, 2)
+    session.flush()
+    session.add(SaleItem(sale_id=order.id, product_id=999, product_name="Borrado", quantity=1, unit_price=1, total=1))
+    session.commit()
+
+    wave = PickingService.plan_waves(session, 1)[0]
+    assert wave["total_units"] == 2
+    assert wave["skipped"] == [{"product_id": 999, "requested": 1}]
+    assert wave["orders"][0]["complete"] is False
+
+    with pytest.raises(StockServiceError) as exc:
+        PickingService.build_pick_list(session, 1, [{"product_id": 999, "quantity": 1}])
+    assert exc.value.status_code == 404
+
+
+# --------------- exit ---------------
+
+def test_register_exit_decrements_global_and_bin_stock(session):
+    p = _product(session, "P1")
+    p.cost_price = 6.0
+    a, b = _bin(session, "A", "A", "1"), _bin(session, "B", "B", "1")
+    _stock(session, a, p, 3)
+    _stock(session, b, p, 5)
+    session.commit()
+
+    result = PickingService.register_exit(session, 1, None, [(p, 4), (p, 2)])
+
+    session.refresh(p)
+    assert p.stock_quantity == 94
+    quantities = {bs.bin_id: bs.quantity for bs in session.exec(select(BinStock)).all()}
+    assert quantities == {a.id: 2, b.id: 0}
+    movements = session.exec(select(StockMovement)).all()
+    assert {m.reason for m in movements} == {"venta"} and sum(m.quantity for m in movements) == 6
+    items = session.exec(select(SaleItem).where(SaleItem.sale_id == result["sale_id"])).all()
+    assert [i.quantity for i in items] == [4, 2]
+    assert {i.cost_price_at_sale for i in items} == {6.0}
+
+
+def test_register_exit_is_all_or_nothing(session):
+    p1, p2 = _product(session, "P1"), _product(session, "P2")
+    session.commit()
+
+    with pytest.raises(StockServiceError) as exc:
+        PickingService.register_exit(session, 1, None, [(p1, 5), (p2, 101)])
+
+    assert exc.value.status_code == 409
+    session.refresh(p1)
+    assert p1.stock_quantity == 100
+    assert session.exec(select(Sale)).all() == []
@@ -0,0 +1,131 @@
+"""Tests for PricingService — set-based bulk price updates, history and scheduled price lists."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from database.models import PriceHistory, Product, Purchase, PurchaseItem, Supplier, Tenant
+from services.errors import ServiceError
+from services.pricing_service import PricingService
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add_all([Tenant(id=1, name="Test"), Tenant(id=2, name="Otro")])
+        s.add_all([
+            Product(id=1, tenant_id=1, name="A", barcode="A", price=100.0, price_bulk=1000.0, category="Verano"),
+            Product(id=2, tenant_id=1, name="B", barcode="B", price=333.0, category="Invierno"),
+            Product(id=3, tenant_id=2, name="C", barcode="C", price=100.0, category="Verano"),
+        ])
+        s.add(Supplier(id=1, tenant_id=1, name="Proveedor"))
+        s.add(Purchase(id=1, tenant_id=1, supplier_id=1))
+        s.add(PurchaseItem(purchase_id=1, product_id=2, product_name="B", quantity=1, unit_cost=1, total=1))
+        s.commit()
+    return engine
+
+
+def _prices(session):
+    session.expire_all()
+    return {p.id: (p.price, p.price_bulk) for p in session.exec(select(Product)).all()}
+
+
+def test_update_all_fields_with_rounding_and_history(engine):
+    with Session(engine) as s:
+        result = PricingService.bulk_update_price(
+            s, 1, 30, fields=("price", "price_bulk"), round_to=10, rounding="up", user_id=None
+        )
+
+        assert result["updated_count"] == 2
+        assert _prices(s) == {1: (130.0, 1300.0), 2: (440.0, None), 3: (100.0, None)}
+        history = s.exec(select(PriceHistory).order_by(PriceHistory.product_id, PriceHistory.price_field)).all()
+        assert [(h.product_id, h.price_field, h.old_price, h.new_price) for h in history] == [
+            (1, "price", 100.0, 130.0),
+            (1, "price_bulk", 1000.0, 1300.0),
+            (2, "price", 333.0, 440.0),
+        ]
+        assert {h.batch_id for h in history} == {result["batch_id"]}
+
+
+def test_filters_by_category_and_supplier(engine):
+    with Session(engine) as s:
+        PricingService.bulk_update_price(s, 1, 10, category="Verano")
+        PricingService.bulk_update_price(s, 1, -50, supplier_id=1)
+
+        assert _prices(s) == {1: (110.0, 1000.0), 2: (166.5, None), 3: (100.0, None)}
+
+
+def test_update_runs_without_loading_products(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    with Session(engine) as s:
+        PricingService.bulk_update_price(s, 1, 5, product_ids=[1, 2])
+
+    # INSERT del historial, UPDATE y el conteo del lote
+    assert len(statements) == 3
+
+
+def test_rejects_unknown_price_field(engine):
+    with Session(engine) as s:
+        with pytest.raises(ServiceError):
+            PricingService.bulk_update_price(s, 1, 5, fields=("stock_quantity",))
+
+
+def test_price_list_applies_when_due(engine):
+    now = datetime(2026, 3, 1, 3, 0)
+    with Session(engine) as s:
+        price_list = PricingService.create_price_list(
+            s, 1, "Marzo", datetime(2026, 3, 1, 0, 0, tzinfo=timezone(timedelta(hours=-3))),
+            [{"product_id": 1, "price": 150.0}, {"product_id": 2, "price_bulk": 3000.0}],
+        )
+        assert price_list.effective_at == datetime(2026, 3, 1, 3, 0)
+
+        assert PricingService.apply_due_price_lists(s, now - timedelta(seconds=1)) == []
+        assert PricingService.apply_due_price_lists(s, now) == [price_list.id]
+        assert PricingService.apply_due_price_lists(s, now) == []
+
+        assert _prices(s) == {1: (150.0, 1000.0), 2: (333.0, 3000.0), 3: (100.0, None)}
+        s.refresh(price_list)
+        assert (price_list.status, price_list.applied_count) == ("applied", 2)
+        history = s.exec(select(PriceHistory)).all()
+        assert [(h.product_id, h.price_field, h.old_price, h.new_price) for h in history] == [(1, "price", 100.0, 150.0)]
+
+
+def test_failing_price_list_is_marked_failed_and_does_not_block_others(engine, monkeypatch):
+    with Session(engine) as s:
+        broken = PricingService.create_price_list(s, 1, "Rota", datetime(2026, 1, 1), [{"product_id": 1, "price": 1.0}])
+        good = PricingService.create_price_list(s, 1, "Buena", datetime(2026, 1, 2), [{"product_id": 2, "price": 5.0}])
+        broken_id, good_id = broken.id, good.id
+
+        apply = PricingService.apply_price_list
+
+        def flaky(session, price_list_id, user_id=None):
+            if price_list_id == broken_id:
+                session.connection().exec_driver_sql("UPDATE product SET price = -1")
+                raise RuntimeError("boom")
+            return apply(session, price_list_id, user_id)
+
+        monkeypatch.setattr(PricingService, "apply_price_list", staticmethod(flaky))
+        assert PricingService.apply_due_price_lists(s, datetime(2026, 2, 1)) == [good_id]
+        assert PricingService.apply_due_price_lists(s, datetime(2026, 2, 1)) == []
+
+        assert _prices(s) == {1: (100.0, 1000.0), 2: (5.0, None), 3: (100.0, None)}
+        s.refresh(broken)
+        s.refresh(good)
+        assert (broken.status, good.status) == ("failed", "applied")
+
+
+def test_price_list_rejects_foreign_products_and_cancelled_lists_never_apply(engine):
+    with Session(engine) as s:
+        with pytest.raises(ServiceError):
+            PricingService.create_price_list(s, 1, "X", datetime(2026, 1, 1), [{"product_id": 3, "price": 1.0}])
+
+        price_list = PricingService.create_price_list(s, 1, "X", datetime(2026, 1, 1), [{"product_id": 1, "price": 1.0}])
+        PricingService.cancel_price_list(s, 1, price_list.id)
+
+        assert PricingService.apply_price_list(s, price_list.id) is None
+        assert _prices(s)[1] == (100.0, 1000.0)
@@ -0,0 +1,76 @@
+"""Tests for the in-memory scan index used by picking."""
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine
+
+from database.models import Product, Tenant
+from routers.picking import _find_product, _find_product_db, _prefetch_products
+from services import product_index
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add(Tenant(id=1, name="Test"))
+        s.add_all([
+            Product(tenant_id=1, name="Código", barcode="7790001", item_number="ABC"),
+            Product(tenant_id=1, name="Largo", barcode="7790002", item_number="ABCD"),
+            Product(tenant_id=1, name="Cinco", barcode="7790003", item_number="XYZ12"),
+            Product(tenant_id=1, name="Seis", barcode="7790004", item_number="LONG12"),
+        ])
+        s.commit()
+    product_index.invalidate()
+    yield engine
+    product_index.invalidate()
+
+
+@pytest.mark.parametrize("term", [
+    "7790001", "ABC", "ABCD", "ABCD-40", "ABCX", "ABC", "AB12", "XYZ12", "XYZ123", "LONG123", "LONG12", "NOPE", "",
+])
+def test_index_matches_database_lookup(engine, term):
+    with Session(engine) as s:
+        expected = _find_product_db(s, 1, term)
+        found = _find_product(s, 1, term)
+    assert (found.id if found else None) == (expected.id if expected else None)
+
+
+def test_prefetched_scans_run_no_lookup_queries(engine):
+    terms = ["7790001", "ABCD-40", "XYZ123"] * 34
+    with Session(engine) as s:
+        product_index.get_index(s, 1)
+        prefetched = _prefetch_products(s, 1, set(terms))
+
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        found = [_find_product(s, 1, t) for t in terms]
+
+    assert all(found)
+    assert len(prefetched) == 3
+    assert statements == []
+
+
+def test_committed_changes_update_the_index(engine):
+    with Session(engine) as s:
+        product_index.get_index(s, 1)
+        product = _find_product(s, 1, "7790003")
+        product.barcode = "NUEVO"
+        s.add(Product(tenant_id=1, name="Alta", barcode="7790099"))
+        s.commit()
+
+    index = product_index._indexes[1]
+    assert "NUEVO" in index.barcodes
+    assert "7790003" not in index.barcodes
+    assert "7790099" in index.barcodes
+
+
+def test_rolled_back_changes_are_ignored(engine):
+    with Session(engine) as s:
+        product_index.get_index(s, 1)
+        s.add(Product(tenant_id=1, name="Fantasma", barcode="GHOST"))
+        s.flush()
+        s.rollback()
+
+    assert "GHOST" not in product_index._indexes[1].barcodes
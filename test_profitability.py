@@ -0,0 +1,118 @@
+"""Tests for the profitability report — cost captured at sale time, SQL aggregation and historical backfill."""
+
+from datetime import timedelta
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from database.models import Product, Purchase, PurchaseItem, RollupDay, Sale, SaleItem, Settings, Tenant
+from services import profitability, time_windows
+from services.stock_service import StockService
+
+ZONE = time_windows.get_zone("America/Argentina/Buenos_Aires")
+TODAY = time_windows.local_today(ZONE)
+
+
+def _at(days_ago: int, hour: int = 12):
+    return time_windows.day_start(TODAY - timedelta(days=days_ago), ZONE) + timedelta(hours=hour)
+
+
+def _sale(s, days_ago, lines, tenant_id=1):
+    """lines: (product, quantity, unit_price, cost_price_at_sale)."""
+    sale = Sale(tenant_id=tenant_id, total_amount=sum(q * p for _, q, p, _ in lines), timestamp=_at(days_ago))
+    s.add(sale)
+    s.flush()
+    for product, quantity, price, cost in lines:
+        s.add(SaleItem(
+            sale_id=sale.id, product_id=product.id, product_name=product.name,
+            quantity=quantity, unit_price=price, total=quantity * price, cost_price_at_sale=cost,
+        ))
+    return sale
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    time_windows.forget()
+    with Session(engine) as s:
+        s.add_all([Tenant(id=1, name="Test"), Tenant(id=2, name="Otro")])
+        s.add(Settings(tenant_id=1, timezone="America/Argentina/Buenos_Aires"))
+        s.add_all([
+            Product(id=1, tenant_id=1, name="Yerba", barcode="Y1", category="Almacén", price=10.0, cost_price=6.0, stock_quantity=50),
+            Product(id=2, tenant_id=1, name="Jabón", barcode="J1", category="Limpieza", price=5.0, cost_price=4.0, stock_quantity=50),
+            Product(id=3, tenant_id=2, name="Otro", barcode="O1", price=1.0, cost_price=1.0, stock_quantity=50),
+        ])
+        s.flush()
+        yerba, jabon, otro = s.get(Product, 1), s.get(Product, 2), s.get(Product, 3)
+        _sale(s, 2, [(yerba, 2, 10.0, 5.0), (jabon, 4, 5.0, 4.0)])
+        _sale(s, 1, [(yerba, 1, 10.0, 7.0)])
+        _sale(s, 1, [(otro, 9, 1.0, 0.5)], tenant_id=2)
+        s.commit()
+    return engine
+
+
+def test_report_groups_by_day_category_and_product(engine):
+    with Session(engine) as s:
+        StockService(static_dir="/tmp/barcodes-test").process_sale(s, None, 1, [{"product_id": 2, "quantity": 2}])
+        s.commit()
+        result = profitability.report(s, 1, TODAY - timedelta(days=6), TODAY)
+
+        # Hoy se capturó el costo vigente del producto
+        today_item = s.exec(select(SaleItem).join(Sale).where(Sale.timestamp >= _at(0, 0))).one()
+        assert today_item.cost_price_at_sale == 4.0
+
+    assert result["totals"] == {
+        "units": 9, "revenue": 60.0, "cost": 41.0, "profit": 19.0,
+        "margin": pytest.approx(19 / 60 * 100), "uncosted_units": 0,
+    }
+    assert [(d["day"], d["revenue"], d["cost"]) for d in result["by_day"]] == [
+        (str(TODAY - timedelta(days=2)), 40.0, 26.0),
+        (str(TODAY - timedelta(days=1)), 10.0, 7.0),
+        (str(TODAY), 10.0, 8.0),
+    ]
+    assert [(c["category"], c["profit"]) for c in result["by_category"]] == [("Almacén", 13.0), ("Limpieza", 6.0)]
+    yerba = result["by_product"][0]
+    assert (yerba["product_name"], yerba["units"], yerba["cost"]) == ("Yerba", 3, 17.0)
+    assert yerba["margin"] == pytest.approx(13 / 30 * 100)
+
+
+def test_closed_days_are_read_from_margin_rollups(engine):
+    with Session(engine) as s:
+        profitability.report(s, 1, TODAY - timedelta(days=6), TODAY)
+        assert len(s.exec(select(RollupDay).where(RollupDay.tenant_id == 1)).all()) == 6
+        # Corrección tardía de un ítem: invalida el día y el reporte la refleja
+        item = s.exec(select(SaleItem).where(SaleItem.cost_price_at_sale == 7.0)).one()
+        item.cost_price_at_sale = 9.0
+        s.add(item)
+        s.commit()
+
+        result = profitability.report(s, 1, TODAY - timedelta(days=6), TODAY)
+        assert result["totals"]["cost"] == 35.0
+
+
+def test_backfill_uses_purchase_cost_at_sale_date_then_current_cost(engine):
+    with Session(engine) as s:
+        s.add(Purchase(id=1, tenant_id=1, timestamp=_at(10)))
+        s.add(Purchase(id=2, tenant_id=1, timestamp=_at(0)))  # posterior a las ventas: no cuenta
+        s.add_all([
+            PurchaseItem(purchase_id=1, product_id=1, product_name="Yerba", quantity=10, unit_cost=3.0, total=30.0),
+            PurchaseItem(purchase_id=2, product_id=1, product_name="Yerba", quantity=10, unit_cost=8.0, total=80.0),
+        ])
+        for item in s.exec(select(SaleItem)).all():
+            item.cost_price_at_sale = None
+            s.add(item)
+        s.add(SaleItem(sale_id=1, product_name="Suelto", quantity=1, unit_price=2.0, total=2.0))
+        s.commit()
+        assert profitability.report(s, 1, TODAY - timedelta(days=6), TODAY)["totals"]["uncosted_units"] == 8
+
+        assert profitability.backfill_costs(s, 1, batch_size=2) == 3
+
+        costs = {(i.product_name, i.sale_id): i.cost_price_at_sale for i in s.exec(select(SaleItem)).all()}
+        assert costs[("Yerba", 1)] == 3.0 and costs[("Yerba", 2)] == 3.0
+        assert costs[("Jabón", 1)] == 4.0
+        assert costs[("Suelto", 1)] is None
+        assert costs[("Otro", 3)] is None  # otro tenant: intacto
+
+        totals = profitability.report(s, 1, TODAY - timedelta(days=6), TODAY)["totals"]
+        assert (totals["cost"], totals["uncosted_units"]) == (25.0, 1)
@@ -0,0 +1,157 @@
+"""Tests for the report cache — TTL, stale-while-revalidate, single-flight and ORM-driven data versions."""
+
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, func, select
+
+from database.models import Sale, Tenant
+from services import report_cache
+
+
+class _InlineExecutor:
+    """Runs background refreshes synchronously so tests can assert on them."""
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class _DeferredExecutor:
+    """Keeps submitted refreshes until the test runs them."""
+
+    def __init__(self):
+        self.pending = []
+
+    def submit(self, fn, *args):
+        self.pending.append((fn, args))
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add(Tenant(id=1, name="Test"))
+        s.add(Sale(tenant_id=1, total_amount=10.0, timestamp=datetime(2026, 1, 1)))
+        s.commit()
+    monkeypatch.setattr(report_cache, "_entries", type(report_cache._entries)())
+    monkeypatch.setattr(report_cache, "_inflight", {})
+    monkeypatch.setattr(report_cache, "_versions", {})
+    monkeypatch.setattr(report_cache, "_metrics", defaultdict(report_cache._metrics.default_factory))
+    monkeypatch.setattr(report_cache, "_executor", _InlineExecutor())
+    return engine
+
+
+def _total(calls):
+    def compute(session):
+        calls.append(1)
+        return session.exec(select(func.sum(Sale.total_amount)).where(Sale.tenant_id == 1)).one()
+    return compute
+
+
+def test_fresh_entries_are_served_from_cache(engine):
+    calls = []
+    with Session(engine) as s:
+        assert report_cache.get(s, 1, "total", ("a",), _total(calls)) == 10.0
+        assert report_cache.get(s, 1, "total", ("a",), _total(calls)) == 10.0
+        assert report_cache.get(s, 1, "total", ("b",), _total(calls)) == 10.0
+
+    assert len(calls) == 2
+    stats = report_cache.stats()["reports"]["total"]
+    assert (stats["hits"], stats["misses"], stats["stale"]) == (1, 2, 0)
+
+
+def test_write_serves_stale_and_refreshes_in_background(engine, monkeypatch):
+    calls = []
+    with Session(engine) as s:
+        report_cache.get(s, 1, "total", (), _total(calls))
+        s.add(Sale(tenant_id=1, total_amount=5.0, timestamp=datetime(2026, 1, 2)))
+        s.commit()
+
+        # Refresco diferido: el viewer recibe el valor anterior sin esperar
+        executor = _DeferredExecutor()
+        monkeypatch.setattr(report_cache, "_executor", executor)
+        assert report_cache.get(s, 1, "total", (), _total(calls)) == 10.0
+        assert report_cache.get(s, 1, "total", (), _total(calls)) == 10.0
+        assert len(executor.pending) == 1  # un solo refresco por clave
+
+        fn, args = executor.pending[0]
+        fn(*args)
+        assert report_cache.get(s, 1, "total", (), _total(calls)) == 15.0
+
+    stats = report_cache.stats()["reports"]["total"]
+    assert (stats["stale"], stats["refreshes"], stats["hits"]) == (2, 1, 1)
+    assert len(calls) == 2
+
+
+def test_rollback_does_not_bump_and_touch_does(engine):
+    calls = []
+    with Session(engine) as s:
+        report_cache.get(s, 1, "total", (), _total(calls))
+        s.add(Sale(tenant_id=1, total_amount=5.0))
+        s.flush()
+        s.rollback()
+        report_cache.get(s, 1, "total", (), _total(calls))
+        assert len(calls) == 1
+
+        report_cache.touch(s, 1)
+        s.commit()
+        report_cache.get(s, 1, "total", (), _total(calls))
+        assert len(calls) == 2
+
+
+def test_too_old_entries_are_recomputed_in_request(engine):
+    calls = []
+    with Session(engine) as s:
+        report_cache.get(s, 1, "total", (), _total(calls), ttl=0, max_stale=0)
+        report_cache.get(s, 1, "total", (), _total(calls), ttl=0, max_stale=0)
+    assert len(calls) == 2
+    assert report_cache.stats()["reports"]["total"]["misses"] == 2
+
+
+def test_concurrent_misses_share_one_computation(engine):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow(session):
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "ok"
+
+    results = []
+
+    def viewer():
+        with Session(engine) as s:
+            results.append(report_cache.get(s, 1, "slow", (), slow))
+
+    first = threading.Thread(target=viewer)
+    first.start()
+    started.wait(5)
+    others = [threading.Thread(target=viewer) for _ in range(3)]
+    for t in others:
+        t.start()
+    deadline = time.monotonic() + 5
+    while report_cache.stats()["reports"]["slow"]["misses"] < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for t in (first, *others):
+        t.join(5)
+
+    assert results == ["ok"] * 4
+    assert len(calls) == 1
+
+
+def test_errors_are_propagated_and_not_cached(engine):
+    def boom(session):
+        raise RuntimeError("falló")
+
+    with Session(engine) as s:
+        with pytest.raises(RuntimeError):
+            report_cache.get(s, 1, "boom", (), boom)
+        assert report_cache.get(s, 1, "boom", (), lambda session: 1) == 1
+    assert report_cache.stats()["reports"]["boom"]["errors"] == 1
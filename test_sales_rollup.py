@@ -0,0 +1,125 @@
+"""Tests for daily sales/cash rollups — local business days, closed days from rollups, invalidation on write."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from database.models import CashMovement, DailySalesRollup, RollupDay, Sale, SaleItem, Settings, Tenant
+from services import sales_rollup, time_windows
+from services.tenant_backup_service import restore_tenant_snapshot
+
+ZONE = time_windows.get_zone("America/Argentina/Buenos_Aires")
+TODAY = time_windows.local_today(ZONE)
+
+
+def _at(days_ago: int, hour: int = 12, minute: int = 0) -> datetime:
+    """Hora local del día indicado, como timestamp UTC naive (igual que en la base)."""
+    return time_windows.day_start(TODAY - timedelta(days=days_ago), ZONE) + timedelta(hours=hour, minutes=minute)
+
+
+def _sale(s, days_ago, total, items=(), tenant_id=1):
+    sale = Sale(tenant_id=tenant_id, total_amount=total, timestamp=_at(days_ago))
+    s.add(sale)
+    s.flush()
+    for name, quantity, amount in items:
+        s.add(SaleItem(sale_id=sale.id, product_name=name, quantity=quantity, unit_price=amount / quantity, total=amount))
+    return sale
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    time_windows.forget()
+    with Session(engine) as s:
+        s.add_all([Tenant(id=1, name="Test"), Tenant(id=2, name="Otro")])
+        s.add(Settings(tenant_id=1, timezone="America/Argentina/Buenos_Aires"))
+        _sale(s, 3, 100.0, [("A", 2, 100.0)])
+        _sale(s, 3, 50.0, [("B", 1, 50.0)])
+        _sale(s, 1, 30.0, [("A", 1, 30.0)])
+        _sale(s, 1, 999.0, [("A", 9, 999.0)], tenant_id=2)
+        s.add_all([
+            CashMovement(tenant_id=1, movement_type="in", amount=80.0, concept="venta", reference_type="sale", timestamp=_at(3)),
+            CashMovement(tenant_id=1, movement_type="out", amount=-20.0, concept="flete", timestamp=_at(3)),
+            CashMovement(tenant_id=1, movement_type="cierre", amount=500.0, concept="cierre", timestamp=_at(3)),
+        ])
+        s.commit()
+        # Hoy: primer minuto del día local para no depender de la hora del test
+        s.add(Sale(tenant_id=1, total_amount=7.0, timestamp=_at(0, 0)))
+        s.commit()
+    return engine
+
+
+def test_summary_combines_rollups_and_todays_raw_rows(engine):
+    with Session(engine) as s:
+        summary = sales_rollup.summary(s, 1, TODAY - timedelta(days=6), TODAY)
+
+        assert summary["sales_by_day"] == [
+            {"day": str(TODAY - timedelta(days=3)), "total": 150.0},
+            {"day": str(TODAY - timedelta(days=1)), "total": 30.0},
+            {"day": str(TODAY), "total": 7.0},
+        ]
+        assert summary["top_products"] == [
+            {"product_name": "A", "units": 3, "amount": 130.0},
+            {"product_name": "B", "units": 1, "amount": 50.0},
+        ]
+        assert summary["cash_by_day"] == [
+            {"day": str(TODAY - timedelta(days=3)), "ingresos": 80.0, "egresos": 20.0, "balance": 60.0},
+        ]
+        # Seis días cerrados marcados (con y sin ventas); hoy nunca se agrega
+        assert len(s.exec(select(RollupDay).where(RollupDay.tenant_id == 1)).all()) == 6
+        assert sales_rollup.ensure_closed_days(s, 1, TODAY - timedelta(days=6), TODAY) == 0
+
+
+def test_rollups_are_read_instead_of_raw_rows_for_closed_days(engine):
+    with Session(engine) as s:
+        sales_rollup.build_recent(s, 1, days=7)
+        rollup = s.exec(select(DailySalesRollup).where(DailySalesRollup.day == TODAY - timedelta(days=3))).one()
+        rollup.total_amount = 1.0
+        s.add(rollup)
+        s.commit()
+
+        totals = {row["day"]: row["total"] for row in sales_rollup.sales_by_day(s, 1, TODAY - timedelta(days=6), TODAY)}
+        assert totals[str(TODAY - timedelta(days=3))] == 1.0
+
+
+def test_backdated_writes_invalidate_the_closed_day(engine):
+    with Session(engine) as s:
+        sales_rollup.build_recent(s, 1, days=7)
+        _sale(s, 3, 10.0, [("C", 5, 10.0)])
+        s.commit()
+        assert s.exec(select(RollupDay).where(RollupDay.day == TODAY - timedelta(days=3))).first() is None
+
+        # Ítem agregado a una venta vieja existente
+        sale = s.exec(select(Sale).where(Sale.total_amount == 30.0)).one()
+        sales_rollup.build_recent(s, 1, days=7)
+        s.add(SaleItem(sale_id=sale.id, product_name="D", quantity=1, unit_price=1.0, total=1.0))
+        s.commit()
+        assert s.exec(select(RollupDay).where(RollupDay.day == TODAY - timedelta(days=1))).first() is None
+
+        summary = sales_rollup.summary(s, 1, TODAY - timedelta(days=6), TODAY)
+        assert summary["sales_by_day"][0]["total"] == 160.0
+        assert {p["product_name"] for p in summary["top_products"]} == {"A", "B", "C", "D"}
+
+
+def test_late_night_sales_belong_to_the_local_day(engine):
+    with Session(engine) as s:
+        # 23:30 en Buenos Aires = 02:30 UTC del día siguiente
+        s.add(Sale(tenant_id=1, total_amount=5.0, timestamp=_at(2, 23, 30)))
+        s.commit()
+        assert _at(2, 23, 30).date() == TODAY - timedelta(days=1)
+
+        totals = {row["day"]: row["total"] for row in sales_rollup.summary(s, 1, TODAY - timedelta(days=6), TODAY)["sales_by_day"]}
+        assert totals[str(TODAY - timedelta(days=2))] == 5.0
+        assert totals[str(TODAY - timedelta(days=1))] == 30.0
+
+
+def test_restore_drops_rollups_of_deleted_sales(engine):
+    with Session(engine) as s:
+        sales_rollup.build_recent(s, 1, days=7)
+        restore_tenant_snapshot(s, 1, {"products": [], "clients": [], "sales": []})
+
+        summary = sales_rollup.summary(s, 1, TODAY - timedelta(days=6), TODAY)
+        assert summary["sales_by_day"] == []
+        assert summary["top_products"] == []
@@ -0,0 +1,61 @@
+"""Tests for the server-side scan cart and batched entry commits."""
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+
+from database.models import Product, Tenant
+from services.bin_stock_service import StockServiceError
+from services.picking_service import PickingService
+from services.scan_session import ScanCart
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cart_is_due_after_batch_size_scans():
+    cart = ScanCart(batch_size=3, max_delay=10)
+
+    assert cart.add(1, 1) is False
+    assert cart.add(1, 1) is False
+    assert cart.add(2, 5) is True
+    assert cart.take_pending() == {1: 2, 2: 5}
+    assert cart.seconds_until_due() is None
+
+
+def test_cart_deadline_counts_from_first_pending_scan():
+    clock = _Clock()
+    cart = ScanCart(batch_size=100, max_delay=0.5, clock=clock)
+
+    cart.add(1, 1)
+    clock.now = 0.3
+    cart.add(1, 1)
+
+    assert cart.seconds_until_due() == pytest.approx(0.2)
+    clock.now = 0.9
+    assert cart.seconds_until_due() == 0.0
+
+
+def test_register_entries_commits_a_batch_in_one_transaction():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add(Tenant(id=1, name="Test"))
+        s.add_all([Product(id=1, tenant_id=1, name="A", barcode="A", stock_quantity=2),
+                   Product(id=2, tenant_id=1, name="B", barcode="B", stock_quantity=0),
+                   Product(id=3, tenant_id=2, name="Otro tenant", barcode="C", stock_quantity=0)])
+        s.commit()
+
+        assert PickingService.register_entries(s, 1, {1: 500, 2: 3}) == {1: 502, 2: 3}
+
+        with pytest.raises(StockServiceError):
+            PickingService.register_entries(s, 1, {1: 1, 3: 1})
+        assert s.get(Product, 1).stock_quantity == 502
+
+        # Sesión de escaneo: el producto ajeno se descarta, el resto se confirma
+        stock, rejected = PickingService.register_scanned_entries(s, 1, {1: 1, 2: 2, 3: 1})
+        assert (stock, rejected) == ({1: 503, 2: 5}, {3: 1})
@@ -1,9 +1,14 @@
+from datetime import date
 from io import BytesIO
 from types import SimpleNamespace
 
 import pytest
 from fastapi import HTTPException
 
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from database.models import RollupDay, Settings, Tenant
+from services import time_windows
 from services.settings_service import SettingsService, MAX_LOGO_SIZE_BYTES
 
 
@@ -36,6 +41,7 @@ def _make_settings():
         printer_name=None,
         label_width_mm=60,
         label_height_mm=40,
+        timezone="America/Argentina/Buenos_Aires",
         logo_url="/static/images/logo.png",
     )
 
@@ -73,6 +79,64 @@ def test_apply_updates_rejects_blank_company_name():
     assert "company_name cannot be empty" == exc.value.detail
 
 
+# --- timezone ---
+
+def test_apply_updates_rejects_unknown_timezone():
+    session = DummySession()
+    settings = _make_settings()
+
+    with pytest.raises(HTTPException) as exc:
+        SettingsService.apply_updates(session=session, settings=settings, timezone="Mars/Base")
+
+    assert exc.value.status_code == 400
+    assert settings.timezone == "America/Argentina/Buenos_Aires"
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    time_windows.forget()
+    with Session(engine) as s:
+        s.add(Tenant(id=1, name="Test"))
+        s.add(Settings(tenant_id=1, timezone="America/Argentina/Buenos_Aires"))
+        s.add_all([RollupDay(tenant_id=1, day=date(2026, 1, d)) for d in (1, 2)])
+        s.commit()
+        yield s
+
+
+def _rollup_days(session):
+    return len(session.exec(select(RollupDay).where(RollupDay.tenant_id == 1)).all())
+
+
+def test_apply_updates_keeps_rollups_when_timezone_is_unchanged(db_session):
+    settings = SettingsService.get_or_create_settings(db_session, 1)
+
+    SettingsService.apply_updates(session=db_session, settings=settings, timezone=" America/Argentina/Buenos_Aires ")
+
+    assert settings.timezone == "America/Argentina/Buenos_Aires"
+    assert _rollup_days(db_session) == 2
+
+
+def test_apply_updates_invalidates_rollups_when_timezone_changes(db_session):
+    settings = SettingsService.get_or_create_settings(db_session, 1)
+    assert str(time_windows.tenant_zone(db_session, 1)) == "America/Argentina/Buenos_Aires"
+
+    SettingsService.apply_updates(session=db_session, settings=settings, timezone="Europe/Madrid")
+
+    assert _rollup_days(db_session) == 0
+    assert str(time_windows.tenant_zone(db_session, 1)) == "Europe/Madrid"
+
+
+def test_get_or_create_settings_creates_missing_row(db_session):
+    db_session.add(Tenant(id=2, name="Sin configuración"))
+    db_session.commit()
+
+    settings = SettingsService.get_or_create_settings(db_session, 2)
+
+    assert settings.id is not None and settings.tenant_id == 2
+
+
 # --- Successful Update ---
 
 def test_apply_updates_updates_supported_fields():
@@ -0,0 +1,54 @@
+"""Tests for SlottingService — ABC classification and swap recommendations."""
+
+import pandas as pd
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+
+from database.models import Bin, BinStock, Location, Product, Sale, SaleItem, Tenant
+from services.bin_stock_service import BinStockService
+from services.slotting_service import SlottingService
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add(Tenant(id=1, name="Test"))
+        s.add(Location(id=1, tenant_id=1, name="Central"))
+        s.commit()
+        yield s
+
+
+def test_classify_abc_by_cumulative_picks():
+    velocity = pd.DataFrame({"product_id": [1, 2, 3, 4, 5], "picks": [70, 15, 10, 5, 0], "units": 0})
+
+    ranked = SlottingService.classify_abc(velocity)
+
+    assert ranked.set_index("product_id")["abc"].to_dict() == {1: "A", 2: "A", 3: "B", 4: "C", 5: "C"}
+
+
+def test_fast_mover_is_swapped_into_nearest_bin(session):
+    near = Bin(tenant_id=1, location_id=1, name="A-1", aisle="A", shelf="1")
+    far = Bin(tenant_id=1, location_id=1, name="D-9", aisle="D", shelf="9")
+    fast = Product(tenant_id=1, name="Rápido", barcode="F", stock_quantity=5)
+    slow = Product(tenant_id=1, name="Lento", barcode="S", stock_quantity=3)
+    session.add_all([near, far, fast, slow])
+    session.flush()
+    session.add(BinStock(tenant_id=1, bin_id=far.id, product_id=fast.id, quantity=5))
+    session.add(BinStock(tenant_id=1, bin_id=near.id, product_id=slow.id, quantity=3))
+    for _ in range(10):
+        sale = Sale(tenant_id=1)
+        session.add(sale)
+        session.flush()
+        session.add(SaleItem(sale_id=sale.id, product_id=fast.id, product_name="F", quantity=1, unit_price=1, total=1))
+    session.commit()
+
+    result = SlottingService.recommend(session, 1, 1)
+
+    assert [(m["product_id"], m["to_bin_id"]) for m in result["moves"]] == [(fast.id, near.id)]
+    assert result["travel_after"] < result["travel_before"]
+
+    # El documento propuesto se ejecuta tal cual
+    BinStockService.apply_transfer_document(session, 1, result["documents"][0]["lines"])
+    assert SlottingService.recommend(session, 1, 1)["moves"] == []
@@ -0,0 +1,118 @@
+"""Tests for the stock ledger — ORM/core capture, checkpoints and as-of replay."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from database.models import Product, StockCheckpoint, StockLedgerEntry, Tenant
+from services import stock_ledger
+from services.picking_service import PickingService
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add(Tenant(id=1, name="Test"))
+        s.commit()
+        yield s
+
+
+def _ledger(session):
+    return [(e.product_id, e.delta, e.reason) for e in session.exec(select(StockLedgerEntry).order_by(StockLedgerEntry.id)).all()]
+
+
+def test_orm_changes_are_recorded_with_tag(session):
+    p = Product(tenant_id=1, name="A", barcode="A", stock_quantity=10)
+    session.add(p)
+    session.commit()
+
+    stock_ledger.tag(session, "compra")
+    p.stock_quantity += 5
+    session.add(p)
+    session.commit()
+    p.stock_quantity = 12
+    session.add(p)
+    session.commit()
+
+    assert _ledger(session) == [(p.id, 10, "alta"), (p.id, 5, "compra"), (p.id, -3, "edicion")]
+
+
+def test_rolled_back_changes_leave_no_entries(session):
+    p = Product(tenant_id=1, name="A", barcode="A", stock_quantity=0)
+    session.add(p)
+    session.commit()
+
+    p.stock_quantity = 7
+    session.add(p)
+    session.flush()
+    session.rollback()
+
+    assert _ledger(session) == []
+
+
+def test_core_paths_record_real_deltas(session):
+    p = Product(tenant_id=1, name="A", barcode="A", stock_quantity=3, price=1.0)
+    session.add(p)
+    session.commit()
+
+    PickingService.register_entries(session, 1, {p.id: 4})
+    PickingService.register_exit(session, 1, None, [(p, 2)])
+
+    assert _ledger(session)[1:] == [(p.id, 4, "ingreso"), (p.id, -2, "venta")]
+
+
+def test_as_of_replays_from_nearest_checkpoint(session, monkeypatch):
+    clock = {"now": datetime(2026, 1, 1, 12)}
+    monkeypatch.setattr(stock_ledger, "_utcnow_naive", lambda: clock["now"])
+
+    p = Product(tenant_id=1, name="A", barcode="A", stock_quantity=0)
+    session.add(p)
+    session.commit()
+
+    def move(delta, day):
+        # Core UPDATE + explicit record, as the bulk service paths do
+        clock["now"] = datetime(2026, 1, day, 12)
+        stock_ledger.record(session, [{"tenant_id": 1, "product_id": p.id, "delta": delta, "reason": "ajuste"}])
+        session.connection().exec_driver_sql(f"UPDATE product SET stock_quantity = stock_quantity + {delta}")
+        session.commit()
+
+    move(10, 2)
+    clock["now"] = datetime(2026, 1, 5)
+    stock_ledger.create_checkpoint(session, 1)
+    move(-4, 6)
+    move(7, 20)
+    clock["now"] = datetime(2026, 1, 31)
+
+    def at(day):
+        return stock_ledger.stock_as_of(session, 1, datetime(2026, 1, day))
+
+    assert at(3)["stock"][p.id] == 10 and at(3)["direction"] == "backward"
+    assert at(7)["stock"][p.id] == 6 and at(7)["direction"] == "forward"
+    assert at(25)["stock"][p.id] == 13 and at(25)["source"] == "current"
+    assert at(1)["stock"][p.id] == 0
+
+
+def test_checkpoint_if_due_skips_recent_checkpoint(session):
+    session.add(Product(tenant_id=1, name="A", barcode="A", stock_quantity=2))
+    session.commit()
+
+    first = stock_ledger.checkpoint_if_due(session, 1)
+    second = stock_ledger.checkpoint_if_due(session, 1)
+
+    assert first.product_count == 1
+    assert second is None
+    assert len(session.exec(select(StockCheckpoint)).all()) == 1
+
+
+def test_tenant_removal_zeroes_stock_in_ledger(session):
+    session.add_all([Product(tenant_id=1, name="A", barcode="A", stock_quantity=2),
+                     Product(tenant_id=1, name="B", barcode="B", stock_quantity=0)])
+    session.commit()
+
+    stock_ledger.record_tenant_removal(session, 1)
+    session.commit()
+
+    assert [r[1:] for r in _ledger(session)] == [(2, "alta"), (-2, "baja")]
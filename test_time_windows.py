@@ -0,0 +1,31 @@
+"""Tests for tenant business-day windows (local day -> UTC timestamp range)."""
+
+from datetime import date, datetime
+
+from services import time_windows
+
+
+def test_day_window_is_a_utc_range_for_the_local_day():
+    zone = time_windows.get_zone("America/Argentina/Buenos_Aires")
+    assert time_windows.day_window(date(2026, 3, 10), zone) == (datetime(2026, 3, 10, 3, 0), datetime(2026, 3, 11, 3, 0))
+    # 23:30 local = 02:30 UTC del día siguiente
+    assert time_windows.local_day(datetime(2026, 3, 11, 2, 30), zone) == date(2026, 3, 10)
+
+
+def test_dst_days_last_23_or_25_hours():
+    zone = time_windows.get_zone("Europe/Madrid")
+    start, end = time_windows.day_window(date(2026, 3, 29), zone)
+    assert (end - start).total_seconds() == 23 * 3600
+    start, end = time_windows.day_window(date(2026, 10, 25), zone)
+    assert (end - start).total_seconds() == 25 * 3600
+
+
+def test_invalid_zone_falls_back_and_range_covers_inclusive_days():
+    assert not time_windows.is_valid_zone("Marte/Olympus")
+    assert time_windows.get_zone("Marte/Olympus") == time_windows.get_zone(time_windows.DEFAULT_TIMEZONE)
+
+    zone = time_windows.get_zone("UTC")
+    assert time_windows.range_window(date(2026, 1, 1), date(2026, 1, 31), zone) == (
+        datetime(2026, 1, 1), datetime(2026, 2, 1),
+    )
+    assert time_windows.parse_day("nope", zone, date(2026, 1, 5)) == date(2026, 1, 5)